@@ -0,0 +1,76 @@
+"""
+Compare the regex lexer (lexer.tokenize) with the hand-written scanner
+(scanner.scan) on a generated multi-megabyte program.
+
+    python benchmarks/bench_lexer.py [--size-mb 4] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+# Make the interpreter/ modules importable, as main.py does
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "interpreter"))
+
+import lexer
+import scanner
+
+# A block of typical source: assignments, arithmetic, strings, lists,
+# comparisons, control flow and comments.
+SAMPLE = '''# running totals
+total = 0
+count = 0
+names = ["alpha", "beta", "gamma"]
+while (count < 100) {
+  if (count % 2 == 0 and total >= 10) {
+    total = total + count * 2.5 - -1
+  } else {
+    print "odd: " + "value"
+  }
+  append(names, "delta")
+  count = count + 1
+}
+print total / (count + 1) != 3 or !false
+'''
+
+
+def make_source(size_mb):
+    repeats = max(1, int(size_mb * 1024 * 1024) // len(SAMPLE))
+    return SAMPLE * repeats
+
+
+def best_time(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--size-mb", type=float, default=4.0)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    code = make_source(args.size_mb)
+    megabytes = len(code.encode("utf-8")) / (1024 * 1024)
+
+    regex_time, regex_tokens = best_time(lambda: list(lexer.tokenize(code)), args.repeat)
+    scan_time, stream = best_time(lambda: scanner.scan(code), args.repeat)
+
+    if list(stream) != regex_tokens:
+        sys.exit("scanner output differs from lexer.tokenize")
+
+    count = len(regex_tokens)
+    print(f"input: {megabytes:.1f} MB, {count} tokens (best of {args.repeat})")
+    for label, elapsed in (("lexer.tokenize", regex_time), ("scanner.scan", scan_time)):
+        print(f"  {label:<15} {elapsed:8.3f} s  {megabytes / elapsed:7.2f} MB/s"
+              f"  {count / elapsed / 1e6:6.2f} Mtok/s")
+    print(f"  speedup: {regex_time / scan_time:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Time the parser on a generated multi-megabyte program.
+
+    python benchmarks/bench_parser.py [--size-mb 4] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+
+# Make the interpreter/ modules importable, as main.py does
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "interpreter"))
+
+import scanner
+from parser import Parser
+
+from bench_lexer import make_source, best_time
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--size-mb", type=float, default=4.0)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    code = make_source(args.size_mb)
+    megabytes = len(code.encode("utf-8")) / (1024 * 1024)
+    # Scan once up front so only the parser is timed
+    tokens = list(scanner.scan(code))
+
+    elapsed, statements = best_time(lambda: Parser(tokens).parse(), args.repeat)
+
+    count = len(tokens)
+    print(f"input: {megabytes:.1f} MB, {count} tokens, "
+          f"{len(statements)} statements (best of {args.repeat})")
+    print(f"  Parser.parse {elapsed:8.3f} s  {megabytes / elapsed:7.2f} MB/s"
+          f"  {count / elapsed / 1e6:6.2f} Mtok/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Time the interactive mode (interpreter/repl.py) line by line.
+
+    python benchmarks/bench_repl.py [--lines 20000] [--block 2000]
+                                    [--edits 500] [--engine tree]
+
+Session: --lines lines of typical input (assignments, prints, list appends,
+if statements and small multi-line while loops) are fed to one Repl, as if
+typed, and the time to handle each line is reported for the first and the
+last tenth of the session: it should not grow as the session goes on.
+
+Editing: an open while block of --block lines is typed, then --edits lines
+of it are replaced at random with :edit.  Reported: the time per edit,
+next to the time to lex and parse the whole entry from scratch, which is
+what every edit would cost without the incremental lexer and parser.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "interpreter"))
+
+import scanner
+from main import ENGINES
+from output import Output
+from parser import Parser
+from repl import Repl
+
+
+class _Discard(Output):
+    # Printed lines are thrown away: only the REPL's own work is timed
+    def write(self, text):
+        pass
+
+
+def session_lines(count):
+    # Typical interactive input, `count` lines of it
+    lines = ["items = []", "total = 0"]
+    n = 0
+    while len(lines) < count:
+        n += 1
+        kind = n % 5
+        if kind == 0:
+            lines += ["i = 0", "while (i < 3) {", "  total = total + i",
+                      "  i = i + 1", "}"]
+        elif kind == 1:
+            lines.append(f"v{n % 50} = {n} * 2 + total")
+        elif kind == 2:
+            lines.append(f"append(items, {n})")
+        elif kind == 3:
+            lines.append(f"if (total > {n}) {{ print total }} else {{ print len(items) }}")
+        else:
+            lines.append(f'print "line {n}"')
+    return lines[:count]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def report(label, seconds):
+    print(f"{label:<28} {percentile(seconds, 0.5) * 1e6:>8.1f} "
+          f"{percentile(seconds, 0.99) * 1e6:>8.1f} {max(seconds) * 1e6:>9.1f}")
+
+
+def bench_session(engine, count):
+    repl = Repl(ENGINES[engine](_Discard()))
+    timings = []
+    clock = time.perf_counter
+    for line in session_lines(count):
+        start = clock()
+        repl.feed(line)
+        timings.append(clock() - start)
+    tenth = max(1, count // 10)
+    report(f"first {tenth} lines", timings[:tenth])
+    report(f"last {tenth} lines", timings[-tenth:])
+
+
+def bench_edits(engine, size, edits):
+    repl = Repl(ENGINES[engine](_Discard()))
+    body = [f"  x{i % 100} = x{i % 100} + {i} * (i - 1)" for i in range(size)]
+    start = time.perf_counter()
+    for line in ["i = 0", "while (i < 1) {"] + body:
+        repl.feed(line)
+    typed = time.perf_counter() - start
+
+    rng = random.Random(1)
+    timings = []
+    for _ in range(edits):
+        n = rng.randrange(2, size + 2)
+        line = f"  y = {rng.randrange(1000)} + len([1, 2, 3])"
+        start = time.perf_counter()
+        repl.feed(f":edit {n} {line}")
+        timings.append(time.perf_counter() - start)
+    report(f"edit a line of {size + 1}", timings)
+
+    text = "\n".join(repl.entry.lines) + "\n}"
+    start = time.perf_counter()
+    Parser(scanner.scan(text)).parse()
+    full = time.perf_counter() - start
+    print(f"{'full lex + parse':<28} {full * 1e6:>8.1f}")
+    print(f"typing the {size + 1} lines took {typed * 1000:.1f} ms "
+          f"({typed / (size + 1) * 1e6:.1f} us per line)")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--lines", type=int, default=20000)
+    arg_parser.add_argument("--block", type=int, default=2000)
+    arg_parser.add_argument("--edits", type=int, default=500)
+    arg_parser.add_argument("--engine", choices=sorted(ENGINES), default="tree")
+    args = arg_parser.parse_args()
+
+    print(f"{'microseconds per line':<28} {'p50':>8} {'p99':>8} {'max':>9}")
+    bench_session(args.engine, args.lines)
+    bench_edits(args.engine, args.block, args.edits)
+
+
+if __name__ == "__main__":
+    main()
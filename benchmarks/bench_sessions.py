@@ -0,0 +1,138 @@
+"""
+Load-test main.py --serve: how many concurrent interactive sessions one
+interpreter process can serve.
+
+    python benchmarks/bench_sessions.py [--sessions 10 100 1000]
+                                        [--rounds 20] [--port 8023]
+
+A server process runs ECHO_TOTAL, which reads lines and prints the running
+total of their lengths.  For each session count, that many TCP clients
+connect at once and each sends --rounds lines, waiting for the reply to
+one before sending the next.  Reported per session count: rounds per
+second over all sessions, the latency of a round (median and 99th
+percentile), and the server's resident memory (Linux only) while all the
+sessions are open.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+MAIN = os.path.join(os.path.dirname(__file__), "..", "main.py")
+
+ECHO_TOTAL = """\
+total = 0
+line = input("")
+while (line != "quit") {
+  total = total + len(line)
+  print total
+  line = input("")
+}
+print "bye"
+"""
+
+
+def server_rss(pid):
+    # Resident memory of a process in MB, or None where /proc is missing
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+async def client(port, rounds, started, all_open, latencies):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    started.release()
+    await all_open.wait()
+    total = 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        writer.write(b"hello\n")
+        line = await reader.readline()
+        latencies.append(time.perf_counter() - start)
+        total += 5
+        if int(line) != total:
+            raise AssertionError(f"expected {total}, got {line!r}")
+    writer.write(b"quit\n")
+    assert await reader.readline() == b"bye\n"
+    writer.close()
+    await writer.wait_closed()
+
+
+async def load(port, sessions, rounds, pid):
+    """
+    Run `sessions` clients at once: (seconds, latencies, RSS in MB).
+    """
+    started = asyncio.Semaphore(0)
+    all_open = asyncio.Event()
+    latencies = []
+    tasks = [asyncio.create_task(client(port, rounds, started, all_open, latencies))
+             for _ in range(sessions)]
+    for _ in range(sessions):
+        await started.acquire()
+    # Give the server time to start every session, then measure it
+    await asyncio.sleep(0.2)
+    rss = server_rss(pid)
+    start = time.perf_counter()
+    all_open.set()
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - start, latencies, rss
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def wait_for_server(server):
+    # The server says on stderr when it is listening
+    line = server.stderr.readline()
+    if not line.startswith("serving"):
+        raise RuntimeError(f"the server did not start: {line}{server.stderr.read()}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--sessions", type=int, nargs="+", default=[10, 100, 1000])
+    arg_parser.add_argument("--rounds", type=int, default=20)
+    arg_parser.add_argument("--port", type=int, default=8023)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        program = os.path.join(folder, "echo_total.txt")
+        with open(program, "w", encoding="utf-8") as f:
+            f.write(ECHO_TOTAL)
+        server = subprocess.Popen(
+            [sys.executable, MAIN, "--no-cache", "--serve", str(args.port), program],
+            stderr=subprocess.PIPE, text=True)
+        try:
+            wait_for_server(server)
+            idle = server_rss(server.pid)
+            if idle is not None:
+                print(f"server idle: {idle:.1f} MB")
+            print(f"{'sessions':>8} {'rounds/s':>10} {'p50 ms':>8} {'p99 ms':>8} "
+                  f"{'RSS MB':>8} {'KB/session':>10}")
+            for sessions in args.sessions:
+                seconds, latencies, rss = asyncio.run(
+                    load(args.port, sessions, args.rounds, server.pid))
+                per_session = "-"
+                if rss is not None and idle is not None:
+                    per_session = f"{(rss - idle) * 1024 / sessions:.1f}"
+                print(f"{sessions:>8} {len(latencies) / seconds:>10.0f} "
+                      f"{percentile(latencies, 0.5) * 1000:>8.2f} "
+                      f"{percentile(latencies, 0.99) * 1000:>8.2f} "
+                      f"{'-' if rss is None else f'{rss:.1f}':>8} {per_session:>10}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
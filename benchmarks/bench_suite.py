@@ -0,0 +1,354 @@
+"""
+Run the benchmark suite: time lexing, parsing and execution of generated
+workloads and compare the results with a saved baseline.
+
+    python benchmarks/bench_suite.py [--scale 1] [--repeat 5] [--engine tree]
+                                     [--only NAME ...] [--no-memory]
+                                     [--json results.json]
+                                     [--baseline base.json] [--threshold 0.25]
+
+For every workload the phases are timed separately: --repeat samples,
+each calling the phase over and over for at least MIN_SAMPLE_SECONDS, and
+the median time per call is reported:
+  - lex:     lexer.tokenize, the regex lexer     (ops: tokens)
+  - scan:    scanner.scan, used by main.py       (ops: tokens)
+  - parse:   Parser.parse on the scanned tokens  (ops: tokens)
+  - execute: resolve and execute every statement on the chosen engine
+             (ops: statements executed, counted once with hooks.Counters)
+Peak memory is measured with tracemalloc in one extra, untimed run of each
+phase.  With --baseline, any phase slower than the baseline by more than
+--threshold (a fraction) is a regression and the exit status is 1;
+phases under MIN_SECONDS are not compared.
+
+Regressions are judged on the fastest call of the phase, divided by the
+fastest call of reference(), a fixed piece of plain Python sampled after
+each of the phase's samples: other work on the machine only ever adds
+time, and the machine's own speed can drift by half from one run to the
+next (CPU frequency, other virtual machines on the host), which the
+division cancels out.  A phase that still looks slower is timed RECHECKS
+more times before it is reported.  Even so, back-to-back runs of the
+same code differ by up to about 15% on a shared machine, hence the
+default --threshold of 0.25.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tracemalloc
+from statistics import median
+from time import perf_counter
+
+# Make main.py and the interpreter/ modules importable
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "interpreter"))
+
+import hooks
+import lexer
+import scanner
+from main import ENGINES
+from output import Output
+from parser import Parser
+
+PHASES = ("lex", "scan", "parse", "execute")
+
+# Phases faster than this per call (in the baseline) are too noisy to
+# compare
+MIN_SECONDS = 0.001
+
+# A phase found slower than the baseline is timed this many more times
+# before it counts as a regression
+RECHECKS = 3
+
+# Every timing sample runs its phase for at least this long, so that short
+# phases are measured over many calls
+MIN_SAMPLE_SECONDS = 0.1
+
+
+# Workloads: each returns the source of a program whose size grows with
+# `scale`.  None of them read input; what they print is discarded.
+
+def deep_arithmetic(scale):
+    # A long loop over one deeply nested expression
+    expr = "i"
+    for k in range(40):
+        expr = f"({expr} {'+-*%'[k % 4]} {k % 7 + 2})"
+    return (f"i = 0\nx = 0\n"
+            f"while (i < {int(20000 * scale)}) {{\n"
+            f"  x = {expr}\n"
+            f"  i = i + 1\n"
+            f"}}\nprint x\n")
+
+
+def counting_loop(scale):
+    return (f"i = 0\n"
+            f"while (i < {int(300000 * scale)}) {{\n"
+            f"  i = i + 1\n"
+            f"}}\nprint i\n")
+
+
+def list_churn(scale):
+    # Grow a list, then append to and remove from it in turn
+    return (f"xs = []\ni = 0\n"
+            f"while (i < 1000) {{ append(xs, i) i = i + 1 }}\n"
+            f"i = 0\n"
+            f"while (i < {int(100000 * scale)}) {{\n"
+            f"  append(xs, i)\n"
+            f"  remove(xs, 0)\n"
+            f"  i = i + 1\n"
+            f"}}\nprint len(xs)\n")
+
+
+def string_building(scale):
+    return (f"s = \"\"\ni = 0\n"
+            f"while (i < {int(100000 * scale)}) {{\n"
+            f"  s = s + \"ab\"\n"
+            f"  i = i + 1\n"
+            f"}}\nprint len(s)\n")
+
+
+def nested_ifs(scale):
+    # Eight levels of if/else on the bits of a counter
+    body = "hits = hits + 1"
+    for bit in (128, 64, 32, 16, 8, 4, 2, 1):
+        body = (f"if (i % {2 * bit} >= {bit}) {{ {body} }} "
+                f"else {{ misses = misses + 1 }}")
+    return (f"i = 0\nhits = 0\nmisses = 0\n"
+            f"while (i < {int(50000 * scale)}) {{\n"
+            f"  {body}\n"
+            f"  i = i + 1\n"
+            f"}}\nprint hits\nprint misses\n")
+
+
+def large_source(scale):
+    # A multi-megabyte program of straight-line statements
+    block = ('total = 0\n'
+             'count = 3\n'
+             'total = total + count * 2 - -1\n'
+             'name = "alpha" + "beta"\n'
+             'names = ["alpha", "beta", "gamma"]\n'
+             'if (count % 2 == 0 and total >= 10) { total = total / 2 }\n'
+             'ok = total != 3 or !false\n')
+    return block * max(1, int(2 * 1024 * 1024 * scale) // len(block))
+
+
+WORKLOADS = {
+    "deep_arithmetic": deep_arithmetic,
+    "counting_loop":   counting_loop,
+    "list_churn":      list_churn,
+    "string_building": string_building,
+    "nested_ifs":      nested_ifs,
+    "large_source":    large_source,
+}
+
+
+class _Discard(Output):
+    # An output sink that throws everything away
+    def write(self, text):
+        pass
+
+
+def execute(engine, statements):
+    # Run a parsed program on a fresh engine, as main.run_statements does
+    runner = ENGINES[engine](_Discard())
+    for stmt in runner.resolve(statements):
+        runner.execute(stmt)
+    return runner
+
+
+def count_statements(statements):
+    runner = ENGINES["tree"](_Discard())
+    counters = hooks.Counters()
+    counters.attach(runner)
+    for stmt in runner.resolve(statements):
+        runner.execute(stmt)
+    return counters.statements
+
+
+def peak_memory(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def reference():
+    # The yardstick for the machine's current speed: dictionary, list and
+    # arithmetic work like the interpreter's own
+    counts = {}
+    items = []
+    for i in range(20000):
+        key = i % 97
+        counts[key] = counts.get(key, 0) + i * 3
+        items.append(key)
+    return len(items) + len(counts)
+
+
+def per_call(fn):
+    # Seconds for the fastest of the calls to fn made over at least
+    # MIN_SAMPLE_SECONDS: other work on the machine only ever adds time
+    fastest = None
+    clock = perf_counter
+    end = clock() + MIN_SAMPLE_SECONDS
+    while True:
+        start = clock()
+        fn()
+        stop = clock()
+        if fastest is None or stop - start < fastest:
+            fastest = stop - start
+        if stop >= end:
+            return fastest
+
+
+def time_phase(fn, repeat):
+    """
+    Time `repeat` samples of fn, each followed by a sample of reference():
+    (median seconds, fastest seconds, fastest reference() seconds).
+    """
+    samples, references = [], []
+    for _ in range(repeat):
+        samples.append(per_call(fn))
+        references.append(per_call(reference))
+    return median(samples), min(samples), min(references)
+
+
+def workload_phases(source, engine):
+    # {phase: (function to time, ops)} for one program
+    tokens = list(scanner.scan(source))
+    statements = Parser(tokens).parse()
+    return {
+        "lex":     (lambda: list(lexer.tokenize(source)), len(tokens)),
+        "scan":    (lambda: list(scanner.scan(source)), len(tokens)),
+        "parse":   (lambda: Parser(tokens).parse(), len(tokens)),
+        "execute": (lambda: execute(engine, statements), count_statements(statements)),
+    }
+
+
+def run_workload(source, engine, repeat, memory):
+    """
+    Time the phases on one program: {phase: {seconds, best, reference,
+    ops, ops_per_sec, peak_bytes}}; see time_phase.
+    """
+    phases = workload_phases(source, engine)
+    results = {}
+    for phase in PHASES:
+        fn, ops = phases[phase]
+        seconds, best, ref = time_phase(fn, repeat)
+        results[phase] = {
+            "seconds": seconds,
+            "best": best,
+            "reference": ref,
+            "ops": ops,
+            "ops_per_sec": ops / seconds if seconds else None,
+            "peak_bytes": peak_memory(fn) if memory else None,
+        }
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    The phases slower than in `baseline` by more than `threshold`, as
+    (workload, phase, ratio), comparing the fastest times relative to
+    reference() (or the median seconds, for a baseline saved without
+    them).  Workloads or phases missing from either run, and phases that
+    took less than MIN_SECONDS in the baseline, are skipped.
+    """
+    regressions = []
+    for name, phases in results["workloads"].items():
+        base_phases = baseline["workloads"].get(name, {})
+        for phase, result in phases.items():
+            base = base_phases.get(phase)
+            if not base or base["seconds"] < MIN_SECONDS:
+                continue
+            if "reference" in base:
+                ratio = ((result["best"] / result["reference"])
+                         / (base["best"] / base["reference"]))
+            else:
+                ratio = result["seconds"] / base["seconds"]
+            if ratio > 1 + threshold:
+                regressions.append((name, phase, ratio))
+    return regressions
+
+
+def recheck(results, regressions, args):
+    """
+    Time the phases in `regressions` again, RECHECKS more times, keeping
+    the fastest figures: a phase slowed down by a burst of other work on
+    the machine is usually back to normal by then.
+    """
+    suspects = {}
+    for name, phase, _ in regressions:
+        suspects.setdefault(name, []).append(phase)
+    for name, phase_names in suspects.items():
+        phases = workload_phases(WORKLOADS[name](args.scale), args.engine)
+        for phase in phase_names:
+            result = results["workloads"][name][phase]
+            for _ in range(RECHECKS):
+                _, best, ref = time_phase(phases[phase][0], args.repeat)
+                result["best"] = min(result["best"], best)
+                result["reference"] = min(result["reference"], ref)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--scale", type=float, default=1.0,
+                            help="multiply the size of every workload")
+    arg_parser.add_argument("--repeat", type=int, default=5,
+                            help="timing samples per phase (default 5)")
+    arg_parser.add_argument("--engine", choices=ENGINES, default="tree")
+    arg_parser.add_argument("--only", nargs="+", choices=WORKLOADS, metavar="NAME",
+                            help="run only these workloads")
+    arg_parser.add_argument("--no-memory", action="store_true",
+                            help="skip the (slow) peak memory runs")
+    arg_parser.add_argument("--json", metavar="FILE", help="save the results as JSON")
+    arg_parser.add_argument("--baseline", metavar="FILE",
+                            help="JSON results of an earlier run to compare with")
+    arg_parser.add_argument("--threshold", type=float, default=0.25,
+                            help="allowed slowdown against the baseline (default 0.25 = 25%%)")
+    args = arg_parser.parse_args()
+
+    results = {
+        "python": platform.python_version(),
+        "engine": args.engine,
+        "scale": args.scale,
+        "repeat": args.repeat,
+        "workloads": {},
+    }
+    print(f"engine: {args.engine}, scale {args.scale} (median of {args.repeat} samples)")
+    print(f"  {'workload':<16} {'phase':<8} {'seconds':>9} {'ops':>10} "
+          f"{'ops/s':>12} {'peak MB':>8}")
+    for name in args.only or WORKLOADS:
+        source = WORKLOADS[name](args.scale)
+        phases = run_workload(source, args.engine, args.repeat, not args.no_memory)
+        results["workloads"][name] = phases
+        for phase, result in phases.items():
+            peak = result["peak_bytes"]
+            peak = "-" if peak is None else f"{peak / (1024 * 1024):.1f}"
+            print(f"  {name:<16} {phase:<8} {result['seconds']:9.3f} {result['ops']:>10} "
+                  f"{result['ops_per_sec']:12.0f} {peak:>8}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        for key in ("engine", "scale"):
+            if baseline.get(key) != results[key]:
+                print(f"warning: the baseline was run with {key} {baseline.get(key)}")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            recheck(results, regressions, args)
+            regressions = compare(results, baseline, args.threshold)
+        for name, phase, ratio in regressions:
+            print(f"REGRESSION {name} {phase}: {ratio:.2f}x the baseline time")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions beyond {args.threshold:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
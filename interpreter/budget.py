@@ -0,0 +1,142 @@
+import sys
+from time import monotonic
+
+from errors import BudgetExceeded
+from lists import NumberList
+from ropes import Rope
+
+# Execution budgets: limits on what one run may use, so that a runaway
+# program (while (true) { ... }, or a loop appending to a list forever)
+# stops with an errors.BudgetExceeded instead of stalling its process.
+#
+#   - iterations: while-loop iterations, in all loops together.  Only
+#     loops can run for long: a program without them executes each of its
+#     statements at most once.
+#   - seconds:    wall-clock time since the budget was given to the engine
+#   - memory:     approximate bytes held by the values of the globals,
+#                 strings and lists (with everything in them) included;
+#                 values that are only being computed are not counted
+#
+# An engine with a budget calls tick(position) at the start of every loop
+# iteration.  tick() only counts down; every CHECK_EVERY iterations (or
+# exactly at the iteration limit) check() counts the iterations and looks
+# at the clock.  Measuring memory means visiting every value the globals
+# hold, so it waits for at least 1 / MEMORY_SPACING as many iterations as
+# the last measurement visited values: its cost per iteration stays
+# constant, and a list growing by one element per iteration is caught
+# within about a quarter of the memory limit.  Time and iteration limits
+# can be passed by up to CHECK_EVERY iterations' worth of time.  Engines
+# without a budget compile or run their loops exactly as before, with no
+# accounting at all.
+#
+# BudgetExceeded is a ProgramError: it stops the run in strict and lenient
+# mode alike and says which while loop was running.
+
+# Iterations between two checks of the clock and memory
+CHECK_EVERY = 1000
+
+# Values visited by a memory measurement per iteration before the next one
+MEMORY_SPACING = 4
+
+
+class Budget:
+    """
+    The limits for one run; None means no limit.  `memory` is in bytes.
+    After the run, `iterations_used` and `seconds_used()` say how much was
+    used and `memory_used` is the last memory measurement (None if none
+    was made).
+    """
+    def __init__(self, iterations=None, seconds=None, memory=None,
+                 check_every=CHECK_EVERY):
+        self.iterations = iterations
+        self.seconds = seconds
+        self.memory = memory
+        self.check_every = check_every
+        self.iterations_used = 0
+        self.memory_used = None
+        self._start = None
+        self._roots = ()         # the engine's slots and env values
+        self._interval = 0       # iterations in the current countdown
+        # Iterations left before the next check().  Compiled code may
+        # count down and call check() itself instead of calling tick().
+        self.countdown = 0
+        self._memory_due = 0     # iterations_used at the next measurement
+
+    def start(self, slots, env):
+        """
+        Start the clock for a run whose globals live in `slots` and `env`.
+        """
+        self._start = monotonic()
+        self._roots = (slots, env)
+        self.iterations_used = 0
+        self._memory_due = 0
+        self._next_interval()
+
+    def seconds_used(self):
+        return 0.0 if self._start is None else monotonic() - self._start
+
+    def tick(self, position):
+        """
+        Count one loop iteration of the while loop at `position`.
+        """
+        self.countdown -= 1
+        if self.countdown <= 0:
+            self.check(position)
+
+    def check(self, position):
+        """
+        Count the iterations since the last check and test every limit.
+        """
+        self.iterations_used += self._interval
+        if self.iterations is not None and self.iterations_used > self.iterations:
+            raise BudgetExceeded("iterations", self.iterations,
+                                 self.iterations_used, position)
+        if self.seconds is not None:
+            elapsed = self.seconds_used()
+            if elapsed > self.seconds:
+                raise BudgetExceeded("seconds", self.seconds, elapsed, position)
+        if self.memory is not None and self.iterations_used >= self._memory_due:
+            self.memory_used, visited = heap_size(self._roots[0], self._roots[1].values())
+            self._memory_due = self.iterations_used + visited // MEMORY_SPACING
+            if self.memory_used > self.memory:
+                raise BudgetExceeded("memory", self.memory, self.memory_used, position)
+        self._next_interval()
+
+    def _next_interval(self):
+        interval = self.check_every
+        if self.iterations is not None:
+            # Check exactly at the first iteration over the limit
+            interval = max(1, min(interval, self.iterations + 1 - self.iterations_used))
+        self._interval = self.countdown = interval
+
+
+def heap_size(*groups):
+    """
+    The approximate bytes held by the values in the groups of values and
+    everything in their lists, counting shared lists once, and the number
+    of values visited.
+    """
+    size = visited = 0
+    seen = set()
+    stack = [value for group in groups for value in group]
+    while stack:
+        value = stack.pop()
+        visited += 1
+        t = type(value)
+        if t is str:
+            size += sys.getsizeof(value)
+        elif t is Rope:
+            parts = value.parts[:value.count]
+            size += sum(map(sys.getsizeof, parts))
+            visited += len(parts)
+        elif t is NumberList or t is list:
+            if id(value) in seen:
+                continue
+            seen.add(id(value))
+            items = value.storage() if t is NumberList else value
+            size += sys.getsizeof(items)
+            if type(items) is list:
+                stack.extend(items)
+        elif t is int or t is float:
+            size += sys.getsizeof(value)
+    return size, visited
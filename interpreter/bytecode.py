@@ -0,0 +1,450 @@
+from natives import BUILTINS
+from resolver import UNSET
+from runtime import COMPARE_OPS
+
+# ----------------------------------------------------------------------
+# Opcodes
+# ----------------------------------------------------------------------
+# Every instruction is two integers in the code list: the opcode and one
+# argument (0 when the instruction doesn't need one).  Jump arguments are
+# absolute positions in the code list.
+
+HALT                 = 0   # stop running this code object
+LOAD_CONST           = 1   # push consts[arg]
+LOAD_NAME            = 2   # push the global called names[arg]
+STORE_NAME           = 3   # pop a value into the global called names[arg]
+POP_TOP              = 4   # discard the top of the stack
+PRINT                = 5   # pop a value and print it
+ADD                  = 6   # binary arithmetic: pop b, pop a, push a op b
+SUB                  = 7
+MUL                  = 8
+DIV                  = 9
+MOD                  = 10
+NEG                  = 11  # unary minus on the top of the stack
+NOT                  = 12  # logical not on the top of the stack
+COMPARE              = 13  # pop b, pop a, push a <op> b (op = COMPARE_NAMES[arg])
+CHAIN_LINK           = 14  # middle link of a CHAIN, see below
+CHAIN_LAST           = 15  # last link of a CHAIN: pop b, pop a, push True/False
+BUILD_LIST           = 16  # pop arg values and push them as a new list
+INDEX                = 17  # pop index, pop list, push list[index]
+INPUT                = 18  # pop a prompt and push the line the user typed
+CALL_BUILTIN         = 19  # consts[arg] is (name, function, argument count)
+RAISE                = 20  # consts[arg] is (exception type, message)
+JUMP                 = 21  # continue at arg
+POP_JUMP_IF_FALSE    = 22  # pop a condition (must be boolean); jump if false
+JUMP_IF_FALSE_OR_POP = 23  # `and`: keep TOS and jump if falsy, else pop it
+JUMP_IF_TRUE_OR_POP  = 24  # `or`:  keep TOS and jump if truthy, else pop it
+LOAD_SLOT            = 25  # push the resolved global in slot arg
+STORE_SLOT           = 26  # pop a value into slot arg
+LOAD_LIST_CONST      = 27  # push a new list copied from the tuple consts[arg]
+LOAD_ROPE            = 28  # like LOAD_SLOT, joining a rope into a str first
+CONCAT               = 29  # like ADD, but strings are added as a rope
+LOAD_MEMO            = 30  # push slot arg as it is, UNSET included
+JUMP_IF_SET          = 31  # keep TOS and jump if it isn't UNSET, else pop it
+STORE_MEMO           = 32  # store TOS (kept) in slot arg, unless it's a list
+COUNT_ITERATION      = 33  # count a loop iteration against the run's budget
+
+OPNAMES = [
+    "HALT", "LOAD_CONST", "LOAD_NAME", "STORE_NAME", "POP_TOP", "PRINT",
+    "ADD", "SUB", "MUL", "DIV", "MOD", "NEG", "NOT",
+    "COMPARE", "CHAIN_LINK", "CHAIN_LAST", "BUILD_LIST", "INDEX", "INPUT",
+    "CALL_BUILTIN", "RAISE", "JUMP", "POP_JUMP_IF_FALSE",
+    "JUMP_IF_FALSE_OR_POP", "JUMP_IF_TRUE_OR_POP", "LOAD_SLOT", "STORE_SLOT",
+    "LOAD_LIST_CONST", "LOAD_ROPE", "CONCAT", "LOAD_MEMO", "JUMP_IF_SET",
+    "STORE_MEMO", "COUNT_ITERATION",
+]
+
+# Comparison operators are numbered by their position in this tuple.
+COMPARE_NAMES = ("EQ", "NEQ", "LT", "GT", "LE", "GE")
+
+# CHAIN_LINK needs both an operator and a jump target, so its argument
+# packs them together: (target << CHAIN_SHIFT) | operator number.
+CHAIN_SHIFT = 3
+
+_ARITHMETIC = {"PLUS": ADD, "MINUS": SUB, "MUL": MUL, "DIV": DIV, "MOD": MOD}
+_JUMPS = (JUMP, POP_JUMP_IF_FALSE, JUMP_IF_FALSE_OR_POP, JUMP_IF_TRUE_OR_POP,
+          JUMP_IF_SET)
+
+
+class Code:
+    """
+    A compiled program: a flat list of instructions plus the tables the
+    instructions refer to.
+      - code:    [opcode, arg, opcode, arg, ...]
+      - consts:  literal values and builtin descriptors
+      - names:   global variable names
+      - slot_names: slot number -> name, for the resolved globals used
+      - recover: for each instruction (code position // 2), where to carry
+                 on if it raises: the end of the innermost statement that
+                 contains it.  This gives the VM the same "print the error
+                 and continue" behaviour as Interpreter.execute.
+      - positions: likewise, the source position of that statement
+    """
+    def __init__(self, code, consts, names, slot_names, recover, positions):
+        self.code = code
+        self.consts = consts
+        self.names = names
+        self.slot_names = slot_names
+        self.recover = recover
+        self.positions = positions
+
+
+class Compiler:
+    """
+    Lowers the tuple AST produced by Parser.parse into a Code object.
+    With `count_iterations`, while loops start every iteration with
+    COUNT_ITERATION, for runs with a budget.
+    """
+    def __init__(self, count_iterations=False):
+        self.count_iterations = count_iterations
+        self.code = []
+        self.consts = []
+        self.names = []
+        self.slot_names = {}
+        self._const_index = {}
+        self._name_index = {}
+        # (start, end, position) code ranges of every compiled statement
+        self._statements = []
+
+    def compile(self, statements):
+        """
+        Compile a list of statements into a runnable Code object.
+        """
+        for stmt in statements:
+            self.stmt(stmt)
+        self.emit(HALT)
+
+        # Fill in the recovery table.  Statements are recorded after their
+        # children, so walking the list backwards visits outer statements
+        # first and lets the inner ones overwrite their own ranges.
+        recover = [0] * (len(self.code) // 2)
+        positions = [()] * (len(self.code) // 2)
+        for start, end, position in reversed(self._statements):
+            for i in range(start // 2, end // 2):
+                recover[i] = end
+                positions[i] = position
+        return Code(self.code, self.consts, self.names, self.slot_names,
+                    recover, positions)
+
+    # ------------------------------------------------------------------
+    # Emitting helpers
+    # ------------------------------------------------------------------
+
+    def emit(self, op, arg=0):
+        """
+        Append one instruction; returns its position for later patching.
+        """
+        self.code.append(op)
+        self.code.append(arg)
+        return len(self.code) - 2
+
+    def patch(self, at, target):
+        """
+        Point the jump emitted at position `at` to `target`.
+        """
+        if self.code[at] == CHAIN_LINK:
+            self.code[at + 1] = (target << CHAIN_SHIFT) | self.code[at + 1]
+        else:
+            self.code[at + 1] = target
+
+    def const(self, value):
+        """
+        Index of `value` in the constant pool, adding it if needed.
+        The type is part of the key so 1.0, 1 and True stay distinct,
+        including inside list templates.
+        """
+        if type(value) is tuple:
+            key = (tuple, tuple(_const_key(v) for v in value))
+        else:
+            key = _const_key(value)
+        if key not in self._const_index:
+            self._const_index[key] = len(self.consts)
+            self.consts.append(value)
+        return self._const_index[key]
+
+    def name(self, name):
+        """
+        Index of a global variable name in the names table.
+        """
+        if name not in self._name_index:
+            self._name_index[name] = len(self.names)
+            self.names.append(name)
+        return self._name_index[name]
+
+    def raise_error(self, exc_type, message):
+        """
+        Emit an instruction that raises exc_type(message) when reached.
+        """
+        self.emit(RAISE, self.const((exc_type, message)))
+
+    # ------------------------------------------------------------------
+    # Statements
+    # ------------------------------------------------------------------
+
+    def block(self, stmts):
+        for stmt in stmts:
+            self.stmt(stmt)
+
+    def stmt(self, stmt):
+        """
+        Compile one statement and record its range for error recovery.
+        """
+        start = len(self.code)
+        kind = stmt[0]
+
+        if kind == "PRINT":
+            self.expr(stmt[1])
+            self.emit(PRINT)
+
+        elif kind == "ASSIGN":
+            self.expr(stmt[2])
+            self.emit(STORE_NAME, self.name(stmt[1]))
+
+        elif kind == "STORE":
+            self.expr(stmt[3])
+            self.slot_names[stmt[1]] = stmt[2]
+            self.emit(STORE_SLOT, stmt[1])
+
+        elif kind == "CONCAT":
+            # The slot is read as it is (it may hold a rope), each piece
+            # added on, and the result stored back only at the end
+            slot, name, pieces = stmt[1:4]
+            self.slot_names[slot] = name
+            self.emit(LOAD_SLOT, slot)
+            for piece in pieces:
+                self.expr(piece)
+                self.emit(CONCAT)
+            self.emit(STORE_SLOT, slot)
+
+        elif kind == "CLEAR_SLOTS":
+            for slot in stmt[1]:
+                self.emit(LOAD_CONST, self.const(UNSET))
+                self.emit(STORE_SLOT, slot)
+
+        elif kind == "CALL":
+            # Called for its side effects only
+            self.expr(stmt)
+            self.emit(POP_TOP)
+
+        elif kind == "IF":
+            cond, then_blk, else_blk = stmt[1:4]
+            self.expr(cond)
+            to_else = self.emit(POP_JUMP_IF_FALSE)
+            self.block(then_blk or [])
+            if else_blk:
+                to_end = self.emit(JUMP)
+                self.patch(to_else, len(self.code))
+                self.block(else_blk)
+                self.patch(to_end, len(self.code))
+            else:
+                self.patch(to_else, len(self.code))
+
+        elif kind == "WHILE":
+            cond, body = stmt[1:3]
+            top = len(self.code)
+            self.expr(cond)
+            to_end = self.emit(POP_JUMP_IF_FALSE)
+            if self.count_iterations:
+                self.emit(COUNT_ITERATION)
+            self.block(body)
+            self.emit(JUMP, top)
+            self.patch(to_end, len(self.code))
+
+        # Unknown statement kinds are ignored, as in Interpreter.execute.
+        self._statements.append((start, len(self.code), stmt[-1]))
+
+    # ------------------------------------------------------------------
+    # Expressions
+    # ------------------------------------------------------------------
+
+    def expr(self, node):
+        """
+        Compile an expression so that it leaves its value on the stack.
+        """
+        t = node[0]
+
+        if t in ("NUMBER", "STRING", "BOOL"):
+            self.emit(LOAD_CONST, self.const(node[1]))
+
+        elif t == "LOAD":
+            self.slot_names[node[1]] = node[2]
+            self.emit(LOAD_SLOT, node[1])
+
+        elif t == "LOAD_ROPE":
+            self.slot_names[node[1]] = node[2]
+            self.emit(LOAD_ROPE, node[1])
+
+        elif t == "MEMO_SLOT":
+            # The remembered value if there is one, else compute it
+            slot, name, value = node[1:4]
+            self.slot_names[slot] = name
+            self.emit(LOAD_MEMO, slot)
+            to_end = self.emit(JUMP_IF_SET)
+            self.expr(value)
+            self.emit(STORE_MEMO, slot)
+            self.patch(to_end, len(self.code))
+
+        elif t == "VAR":
+            self.emit(LOAD_NAME, self.name(node[1]))
+
+        elif t == "INPUT":
+            self.expr(node[1])
+            self.emit(INPUT)
+
+        elif t == "LIST":
+            for elem in node[1]:
+                self.expr(elem)
+            self.emit(BUILD_LIST, len(node[1]))
+
+        elif t == "LIST_CONST":
+            self.emit(LOAD_LIST_CONST, self.const(node[1]))
+
+        elif t == "INDEX":
+            self.expr(node[1])
+            self.expr(node[2])
+            self.emit(INDEX)
+
+        elif t == "CALL":
+            self.call(node[1], node[2])
+
+        elif t == "NOT":
+            self.expr(node[1])
+            self.emit(NOT)
+
+        elif t == "NEG":
+            self.expr(node[1])
+            self.emit(NEG)
+
+        elif t in _ARITHMETIC:
+            self.expr(node[1])
+            self.expr(node[2])
+            self.emit(_ARITHMETIC[t])
+
+        elif t in COMPARE_OPS:
+            self.expr(node[1])
+            self.expr(node[2])
+            self.emit(COMPARE, COMPARE_NAMES.index(t))
+
+        elif t == "CHAIN":
+            self.chain(node[1], node[2])
+
+        elif t in ("AND", "OR"):
+            self.expr(node[1])
+            jump = JUMP_IF_FALSE_OR_POP if t == "AND" else JUMP_IF_TRUE_OR_POP
+            to_end = self.emit(jump)
+            self.expr(node[2])
+            self.patch(to_end, len(self.code))
+
+        else:
+            # Only an error if the expression is actually evaluated
+            self.raise_error(ValueError, f"Unknown node type: {t}")
+
+    def call(self, name, args):
+        """
+        Compile a builtin call: evaluate its arguments, then call it.
+        """
+        if name not in BUILTINS:
+            self.raise_error(NameError, f"Unknown function: {name}")
+            return
+
+        fn, min_args, max_args = BUILTINS[name]
+        given = args[:max_args]
+        for arg in given:
+            self.expr(arg)
+        if len(given) < min_args:
+            # The tree walker fails when it reaches the missing argument
+            self.raise_error(IndexError, "list index out of range")
+            return
+        self.emit(CALL_BUILTIN, self.const((name, fn, len(given))))
+
+    def chain(self, base, comps):
+        """
+        Compile a chained comparison a < b < c ...
+        Each middle link leaves its right-hand value on the stack for the
+        next link, or pushes False and jumps to the end if it failed.
+        """
+        self.expr(base)
+        exits = []
+        for op, rhs in comps[:-1]:
+            self.expr(rhs)
+            exits.append(self.emit(CHAIN_LINK, COMPARE_NAMES.index(op)))
+        op, rhs = comps[-1]
+        self.expr(rhs)
+        self.emit(CHAIN_LAST, COMPARE_NAMES.index(op))
+        for at in exits:
+            self.patch(at, len(self.code))
+
+
+def compile_program(statements, count_iterations=False):
+    """
+    Convenience wrapper: compile a statement list into a Code object.
+    """
+    return Compiler(count_iterations).compile(statements)
+
+
+def _const_key(value):
+    # 0.0 == -0.0, so floats are keyed on their repr to keep the signed
+    # zeros (and every NaN) apart
+    if type(value) is float:
+        return (float, repr(value))
+    return (type(value), value)
+
+
+def _const_repr(value):
+    # Builtin and RAISE descriptors are tuples; show them compactly
+    if isinstance(value, tuple) and len(value) == 3 and callable(value[1]):
+        return f"<builtin {value[0]}>"
+    if isinstance(value, tuple) and len(value) == 2 and isinstance(value[0], type):
+        return f"<raise {value[0].__name__}>"
+    if isinstance(value, tuple):
+        # A list template used by LOAD_LIST_CONST
+        return repr(list(value))
+    return repr(value)
+
+
+def disassemble(code):
+    """
+    Return a human-readable listing of a Code object, one instruction
+    per line, for debugging the compiler.
+    """
+    lines = []
+    jump_targets = set()
+    for pos in range(0, len(code.code), 2):
+        op, arg = code.code[pos], code.code[pos + 1]
+        if op in _JUMPS:
+            jump_targets.add(arg)
+        elif op == CHAIN_LINK:
+            jump_targets.add(arg >> CHAIN_SHIFT)
+
+    for pos in range(0, len(code.code), 2):
+        op, arg = code.code[pos], code.code[pos + 1]
+        detail = ""
+        if op in (LOAD_CONST, LOAD_LIST_CONST):
+            detail = f"({_const_repr(code.consts[arg])})"
+        elif op in (LOAD_NAME, STORE_NAME):
+            detail = f"({code.names[arg]})"
+        elif op in (LOAD_SLOT, STORE_SLOT, LOAD_ROPE, LOAD_MEMO, STORE_MEMO):
+            # CLEAR_SLOTS stores to slots without naming them
+            detail = f"({code.slot_names.get(arg, f'slot {arg}')})"
+        elif op in (COMPARE, CHAIN_LAST):
+            detail = f"({COMPARE_NAMES[arg]})"
+        elif op == CHAIN_LINK:
+            op_num, target = arg & ((1 << CHAIN_SHIFT) - 1), arg >> CHAIN_SHIFT
+            detail = f"({COMPARE_NAMES[op_num]}, else to {target})"
+        elif op == CALL_BUILTIN:
+            name, _, arity = code.consts[arg]
+            detail = f"({name}/{arity})"
+        elif op == RAISE:
+            exc_type, message = code.consts[arg]
+            detail = f"({exc_type.__name__}: {message})"
+        elif op in _JUMPS:
+            detail = f"(to {arg})"
+
+        marker = ">>" if pos in jump_targets else "  "
+        text = f"{marker} {pos:5d} {OPNAMES[op]:<22} {arg:<5d} {detail}"
+        lines.append(text.rstrip())
+
+    lines.append("")
+    lines.append("consts: [" + ", ".join(_const_repr(c) for c in code.consts) + "]")
+    lines.append(f"names:  {code.names!r}")
+    return "\n".join(lines)
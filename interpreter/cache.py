@@ -0,0 +1,196 @@
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+
+# An on-disk cache of parsed programs, in the spirit of Python's .pyc files.
+#
+# The first time a file is run, its (optionally optimized) statement list
+# is saved in a cache directory; later runs of the same source load it
+# instead of lexing and parsing again.  Entries are keyed by a hash of
+#   - the source text,
+#   - the interpreter version (a hash of the lexer, scanner, parser and optimizer
+#     sources, so editing them invalidates every entry), and
+#   - the options that change the tree (`optimize` and `float_numbers`).
+# The AST is made only of tuples, lists, strings, numbers, booleans and
+# None, so it is stored with marshal, which is fast and cannot run code
+# when loading.
+
+# Bump when the entry layout changes
+CACHE_FORMAT = 1
+MAGIC = b"LDC%d" % CACHE_FORMAT
+
+# Default directory name, created next to the source file
+CACHE_DIR_NAME = "__langcache__"
+
+# Default size limit for one cache directory
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _interpreter_version():
+    """
+    A fingerprint of the code that produces cached trees.
+    """
+    digest = hashlib.sha256()
+    here = os.path.dirname(os.path.abspath(__file__))
+    # Everything parse_source runs: the optimizer folds constants with
+    # runtime.py, and its dataflow pass (-O) reads natives.py's tables.
+    # Trees are cached before the resolver runs.
+    for name in ("lexer.py", "scanner.py", "parser.py", "optimizer.py",
+                 "dataflow.py", "natives.py", "runtime.py"):
+        with open(os.path.join(here, name), "rb") as f:
+            digest.update(f.read())
+    # marshal's format may change between Python versions
+    digest.update(sys.version.encode())
+    return digest.hexdigest()
+
+
+INTERPRETER_VERSION = _interpreter_version()
+
+
+class ProgramCache:
+    """
+    Loads and stores parsed programs.
+      - directory: where entries live; None means a __langcache__
+                   directory next to each source file.
+      - max_bytes: once the directory grows past this, the least
+                   recently used entries are deleted.
+    """
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, code, optimize=False, float_numbers=False):
+        """
+        The cache key for a program's source text.
+        """
+        digest = hashlib.sha256()
+        digest.update(INTERPRETER_VERSION.encode())
+        digest.update(b"O" if optimize else b"-")
+        digest.update(b"F" if float_numbers else b"-")
+        digest.update(code.encode("utf-8"))
+        return digest.hexdigest()
+
+    def entry_path(self, file_path, key):
+        directory = self.directory
+        if directory is None:
+            directory = os.path.join(os.path.dirname(os.path.abspath(file_path)),
+                                     CACHE_DIR_NAME)
+        name = os.path.basename(file_path)
+        return os.path.join(directory, f"{name}.{key[:16]}.ast")
+
+    def load(self, file_path, key):
+        """
+        Return the cached statements for `key`, or None on a miss.
+        Unreadable or mismatching entries count as misses and are removed.
+        """
+        path = self.entry_path(file_path, key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        header = MAGIC + key.encode()
+        if not data.startswith(header):
+            self._discard(path)
+            return None
+        try:
+            statements = marshal.loads(data[len(header):])
+        except (ValueError, EOFError, TypeError):
+            self._discard(path)
+            return None
+
+        # Mark the entry as recently used for eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return statements
+
+    def store(self, file_path, key, statements):
+        """
+        Save statements under `key`.  The entry is written to a temporary
+        file and renamed into place, so concurrent runs never see a
+        half-written entry.  Failures (read-only directory, ...) are
+        ignored: the cache is only an optimisation.
+        """
+        path = self.entry_path(file_path, key)
+        directory = os.path.dirname(path)
+        try:
+            payload = MAGIC + key.encode() + marshal.dumps(statements)
+        except ValueError:
+            return   # something in the tree marshal can't store
+
+        tmp_path = None
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+            tmp_path = None
+        except OSError:
+            return
+        finally:
+            if tmp_path is not None:
+                self._discard(tmp_path)
+
+        self.evict(directory)
+
+    def evict(self, directory):
+        """
+        Delete least recently used entries until the directory fits in
+        max_bytes.
+        """
+        entries = []
+        total = 0
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith(".ast"):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue   # removed by another run meanwhile
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._discard(path)
+            total -= size
+
+    def _discard(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def load_program(file_path, parse, optimize=False, cache=None, float_numbers=False):
+    """
+    Read a source file and return its statements, going through `cache`
+    when one is given.  `parse(code, optimize, float_numbers)` does the
+    actual work on a cache miss.
+    """
+    # Read source file as UTF-8 to avoid platform default encoding issues
+    with open(file_path, "r", encoding="utf-8") as f:
+        code = f.read()
+
+    if cache is None:
+        return parse(code, optimize, float_numbers)
+
+    key = cache.key(code, optimize, float_numbers)
+    statements = cache.load(file_path, key)
+    if statements is None:
+        statements = parse(code, optimize, float_numbers)
+        cache.store(file_path, key, statements)
+    return statements
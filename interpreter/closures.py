@@ -0,0 +1,425 @@
+from interpreter import Interpreter
+from resolver import UNSET
+from lists import LIST_TYPES, new_list
+from natives import BUILTINS
+from ropes import Rope, concat, load_rope
+from runtime import (COMPARE_OPS, ORDERED_TYPES, compare_eager,
+                     plus, negate, index, read_input)
+
+
+class ClosureCompiler:
+    """
+    Turns AST nodes into nested Python closures.
+
+    The tree walker decides what to do with a node every time it visits it.
+    Here that decision is made once: each node is compiled into a small
+    function that already knows its children, so running a `while` body
+    a million times only pays for the actual work.
+      - compile_expr(node) returns a function that takes no arguments
+        and returns the value of the expression.
+      - compile_stmt(stmt) returns a function that runs the statement.
+    Variables are read from and written to `env`, the same dictionary the
+    Interpreter uses for its globals, or to `slots` once resolved, and
+    output goes to the Interpreter's `output` sink.  Failing statements
+    call `report` (see errors.reporter).  While loops compiled with a
+    `budget` (see budget.py) count their iterations.
+    """
+    def __init__(self, env, slots, output, report, budget=None):
+        self.env = env
+        self.slots = slots
+        self.output = output
+        self.report = report
+        self.budget = budget
+
+    # ------------------------------------------------------------------
+    # Statements
+    # ------------------------------------------------------------------
+
+    def compile_block(self, stmts):
+        """
+        Compile a list of statements into a single function that runs
+        them in order.
+        """
+        runs = tuple(self.compile_stmt(s) for s in stmts)
+        if len(runs) == 1:
+            return runs[0]
+
+        def run_block():
+            for run in runs:
+                run()
+        return run_block
+
+    def compile_stmt(self, stmt):
+        """
+        Compile one statement.  Like Interpreter.execute, every compiled
+        statement catches its own errors and reports them with its position.
+        """
+        kind = stmt[0]
+        report, position = self.report, stmt[-1]
+
+        if kind == "PRINT":
+            value = self.compile_expr(stmt[1])
+            output = self.output.print
+
+            def run_print():
+                try:
+                    output(value())
+                except Exception as e:
+                    report(e, position)
+            return run_print
+
+        if kind == "ASSIGN":
+            env, name = self.env, stmt[1]
+            value = self.compile_expr(stmt[2])
+
+            def run_assign():
+                try:
+                    env[name] = value()
+                except Exception as e:
+                    report(e, position)
+            return run_assign
+
+        if kind == "STORE":
+            slots, slot = self.slots, stmt[1]
+            value = self.compile_expr(stmt[3])
+
+            def run_store():
+                try:
+                    slots[slot] = value()
+                except Exception as e:
+                    report(e, position)
+            return run_store
+
+        if kind == "CONCAT":
+            return self.compile_concat(*stmt[1:])
+
+        if kind == "CALL":
+            call = self.compile_expr(stmt)
+
+            def run_call():
+                try:
+                    call()
+                except Exception as e:
+                    report(e, position)
+            return run_call
+
+        if kind == "IF":
+            cond, then_blk, else_blk = stmt[1:4]
+            test = self.compile_expr(cond)
+            then_run = self.compile_block(then_blk) if then_blk else None
+            else_run = self.compile_block(else_blk) if else_blk else None
+
+            def run_if():
+                try:
+                    t = test()
+                    if t is True:
+                        if then_run is not None:
+                            then_run()
+                    elif t is False:
+                        if else_run is not None:
+                            else_run()
+                    else:
+                        raise TypeError("Condition must be boolean")
+                except Exception as e:
+                    report(e, position)
+            return run_if
+
+        if kind == "WHILE":
+            cond, body = stmt[1:3]
+            test = self.compile_expr(cond)
+            body_run = self.compile_block(body) if body else None
+            if self.budget is not None:
+                return self.compile_counted_while(test, body_run, position)
+
+            def run_while():
+                try:
+                    while True:
+                        t = test()
+                        if t is False:
+                            break
+                        if t is not True:
+                            raise TypeError("Condition must be boolean")
+                        if body_run is not None:
+                            body_run()
+                except Exception as e:
+                    report(e, position)
+            return run_while
+
+        if kind == "CLEAR_SLOTS":
+            slots, cleared = self.slots, tuple(stmt[1])
+
+            def run_clear():
+                for slot in cleared:
+                    slots[slot] = UNSET
+            return run_clear
+
+        # The tree walker silently ignores statement kinds it doesn't know.
+        def run_nothing():
+            pass
+        return run_nothing
+
+    def compile_counted_while(self, test, body_run, position):
+        """
+        A while loop that counts its iterations against the budget.
+        """
+        report, tick = self.report, self.budget.tick
+
+        def run_counted_while():
+            try:
+                while True:
+                    t = test()
+                    if t is False:
+                        break
+                    if t is not True:
+                        raise TypeError("Condition must be boolean")
+                    tick(position)
+                    if body_run is not None:
+                        body_run()
+            except Exception as e:
+                report(e, position)
+        return run_counted_while
+
+    def compile_concat(self, slot, name, pieces, position):
+        """
+        Compile `x = x + piece + ...`.  Numbers and lists are added
+        directly; strings go through ropes.concat.
+        """
+        slots = self.slots
+        pieces = tuple(self.compile_expr(p) for p in pieces)
+        report = self.report
+
+        def run_concat():
+            try:
+                value = slots[slot]
+                if value is UNSET:
+                    raise NameError(f"Undefined variable: {name}")
+                for piece in pieces:
+                    b = piece()
+                    if type(value) is type(b) and type(b) is not str:
+                        value = value + b
+                    else:
+                        value = concat(value, b)
+                slots[slot] = value
+            except Exception as e:
+                report(e, position)
+        return run_concat
+
+    # ------------------------------------------------------------------
+    # Expressions
+    # ------------------------------------------------------------------
+
+    def compile_expr(self, node):
+        """
+        Compile one expression node into a zero-argument function.
+        """
+        t = node[0]
+
+        # --- Literals: the value is captured in the closure ---
+        if t in ("NUMBER", "STRING", "BOOL"):
+            value = node[1]
+            return lambda: value
+
+        # --- Variables ---
+        if t == "LOAD":
+            slots, slot, name = self.slots, node[1], node[2]
+
+            def load_slot():
+                value = slots[slot]
+                if value is UNSET:
+                    raise NameError(f"Undefined variable: {name}")
+                return value
+            return load_slot
+
+        if t == "LOAD_ROPE":
+            slots, slot, name = self.slots, node[1], node[2]
+
+            def load_rope_slot():
+                value = slots[slot]
+                if value is UNSET or type(value) is Rope:
+                    return load_rope(slots, slot, name)
+                return value
+            return load_rope_slot
+
+        if t == "MEMO_SLOT":
+            # Evaluated once, then read back (see dataflow.py)
+            slots, slot = self.slots, node[1]
+            value = self.compile_expr(node[3])
+
+            def memo():
+                result = slots[slot]
+                if result is UNSET:
+                    result = value()
+                    if not isinstance(result, LIST_TYPES):
+                        slots[slot] = result
+                return result
+            return memo
+
+        if t == "VAR":
+            env, name = self.env, node[1]
+
+            def load():
+                try:
+                    return env[name]
+                except KeyError:
+                    raise NameError(f"Undefined variable: {name}") from None
+            return load
+
+        if t == "INPUT":
+            prompt = self.compile_expr(node[1])
+            output = self.output
+            return lambda: read_input(prompt(), output)
+
+        if t == "LIST":
+            elems = tuple(self.compile_expr(e) for e in node[1])
+            return lambda: new_list([e() for e in elems])
+
+        if t == "LIST_CONST":
+            template = node[1]
+            return lambda: new_list(template)
+
+        if t == "INDEX":
+            lst, idx = self.compile_expr(node[1]), self.compile_expr(node[2])
+            return lambda: index(lst(), idx())
+
+        if t == "CALL":
+            return self.compile_call(node[1], node[2])
+
+        # --- Unary operators ---
+        if t == "NOT":
+            operand = self.compile_expr(node[1])
+            return lambda: not operand()
+
+        if t == "NEG":
+            operand = self.compile_expr(node[1])
+            return lambda: negate(operand())
+
+        # --- Binary arithmetic ---
+        if t in ("PLUS", "MINUS", "MUL", "DIV", "MOD"):
+            a, b = self.compile_expr(node[1]), self.compile_expr(node[2])
+            if t == "PLUS":
+                return lambda: plus(a(), b())
+            if t == "MINUS":
+                return lambda: a() - b()
+            if t == "MUL":
+                return lambda: a() * b()
+            if t == "DIV":
+                return lambda: a() / b()
+            return lambda: a() % b()
+
+        # --- Single comparisons (only the requested one is computed) ---
+        if t in COMPARE_OPS:
+            fn = COMPARE_OPS[t]
+            a, b = self.compile_expr(node[1]), self.compile_expr(node[2])
+            return lambda: fn(a(), b())
+
+        if t == "CHAIN":
+            return self.compile_chain(node[1], node[2])
+
+        # --- Boolean logic (short-circuiting, like Python's and/or) ---
+        if t == "AND":
+            a, b = self.compile_expr(node[1]), self.compile_expr(node[2])
+            return lambda: a() and b()
+
+        if t == "OR":
+            a, b = self.compile_expr(node[1]), self.compile_expr(node[2])
+            return lambda: a() or b()
+
+        # Unknown nodes only fail if they are actually evaluated.
+        def unknown():
+            raise ValueError(f"Unknown node type: {t}")
+        return unknown
+
+    def compile_call(self, name, args):
+        """
+        Compile a builtin call.  The builtin is looked up now; unknown
+        names still only raise when the call runs, as in the tree walker.
+        """
+        if name not in BUILTINS:
+            def unknown_call():
+                raise NameError(f"Unknown function: {name}")
+            return unknown_call
+
+        fn, min_args, max_args = BUILTINS[name]
+        compiled = [self.compile_expr(a) for a in args[:max_args]]
+        if len(compiled) < min_args:
+            # Evaluate what is there, then fail like the tree walker does
+            given = tuple(compiled)
+
+            def missing_argument():
+                for c in given:
+                    c()
+                raise IndexError("list index out of range")
+            return missing_argument
+
+        if len(compiled) == 1:
+            only, = compiled
+            return lambda: fn(only())
+        if len(compiled) == 2:
+            first, second = compiled
+            return lambda: fn(first(), second())
+        return lambda: fn(*[c() for c in compiled])
+
+    def compile_chain(self, base, comps):
+        """
+        Compile a chained comparison like 1 < x < 5.
+        Links are evaluated left to right and stop at the first false one.
+        """
+        first = self.compile_expr(base)
+        links = tuple((op, COMPARE_OPS[op], self.compile_expr(e))
+                      for op, e in comps)
+
+        if len(links) == 1:
+            # By far the most common case: a single comparison.
+            op, fn, second = links[0]
+
+            def compare():
+                a = first()
+                b = second()
+                if type(a) is type(b) and type(a) in ORDERED_TYPES:
+                    return fn(a, b)
+                return compare_eager(op, a, b)
+            return compare
+
+        def chain():
+            current = first()
+            for op, fn, nxt_expr in links:
+                nxt = nxt_expr()
+                if type(current) is type(nxt) and type(current) in ORDERED_TYPES:
+                    valid = fn(current, nxt)
+                else:
+                    valid = compare_eager(op, current, nxt)
+                if not valid:
+                    return False
+                current = nxt
+            return True
+        return chain
+
+
+class ClosureInterpreter(Interpreter):
+    """
+    An Interpreter that compiles each statement into closures before
+    running it.  It keeps the same `env` and error reporting, so it can be
+    used anywhere the tree-walking Interpreter is.
+    """
+    walks_tree = False
+
+    def __init__(self, output=None, strict=False):
+        super().__init__(output, strict)
+        self.compiler = ClosureCompiler(self.env, self.slots, self.output, self.report)
+
+    def set_budget(self, budget):
+        super().set_budget(budget)
+        self.compiler.budget = budget
+
+    def compile(self, statements):
+        """
+        Compile a whole statement list once and return a function
+        that runs it.
+        """
+        return self.compiler.compile_block(statements)
+
+    def execute(self, stmt):
+        """
+        Compile a single statement and run it straight away.
+        """
+        self.compiler.compile_stmt(stmt)()
@@ -0,0 +1,346 @@
+from natives import NEW_LISTS, PURE
+
+# Dataflow optimizations, run by optimizer.optimize() after folding:
+#   - loop-invariant code motion: inside a while loop, a pure expression
+#     that reads no variable the loop assigns (n * 2, nested[1][0],
+#     prefix + " ") has the same value on every iteration, so it is
+#     computed once per run of the loop instead of once per iteration
+#   - common subexpressions: an expression that appears more than once in
+#     a statement of a loop body (x = a[i] * a[i]) is computed once per
+#     run of the statement.  Statements outside loops run once, so they
+#     are not worth analysing.
+#
+# An expression is pure when it calls no builtin outside natives.PURE and
+# reads no input.  append, remove, extend and sort change lists in place
+# and input() and the file builtins consume input, so a loop (or
+# statement) containing any of them is left alone entirely: the
+# analysis does not track which lists a call may change.
+#
+# Nothing is evaluated earlier than before.  The expression is replaced
+# by ("MEMO", temp, expr), which evaluates expr where it stands the first
+# time it is reached and remembers the value in the hidden variable
+# `temp`; later evaluations reuse it.  A ("FORGET", [temp, ...], position)
+# statement in front of the loop or statement clears the temps, so every
+# run starts afresh.  Errors are not remembered (the expression is tried
+# again next time, and fails again in the same way) and neither are list
+# values, which must stay distinct objects, so the program behaves
+# exactly as before, only faster.  The resolver turns these nodes into
+# MEMO_SLOT and CLEAR_SLOTS, which the engines run.
+#
+# Programs that are already resolved are left as they are.
+
+# A repeated subexpression is only shared within a statement if this
+# many nodes are saved: sharing costs an extra FORGET statement.
+MIN_SAVED = 4
+
+# Node kinds whose value is always a new list: never worth remembering
+_NEW_LIST_KINDS = ("LIST", "LIST_CONST")
+
+_BINARY = ("PLUS", "MINUS", "MUL", "DIV", "MOD", "EQ", "NEQ", "LT", "GT",
+           "LE", "GE", "AND", "OR", "INDEX")
+
+
+class _Info:
+    # What the analysis knows about one expression node
+    __slots__ = ("node", "reads", "pure", "size", "key")
+
+    def __init__(self, node, reads, pure, size):
+        self.node = node     # keeps id(node) valid while the pass runs
+        self.reads = reads   # the variables it reads
+        self.pure = pure     # no side effects (see above)
+        self.size = size     # number of nodes
+        self.key = None      # repr(node), computed when first needed
+
+
+class Dataflow:
+    """
+    Applies loop-invariant code motion and common-subexpression
+    elimination to an (unresolved) statement list.
+    """
+    def __init__(self):
+        self._info = {}    # id(node) -> _Info
+        self._temps = 0
+
+    def optimize(self, statements):
+        return self.block(statements)
+
+    def temp(self):
+        """
+        A fresh hidden variable; `%` can't start a name in source code.
+        """
+        self._temps += 1
+        return f"%{self._temps}"
+
+    # ------------------------------------------------------------------
+    # Analysis
+    # ------------------------------------------------------------------
+
+    def info(self, node):
+        """
+        The reads, purity and size of an expression, computed once.
+        """
+        found = self._info.get(id(node))
+        if found is not None:
+            return found
+
+        t = node[0]
+        if t in ("NUMBER", "STRING", "BOOL", "LIST_CONST"):
+            result = _Info(node, frozenset(), True, 1)
+        elif t == "VAR":
+            result = _Info(node, frozenset((node[1],)), True, 1)
+        else:
+            children, pure = _children(node)
+            reads, size = frozenset(), 1
+            for child in children:
+                child_info = self.info(child)
+                reads |= child_info.reads
+                pure = pure and child_info.pure
+                size += child_info.size
+            result = _Info(node, reads, pure, size)
+        self._info[id(node)] = result
+        return result
+
+    def key(self, node):
+        info = self.info(node)
+        if info.key is None:
+            info.key = repr(node)
+        return info.key
+
+    def worth_remembering(self, node):
+        """
+        Whether `node` is a pure computation whose value may be reused:
+        not a plain variable or literal, and not one that always makes a
+        new list.
+        """
+        t = node[0]
+        if t in ("NUMBER", "STRING", "BOOL", "VAR", "MEMO") or t in _NEW_LIST_KINDS:
+            return False
+        if t == "CALL" and node[1] in NEW_LISTS:
+            return False
+        return self.info(node).pure
+
+    def effects(self, stmts, writes):
+        """
+        Add the variables `stmts` assign (at any depth) to `writes`;
+        returns False if any of them has side effects.
+        """
+        pure = True
+        for stmt in stmts or ():
+            kind = stmt[0]
+            if kind == "ASSIGN":
+                writes.add(stmt[1])
+            elif kind == "FORGET":
+                continue
+            elif kind not in ("PRINT", "CALL", "IF", "WHILE"):
+                # Resolved or unknown statements: don't touch the loop
+                pure = False
+                continue
+            for node in _statement_exprs(stmt):
+                pure = self.info(node).pure and pure
+            if kind == "IF":
+                pure = self.effects(stmt[2], writes) and pure
+                pure = self.effects(stmt[3], writes) and pure
+            elif kind == "WHILE":
+                pure = self.effects(stmt[2], writes) and pure
+        return pure
+
+    # ------------------------------------------------------------------
+    # Rewriting
+    # ------------------------------------------------------------------
+
+    def block(self, stmts, in_loop=False):
+        if stmts is None:
+            return None
+        result = []
+        for stmt in stmts:
+            result.extend(self.stmt(stmt, in_loop))
+        return result
+
+    def stmt(self, stmt, in_loop=False):
+        """
+        Rewrite one statement; returns it with the FORGET statement it
+        needs, if any, in front.  `in_loop` says it is inside a loop body.
+        """
+        kind = stmt[0]
+        position = stmt[-1]
+
+        if kind == "WHILE":
+            return self.loop(stmt)
+
+        if kind == "IF":
+            cond, then_blk, else_blk = stmt[1:4]
+            temps = {}
+            if in_loop:
+                cond = self.share(cond, temps)
+            stmt = ("IF", cond, self.block(then_blk, in_loop),
+                    self.block(else_blk, in_loop), position)
+            return self.forget(temps, position) + [stmt]
+
+        if kind in ("PRINT", "ASSIGN", "CALL") and in_loop:
+            temps = {}
+            if kind == "PRINT":
+                stmt = ("PRINT", self.share(stmt[1], temps), position)
+            elif kind == "ASSIGN":
+                stmt = ("ASSIGN", stmt[1], self.share(stmt[2], temps), position)
+            else:
+                stmt = self.share(stmt[:3], temps) + (position,)
+            return self.forget(temps, position) + [stmt]
+
+        return [stmt]
+
+    def loop(self, stmt):
+        """
+        Remember the loop's invariant expressions, then optimize the
+        statements inside it.
+        """
+        cond, body = stmt[1:3]
+        position = stmt[-1]
+        writes = set()
+        temps = {}
+        if self.info(cond).pure and self.effects(body, writes):
+            cond = self.hoist(cond, writes, temps)
+            body = [self.hoist_stmt(s, writes, temps) for s in body]
+        stmt = ("WHILE", cond, self.block(body, True), position)
+        return self.forget(temps, position) + [stmt]
+
+    def forget(self, temps, position):
+        if not temps:
+            return []
+        return [("FORGET", list(temps.values()), position)]
+
+    def memo(self, node, temps, value=None):
+        """
+        The MEMO for `node`, sharing a temp with identical expressions.
+        `value` is the expression to compute, if not `node` itself.
+        """
+        key = self.key(node)
+        temp = temps.get(key)
+        if temp is None:
+            temp = temps[key] = self.temp()
+        return ("MEMO", temp, node if value is None else value)
+
+    def hoist_stmt(self, stmt, writes, temps):
+        """
+        Remember the invariant expressions in a statement of a loop body,
+        including inside nested blocks.
+        """
+        kind = stmt[0]
+        if kind == "PRINT":
+            return ("PRINT", self.hoist(stmt[1], writes, temps), stmt[-1])
+        if kind == "ASSIGN":
+            return ("ASSIGN", stmt[1], self.hoist(stmt[2], writes, temps), stmt[-1])
+        if kind == "CALL":
+            return self.hoist(stmt[:3], writes, temps) + (stmt[-1],)
+        if kind == "IF":
+            cond, then_blk, else_blk = stmt[1:4]
+            then_blk = [self.hoist_stmt(s, writes, temps) for s in then_blk or ()]
+            if else_blk is not None:
+                else_blk = [self.hoist_stmt(s, writes, temps) for s in else_blk]
+            return ("IF", self.hoist(cond, writes, temps), then_blk, else_blk, stmt[-1])
+        if kind == "WHILE":
+            body = [self.hoist_stmt(s, writes, temps) for s in stmt[2]]
+            return ("WHILE", self.hoist(stmt[1], writes, temps), body, stmt[-1])
+        return stmt
+
+    def hoist(self, node, writes, temps):
+        """
+        Replace the largest invariant subexpressions of `node` by MEMOs.
+        """
+        if self.worth_remembering(node) and not self.info(node).reads & writes:
+            return self.memo(node, temps)
+        return _rebuild(node, lambda child: self.hoist(child, writes, temps))
+
+    def share(self, node, temps):
+        """
+        Replace the subexpressions that occur more than once in `node`
+        by MEMOs, if the whole expression is pure and enough is saved.
+        """
+        if not self.info(node).pure:
+            return node
+        counts = {}
+        self.count(node, counts)
+        repeated = {key for key, (count, size) in counts.items()
+                    if count > 1 and (count - 1) * size >= MIN_SAVED}
+        if not repeated:
+            return node
+        return self.replace(node, repeated, temps)
+
+    def count(self, node, counts):
+        if self.worth_remembering(node):
+            key = self.key(node)
+            count, size = counts.get(key, (0, self.info(node).size))
+            counts[key] = (count + 1, size)
+        for child in _children(node)[0]:
+            self.count(child, counts)
+
+    def replace(self, node, repeated, temps):
+        if self.worth_remembering(node) and self.key(node) in repeated:
+            # Repeats inside it are shared too: MEMO evaluates it lazily
+            inner = _rebuild(node, lambda child: self.replace(child, repeated, temps))
+            return self.memo(node, temps, inner)
+        return _rebuild(node, lambda child: self.replace(child, repeated, temps))
+
+
+def _children(node):
+    """
+    The subexpressions of an expression node, and whether the node itself
+    is free of side effects.
+    """
+    t = node[0]
+    if t in _BINARY:
+        return (node[1], node[2]), True
+    if t in ("NOT", "NEG"):
+        return (node[1],), True
+    if t == "LIST":
+        return tuple(node[1]), True
+    if t == "CALL":
+        return tuple(node[2]), node[1] in PURE
+    if t == "CHAIN":
+        return (node[1],) + tuple(e for _, e in node[2]), True
+    if t == "MEMO":
+        return (node[2],), True
+    if t == "INPUT":
+        return (node[1],), False
+    if t in ("NUMBER", "STRING", "BOOL", "VAR", "LIST_CONST"):
+        return (), True
+    # Resolved or unknown nodes
+    return (), False
+
+
+def _rebuild(node, fn):
+    """
+    `node` with fn applied to each of its subexpressions.
+    """
+    t = node[0]
+    if t in _BINARY:
+        return (t, fn(node[1]), fn(node[2]))
+    if t in ("NOT", "NEG", "INPUT"):
+        return (t, fn(node[1]))
+    if t == "LIST":
+        return ("LIST", [fn(e) for e in node[1]])
+    if t == "CALL":
+        return ("CALL", node[1], [fn(a) for a in node[2]])
+    if t == "CHAIN":
+        return ("CHAIN", fn(node[1]), [(op, fn(e)) for op, e in node[2]])
+    if t == "MEMO":
+        return ("MEMO", node[1], fn(node[2]))
+    return node
+
+
+def _statement_exprs(stmt):
+    # The expressions a PRINT, ASSIGN, CALL, IF or WHILE evaluates itself
+    kind = stmt[0]
+    if kind == "PRINT":
+        return (stmt[1],)
+    if kind == "ASSIGN":
+        return (stmt[2],)
+    if kind == "CALL":
+        return (stmt[:3],)
+    return (stmt[1],)
+
+
+def optimize(statements):
+    """
+    Convenience wrapper: run the dataflow pass over a statement list.
+    """
+    return Dataflow().optimize(statements)
@@ -0,0 +1,95 @@
+# What happens when a statement fails at run time.
+#
+# By default the engines are lenient, like the original tree walker: the
+# error is printed as "Error: ..." and execution carries on with the next
+# statement.  In strict mode the first error stops the program instead: it
+# propagates to the caller as a ProgramError giving the position of the
+# statement that failed.
+#
+# Every statement keeps its exception handler in both modes.  CPython
+# 3.11, the oldest version supported, only pays for a handler when
+# something is raised, so the normal path costs the same in both modes and
+# only the error path differs: the handler calls the engine's `report`,
+# which either prints the error or raises the ProgramError.  (Leaving the
+# handlers out in strict mode would take a second copy of every engine's
+# statement code, or an extra call per statement in lenient mode.)
+#
+# A run that goes over its budget (see budget.py) stops with a
+# BudgetExceeded, a ProgramError, in both modes: handlers pass every
+# ProgramError on to the enclosing statement.
+
+
+class ProgramError(Exception):
+    """
+    A run-time error in strict mode.
+      - error: the exception the statement raised
+      - line, col: where the statement starts (None if unknown)
+      - path: the source file, for whoever knows it to fill in
+    """
+    def __init__(self, error, position, path=None):
+        super().__init__(error)
+        self.error = error
+        self.line, self.col = position if position else (None, None)
+        self.path = path
+
+    def __str__(self):
+        return self.located(f"{type(self.error).__name__}: {self.error}")
+
+    def located(self, message):
+        """
+        `message` preceded by the path, line and column that are known.
+        """
+        where = [str(part) for part in (self.path, self.line, self.col)
+                 if part is not None]
+        return ":".join(where) + ": " + message if where else message
+
+
+class BudgetExceeded(ProgramError):
+    """
+    The run went over one of the limits of its budget.Budget.
+      - resource: "iterations", "seconds" or "memory"
+      - limit, used: the limit and how much had been used when it stopped
+      - line, col: the while loop that was running
+    """
+    UNITS = {"iterations": "loop iterations", "seconds": "s", "memory": "bytes"}
+
+    def __init__(self, resource, limit, used, position, path=None):
+        self.resource = resource
+        self.limit = limit
+        self.used = used
+        super().__init__(self.message(), position, path)
+
+    def message(self):
+        unit = self.UNITS[self.resource]
+        used = f"{self.used:.2f}" if self.resource == "seconds" else self.used
+        return f"{self.resource} budget of {self.limit} {unit} exceeded ({used} used)"
+
+    def __str__(self):
+        return self.located(f"BudgetExceeded: {self.message()}")
+
+
+def stop(e, position):
+    """
+    The strict `report`: raise the error as a ProgramError at `position`.
+    Enclosing statements see the ProgramError and let it through.
+    """
+    if isinstance(e, ProgramError):
+        raise e
+    raise ProgramError(e, position) from e
+
+
+def reporter(output, strict=False):
+    """
+    The function engines call as report(error, position) when a statement
+    fails: stop() in strict mode, otherwise one printing to `output`
+    (except for a BudgetExceeded, which it lets through).
+    """
+    if strict:
+        return stop
+    error = output.error
+
+    def report(e, position):
+        if isinstance(e, ProgramError):
+            raise e
+        error(e)
+    return report
@@ -0,0 +1,223 @@
+from lists import LIST_TYPES
+from natives import NEW_LISTS
+from ropes import load_rope
+
+# Instrumentation hooks for embedders.
+#
+# Functions registered with Interpreter.add_hook(event, handler) are
+# called as the program runs:
+#   statement_start(stmt)   before each statement, however deeply nested
+#   statement_end(stmt)     after it, whether or not it failed
+#   assign(name, value)     after a variable has been given a new value
+#   loop_iteration(stmt)    when a while loop (stmt) starts its body again
+#   call(name, value)       after a builtin call, with its result
+#   new_list(value)         when a new list has been made
+#   print(text)             with the text a print statement writes
+#
+# An interpreter without hooks runs exactly as if this module didn't
+# exist: there is no "are there any hooks?" test anywhere on the normal
+# path.  Registering the first hook replaces the instance's execute() and
+# evaluate() with the traced versions below, which fire the events around
+# the engine's own methods; removing the last one puts the normal methods
+# back.  Engines that walk the tree (the profiler, the tiered engine) keep
+# their own execute() under the hooks; a compiled engine (closure, vm,
+# python) runs statements on the tree walker while it has hooks, which
+# gives the same results, and the tiered engine compiles no loops.
+#
+# A while loop whose body is empty never reports an iteration.
+
+EVENTS = ("statement_start", "statement_end", "assign", "loop_iteration",
+          "call", "new_list", "print")
+
+# Statement kinds that assign a variable
+_ASSIGNS = ("ASSIGN", "STORE", "CONCAT")
+
+# Expressions whose list values are always new lists
+_LIST_MAKERS = ("LIST", "LIST_CONST", "PLUS", "MUL")
+
+
+class Hooks:
+    """
+    The hooks registered on one interpreter, and the traced execute() and
+    evaluate() that call them.  `execute` and `evaluate` are the (unbound)
+    methods they wrap: the engine's own if it walks the tree, otherwise
+    the tree walker's.
+    """
+    def __init__(self, interp, execute, evaluate):
+        self.interp = interp
+        self.handlers = {event: [] for event in EVENTS}
+        self._execute = execute
+        self._evaluate = evaluate
+        self._loops = []        # while statements running, innermost last
+        self._failed = False    # whether the last statement reported an error
+        self._saved = None      # the interpreter's own output and report
+
+    def add(self, event, handler):
+        if event not in self.handlers:
+            raise ValueError(f"Unknown hook event: {event}")
+        self.handlers[event].append(handler)
+        if self._saved is None:
+            self._install()
+
+    @property
+    def active(self):
+        """
+        Whether any hook is registered.
+        """
+        return self._saved is not None
+
+    def remove(self, event, handler):
+        self.handlers[event].remove(handler)
+        if not any(self.handlers.values()):
+            self._uninstall()
+
+    def _install(self):
+        interp = self.interp
+        self._saved = (interp.output, interp.report)
+        interp.execute = self.execute
+        interp.evaluate = self.evaluate
+        interp.output = _TracedOutput(interp.output, self.handlers["print"])
+        report = interp.report
+
+        def traced_report(e, position):
+            self._failed = True
+            report(e, position)
+        interp.report = traced_report
+
+    def _uninstall(self):
+        interp = self.interp
+        interp.output, interp.report = self._saved
+        self._saved = None
+        # Back to the class's own methods
+        del interp.execute, interp.evaluate
+
+    def execute(self, stmt):
+        handlers = self.handlers
+        loops = self._loops
+        # The first statement of the innermost loop's body starts an iteration
+        if loops and loops[-1][2] and loops[-1][2][0] is stmt:
+            for handler in handlers["loop_iteration"]:
+                handler(loops[-1])
+        for handler in handlers["statement_start"]:
+            handler(stmt)
+
+        kind = stmt[0]
+        if kind == "WHILE":
+            loops.append(stmt)
+        self._failed = False
+        try:
+            self._execute(self.interp, stmt)
+            if kind in _ASSIGNS and not self._failed and handlers["assign"]:
+                self._assigned(stmt)
+        finally:
+            if kind == "WHILE":
+                loops.pop()
+            for handler in handlers["statement_end"]:
+                handler(stmt)
+
+    def _assigned(self, stmt):
+        interp = self.interp
+        if stmt[0] == "ASSIGN":
+            name, value = stmt[1], interp.env[stmt[1]]
+        elif stmt[0] == "STORE":
+            name, value = stmt[2], interp.slots[stmt[1]]
+        else:
+            # A CONCAT may have left a rope: handlers get the string
+            name, value = stmt[2], load_rope(interp.slots, stmt[1], stmt[2])
+        for handler in self.handlers["assign"]:
+            handler(name, value)
+
+    def evaluate(self, node):
+        value = self._evaluate(self.interp, node)
+        kind = node[0]
+        if kind == "CALL":
+            for handler in self.handlers["call"]:
+                handler(node[1], value)
+            fresh = node[1] in NEW_LISTS
+        else:
+            fresh = kind in _LIST_MAKERS
+        if fresh and isinstance(value, LIST_TYPES):
+            for handler in self.handlers["new_list"]:
+                handler(value)
+        return value
+
+
+class _TracedOutput:
+    # Wraps an interpreter's output sink to report what print writes
+    def __init__(self, output, handlers):
+        self.output = output
+        self.handlers = handlers
+
+    def print(self, value):
+        if self.handlers:
+            text = f"{value}\n"
+            for handler in self.handlers:
+                handler(text)
+        self.output.print(value)
+
+    def write(self, text):
+        self.output.write(text)
+
+    def error(self, e):
+        self.output.error(e)
+
+    def flush(self):
+        self.output.flush()
+
+
+class Counters:
+    """
+    Counts what a program does, using hooks.  attach() it to an
+    interpreter before running; as_dict() gives the totals.
+    """
+    def __init__(self):
+        self.statements = 0
+        self.assignments = 0
+        self.loop_iterations = 0
+        self.builtin_calls = 0
+        self.list_allocations = 0
+        self.bytes_printed = 0
+
+    def attach(self, interp):
+        interp.add_hook("statement_start", self._statement)
+        interp.add_hook("assign", self._assign)
+        interp.add_hook("loop_iteration", self._iteration)
+        interp.add_hook("call", self._call)
+        interp.add_hook("new_list", self._new_list)
+        interp.add_hook("print", self._print)
+
+    def detach(self, interp):
+        interp.remove_hook("statement_start", self._statement)
+        interp.remove_hook("assign", self._assign)
+        interp.remove_hook("loop_iteration", self._iteration)
+        interp.remove_hook("call", self._call)
+        interp.remove_hook("new_list", self._new_list)
+        interp.remove_hook("print", self._print)
+
+    def _statement(self, stmt):
+        self.statements += 1
+
+    def _assign(self, name, value):
+        self.assignments += 1
+
+    def _iteration(self, stmt):
+        self.loop_iterations += 1
+
+    def _call(self, name, value):
+        self.builtin_calls += 1
+
+    def _new_list(self, value):
+        self.list_allocations += 1
+
+    def _print(self, text):
+        self.bytes_printed += len(text.encode("utf-8"))
+
+    def as_dict(self):
+        return {
+            "statements": self.statements,
+            "assignments": self.assignments,
+            "loop_iterations": self.loop_iterations,
+            "builtin_calls": self.builtin_calls,
+            "list_allocations": self.list_allocations,
+            "bytes_printed": self.bytes_printed,
+        }
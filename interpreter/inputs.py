@@ -0,0 +1,151 @@
+import itertools
+import mmap
+import os
+import sys
+
+# Where a running program's input comes from.
+#
+# input(prompt) and the read_lines builtin read lines from the current
+# input source, shared by every engine (like sys.stdin):
+#   - ConsoleInput, the default, shows each prompt and reads a line with
+#     Python's input(), for people typing at a terminal.
+#   - BatchInput never shows prompts and reads standard input through a
+#     large buffer, for feeding a program big data files through a pipe
+#     (main.py --batch).
+# An embedder can install any object with the same methods and `prompts`
+# attribute with set_source().
+#
+# At the end of the input, input() fails with the same EOFError as
+# Python's; read_lines returns fewer lines, then an empty list.
+
+# Read buffer for BatchInput, in bytes
+BUFFER_SIZE = 1 << 20
+
+
+class ConsoleInput:
+    """
+    Interactive input: prompts are shown and lines are read with input().
+    """
+    prompts = True
+
+    def read_line(self):
+        return input()
+
+    def read_lines(self, count):
+        lines = []
+        try:
+            while len(lines) < count:
+                lines.append(input())
+        except EOFError:
+            pass
+        return lines
+
+
+class BatchInput:
+    """
+    Non-interactive input: `stream` (standard input if None) is read
+    through a BUFFER_SIZE buffer and prompts are not shown.
+    """
+    prompts = False
+
+    def __init__(self, stream=None):
+        if stream is None:
+            stream = open(sys.stdin.fileno(), "r", encoding="utf-8",
+                          buffering=BUFFER_SIZE, closefd=False)
+        self.stream = stream
+
+    def read_line(self):
+        line = self.stream.readline()
+        if not line:
+            raise EOFError("EOF when reading a line")
+        return line[:-1] if line[-1] == "\n" else line
+
+    def read_lines(self, count):
+        return [line[:-1] if line[-1] == "\n" else line
+                for line in itertools.islice(self.stream, count)]
+
+
+_source = ConsoleInput()
+
+
+def source():
+    """
+    The current input source.
+    """
+    return _source
+
+
+def set_source(new_source):
+    """
+    Make `new_source` the input source for input() and read_lines.
+    """
+    global _source
+    _source = new_source
+
+
+def read_line(prompt, output):
+    """
+    input(prompt): show the prompt on `output` (unless the source doesn't
+    use prompts) and read the next line.  Output printed so far is flushed
+    first, so the prompt follows it.
+    """
+    if _source.prompts:
+        output.write(prompt)
+        output.flush()
+    return _source.read_line()
+
+
+class LineFile:
+    """
+    A file opened with the open_file builtin, read lazily a few lines at a
+    time.  The file is memory-mapped, so only the parts being read need to
+    be in memory, however big it is.
+    """
+    __slots__ = ("path", "_mapped", "_pos")
+
+    def __init__(self, path):
+        self.path = path
+        self._pos = 0
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                self._mapped = None   # empty files cannot be mapped
+            else:
+                self._mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read_lines(self, count):
+        """
+        The next `count` lines (fewer at the end of the file), without
+        their line endings.  The mapping is closed once the end is reached.
+        """
+        mapped = self._mapped
+        if mapped is None:
+            return []
+        # Find where the count-th line ends, then decode the whole block
+        start = end = self._pos
+        size = len(mapped)
+        for _ in range(count):
+            end = mapped.find(b"\n", end) + 1
+            if end == 0:
+                end = size   # the last line has no line ending
+            if end >= size:
+                break
+        if end == start:
+            return []
+        block = mapped[start:end].decode("utf-8")
+        self._pos = end
+        if end >= size:
+            mapped.close()
+            self._mapped = None
+        lines = block.split("\n")
+        if block.endswith("\n"):
+            lines.pop()
+        if "\r" in block:
+            lines = [line[:-1] if line.endswith("\r") else line for line in lines]
+        return lines
+
+    def __repr__(self):
+        return f"<file {self.path!r}>"
+
+
+# Error messages such as "Cannot add file and str" use the type's name
+LineFile.__name__ = LineFile.__qualname__ = "file"
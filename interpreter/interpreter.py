@@ -1,14 +1,99 @@
+import errors
+import hooks
+import inputs
+import output as outputs
+from resolver import Resolver, SymbolTable, UNSET
+from lists import LIST_TYPES, new_list
+from natives import BUILTINS
+from ropes import concat, load_rope
+
+
 class Interpreter:
     """
     The Interpreter walks over the parsed code (the AST) and:
       1. Evaluates expressions to produce values (numbers, strings, lists, etc.)
       2. Executes statements (print, assignments, loops, branches, function calls)
-    It keeps track of global variables in a simple dictionary (self.env).
+    It keeps track of global variables in a simple dictionary (self.env),
+    or, for programs that went through resolve(), in a list of numbered
+    slots (self.slots).  Printed lines and error messages go to
+    self.output (see output.py), standard output unless another sink is
+    given.  With strict=True the first failing statement stops the
+    program with an errors.ProgramError instead of printing an error.
     """
-    def __init__(self):
+    # Whether execute() and evaluate() run nested statements and operands
+    # through self.execute and self.evaluate, so that hooks can wrap them
+    # as they are.  Compiling engines set it to False: while they have
+    # hooks, they run on the tree walker's methods instead.
+    walks_tree = True
+
+    def __init__(self, output=None, strict=False):
         # env is the “environment” that maps variable names (strings)
         # to their current values (numbers, strings, lists, booleans).
         self.env = {}
+        # Resolved programs keep their globals in slots instead:
+        # symbols maps each name to its index in the slots list.
+        self.symbols = SymbolTable()
+        self.slots = []
+        self.output = output if output is not None else outputs.stdout()
+        # report(error, position) is called when a statement fails
+        self.strict = strict
+        self.report = errors.reporter(self.output, strict)
+        # Registered instrumentation hooks, created by the first add_hook()
+        self.hooks = None
+        # The run's budget.Budget, if it has limits (see set_budget)
+        self.budget = None
+
+    def resolve(self, statements):
+        """
+        Run the resolver over freshly parsed statements so that variables
+        are accessed by slot number, and make room for any new globals.
+        """
+        resolved = Resolver(self.symbols).resolve(statements)
+        # Grow the list in place: compiled code may hold a reference to it.
+        self.slots.extend([UNSET] * (len(self.symbols) - len(self.slots)))
+        return resolved
+
+    def snapshot(self):
+        """
+        Save the values of all slot globals as a compact list.
+        The list is a shallow copy: list values are shared, not copied.
+        """
+        return list(self.slots)
+
+    def restore(self, snapshot):
+        """
+        Put back globals saved with snapshot().  Variables created since
+        then become undefined again.
+        """
+        self.slots[:] = snapshot
+        self.slots.extend([UNSET] * (len(self.symbols) - len(self.slots)))
+
+    def set_budget(self, budget):
+        """
+        Limit the run to `budget` (a budget.Budget, or None for no
+        limits) and start its clock.  Going over it raises
+        errors.BudgetExceeded.  Call it before the program starts.
+        """
+        self.budget = budget
+        if budget is not None:
+            budget.start(self.slots, self.env)
+
+    def add_hook(self, event, handler):
+        """
+        Call `handler` on every `event` while the program runs; see
+        hooks.py for the events and their arguments.  Execution is only
+        slowed down while at least one hook is registered.
+        """
+        if self.hooks is None:
+            walker = type(self) if self.walks_tree else Interpreter
+            self.hooks = hooks.Hooks(self, walker.execute, walker.evaluate)
+        self.hooks.add(event, handler)
+
+    def remove_hook(self, event, handler):
+        """
+        Stop calling a handler registered with add_hook().
+        """
+        self.hooks.remove(event, handler)
 
     def evaluate(self, node):
         """
@@ -30,6 +115,31 @@ class Interpreter:
             # node = ("BOOL", True or False)
             return node[1]
 
+        # --- Variables: resolved programs read a numbered slot ---
+        if t == "LOAD":
+            # node = ("LOAD", slot, variable_name)
+            value = self.slots[node[1]]
+            if value is UNSET:
+                raise NameError(f"Undefined variable: {node[2]}")
+            return value
+
+        if t == "LOAD_ROPE":
+            # node = ("LOAD_ROPE", slot, variable_name), a variable that
+            # may hold a rope: it is joined into a str on the way out
+            return load_rope(self.slots, node[1], node[2])
+
+        if t == "MEMO_SLOT":
+            # node = ("MEMO_SLOT", slot, temp_name, expr), an expression
+            # the optimizer found worth remembering (see dataflow.py):
+            # evaluated once, then read back from its slot
+            value = self.slots[node[1]]
+            if value is UNSET:
+                value = self.evaluate(node[3])
+                # Lists are never shared: each evaluation makes a new one
+                if not isinstance(value, LIST_TYPES):
+                    self.slots[node[1]] = value
+            return value
+
         # --- Variables: look up in the environment ---
         if t == "VAR":
             # node = ("VAR", variable_name)
@@ -47,14 +157,21 @@ class Interpreter:
             if not isinstance(prompt, str):
                 # Only strings can be used as prompts
                 raise TypeError("Input prompt must be a string")
-            # Call Python’s built-in input() to get user input
-            return input(prompt)
+            # Show the prompt and read the next line of input
+            return inputs.read_line(prompt, self.output)
 
         # --- List literals: build a new list from element expressions ---
         if t == "LIST":
             # node = ("LIST", [expr1, expr2, ...])
-            # Evaluate each element expression and collect results
-            return [self.evaluate(elem) for elem in node[1]]
+            # Evaluate each element expression and collect results;
+            # all-number lists get compact storage (see lists.py)
+            return new_list([self.evaluate(elem) for elem in node[1]])
+
+        # --- Literal-only list precomputed by the optimizer ---
+        if t == "LIST_CONST":
+            # node = ("LIST_CONST", (value1, value2, ...))
+            # Every evaluation must still produce a new list
+            return new_list(node[1])
 
         # --- Indexing: retrieve one item from a list by index ---
         if t == "INDEX":
@@ -62,39 +179,29 @@ class Interpreter:
             lst = self.evaluate(node[1])
             idx = self.evaluate(node[2])
             # Ensure we are indexing an actual list
-            if not isinstance(lst, list):
+            if not isinstance(lst, LIST_TYPES):
                 raise TypeError("Indexing non-list")
             # Ensure the index is a number (we will convert to int)
             if not isinstance(idx, (int, float)):
                 raise TypeError("Index must be a number")
-            # Return the selected element (cast index to int to drop .0)
-            return lst[int(idx)]
+            # Return the selected element (float indexes like 1.0 are cast to int)
+            return lst[idx if type(idx) is int else int(idx)]
 
-        # --- Function calls: currently only append() and remove() ---
+        # --- Function calls: builtins from the natives.BUILTINS table ---
         if t == "CALL":
             # node = ("CALL", function_name, [arg1_expr, arg2_expr, ...])
             name, args = node[1], node[2]
 
-            # append(list, value) adds value to the end of the list
-            if name == "append":
-                lst = self.evaluate(args[0])
-                val = self.evaluate(args[1])
-                if not isinstance(lst, list):
-                    raise TypeError("append first arg must be list")
-                lst.append(val)
-                return None  # append returns nothing
-
-            # remove(list, index) removes and returns the item at that index
-            if name == "remove":
-                lst = self.evaluate(args[0])
-                idx = self.evaluate(args[1])
-                if not isinstance(lst, list):
-                    raise TypeError("remove first arg must be list")
-                # pop returns the removed element
-                return lst.pop(int(idx))
-
             # If an unknown function name is used, that’s an error.
-            raise NameError(f"Unknown function: {name}")
+            if name not in BUILTINS:
+                raise NameError(f"Unknown function: {name}")
+
+            fn, min_args, max_args = BUILTINS[name]
+            # Evaluate the arguments left to right; extra ones are ignored
+            values = [self.evaluate(arg) for arg in args[:max_args]]
+            if len(values) < min_args:
+                raise IndexError("list index out of range")
+            return fn(*values)
 
         # --- Unary operators ---
         if t == "NOT":
@@ -181,20 +288,38 @@ class Interpreter:
         """
         Execute a single statement node from the AST.
         Statements include PRINT, ASSIGN, CALL, IF, and WHILE.
-        Any runtime errors are caught so execution can continue.
+        Any runtime errors are caught so execution can continue
+        (or, in strict mode, stopped with the statement's position).
+        Every statement tuple also ends with its (line, column) position,
+        which the comments below leave out.
         """
         kind = stmt[0]  # the statement type
         try:
             if kind == "PRINT":
                 # stmt = ("PRINT", expr)
                 # Evaluate the expression, then print its value
-                print(self.evaluate(stmt[1]))
+                self.output.print(self.evaluate(stmt[1]))
 
             elif kind == "ASSIGN":
                 # stmt = ("ASSIGN", varName, expr)
                 # Evaluate the expression and store it in the environment
                 self.env[stmt[1]] = self.evaluate(stmt[2])
 
+            elif kind == "STORE":
+                # stmt = ("STORE", slot, varName, expr), a resolved ASSIGN
+                self.slots[stmt[1]] = self.evaluate(stmt[3])
+
+            elif kind == "CONCAT":
+                # stmt = ("CONCAT", slot, varName, [piece, ...]), a resolved
+                # `x = x + piece + ...`; strings are built up as a rope
+                slot, name, pieces = stmt[1:4]
+                value = self.slots[slot]
+                if value is UNSET:
+                    raise NameError(f"Undefined variable: {name}")
+                for piece in pieces:
+                    value = concat(value, self.evaluate(piece))
+                self.slots[slot] = value
+
             elif kind == "CALL":
                 # stmt = ("CALL", name, args)
                 # We evaluate the call for its side effects (append/remove)
@@ -202,7 +327,7 @@ class Interpreter:
 
             elif kind == "IF":
                 # stmt = ("IF", condExpr, thenList, elseListOrNone)
-                _, cond, then_blk, else_blk = stmt
+                cond, then_blk, else_blk = stmt[1:4]
                 test = self.evaluate(cond)
                 if not isinstance(test, bool):
                     raise TypeError("Condition must be boolean")
@@ -214,7 +339,8 @@ class Interpreter:
 
             elif kind == "WHILE":
                 # stmt = ("WHILE", condExpr, bodyList)
-                _, cond, body = stmt
+                cond, body = stmt[1:3]
+                budget = self.budget
                 # Repeat until the condition becomes false
                 while True:
                     test = self.evaluate(cond)
@@ -222,10 +348,18 @@ class Interpreter:
                         raise TypeError("Condition must be boolean")
                     if not test:
                         break
+                    if budget is not None:
+                        budget.tick(stmt[-1])
                     for s in body:
                         self.execute(s)
 
+            elif kind == "CLEAR_SLOTS":
+                # stmt = ("CLEAR_SLOTS", [slot, ...]): forget remembered
+                # expressions before their loop or statement runs again
+                for slot in stmt[1]:
+                    self.slots[slot] = UNSET
+
         except Exception as e:
             # If anything goes wrong, print an error message
             # and continue with the next statement.
-            print(f"Error: {e}")
\ No newline at end of file
+            self.report(e, stmt[-1])
\ No newline at end of file
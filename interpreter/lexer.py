@@ -1,3 +1,6 @@
+import codecs  # incremental UTF-8 decoding of file chunks
+import mmap    # memory-mapped reading of very large source files
+import os
 import re  # Python’s regular‐expression library, used for pattern matching.
 
 # TOKEN_SPEC lists all the token types our language recognizes,
@@ -60,47 +63,142 @@ token_regex = "|".join(f"(?P<{name}>{pattern})"
                        for name, pattern in TOKEN_SPEC)
 master_pat = re.compile(token_regex)
 
-def tokenize(code):
+def number_value(text, float_numbers=False):
     """
-    Convert the input source code (a string) into a list of tokens.
-    Each token is a pair: (TOKEN_TYPE, value).
+    The value of a NUMBER literal: an int for whole numbers such as 42,
+    a float for decimals such as 4.2.  With float_numbers every literal
+    is a float, as in older versions of the language (print 1 shows 1.0).
     """
-    tokens = []
-    # Scan through the code, one match at a time
-    for mo in master_pat.finditer(code):
-        kind = mo.lastgroup    # which pattern matched
-        value = mo.group()     # the exact text that was matched
-
-        if kind == "NUMBER":
-            # Convert numeric text into a Python float
-            tokens.append(("NUMBER", float(value)))
-
-        elif kind == "STRING":
-            # Remove the surrounding quotes from string literals
-            tokens.append(("STRING", value[1:-1]))
-
-        elif kind in ("TRUE", "FALSE"):
-            # Keep boolean literals as their text; parser will turn them into True/False
-            tokens.append((kind, value))
-
-        elif kind in ("PRINT","IF","ELSE","WHILE","INPUT",
-                      "AND","OR","EQ","NEQ","LE","GE","LT","GT",
-                      "ASSIGN","NOT","PLUS","MINUS","MUL","DIV","MOD",
-                      "LPAREN","RPAREN","LBRACE","RBRACE",
-                      "LBRACKET","RBRACKET","COMMA"):
-            # All other keywords, operators, and punctuation
-            tokens.append((kind, value))
-
-        elif kind == "IDENT":
-            # Variable and function names
-            tokens.append(("IDENT", value))
-
-        elif kind in ("SKIP", "COMMENT"):
-            # Ignore whitespace and comments entirely
-            continue
+    if float_numbers or "." in text:
+        return float(text)
+    return int(text)
 
+def tokenize(source, float_numbers=False):
+    """
+    Convert source code into a stream of tokens.
+    Each token is a tuple (TOKEN_TYPE, value, line, column), where line
+    and column count from 1.
+    float_numbers makes every number a float (see number_value).
+
+    `source` is either the whole program as a string, or any iterable of
+    string chunks (see read_chunks below), so very large files can be
+    lexed without holding them in memory.  This is a generator: tokens
+    are produced as they are recognised, and the parser pulls them on demand.
+    """
+    if isinstance(source, str):
+        source = (source,)
+
+    chunks = iter(source)
+    buffer = ""       # text received but not yet turned into tokens
+    final = False
+    line = 1          # line number at offset `counted` in the buffer
+    line_start = 0    # offset of that line's start in the buffer
+    while not final:
+        chunk = next(chunks, None)
+        if chunk is None:
+            final = True
         else:
-            # Any unmatched character is a syntax error
-            raise SyntaxError(f"Unexpected character: {value}")
+            buffer = buffer + chunk if buffer else chunk
 
-    return tokens
\ No newline at end of file
+        # Only lex up to the last newline: no token except a string can
+        # run across a line break, so everything before it is complete.
+        # The rest waits for the next chunk.
+        if final:
+            cut = len(buffer)
+        else:
+            cut = buffer.rfind("\n") + 1
+            if cut == 0:
+                continue
+
+        consumed = cut
+        counted = 0       # newlines before this offset are in `line`
+        # Scan through the code, one match at a time
+        for mo in master_pat.finditer(buffer, 0, cut):
+            kind = mo.lastgroup    # which pattern matched
+            if kind == "SKIP" or kind == "COMMENT":
+                # Ignore whitespace and comments entirely
+                continue
+            value = mo.group()     # the exact text that was matched
+
+            # Work out the token's line and column from the newlines
+            # passed since the previous token
+            start = mo.start()
+            newlines = buffer.count("\n", counted, start)
+            if newlines:
+                line += newlines
+                line_start = buffer.rfind("\n", counted, start) + 1
+            counted = start
+            col = start - line_start + 1
+
+            if kind == "NUMBER":
+                # Convert numeric text into a Python int or float
+                yield ("NUMBER", number_value(value, float_numbers), line, col)
+
+            elif kind == "STRING":
+                # Remove the surrounding quotes from string literals
+                yield ("STRING", value[1:-1], line, col)
+
+            elif kind in ("TRUE", "FALSE"):
+                # Keep boolean literals as their text; parser will turn them into True/False
+                yield (kind, value, line, col)
+
+            elif kind in ("PRINT","IF","ELSE","WHILE","INPUT",
+                          "AND","OR","EQ","NEQ","LE","GE","LT","GT",
+                          "ASSIGN","NOT","PLUS","MINUS","MUL","DIV","MOD",
+                          "LPAREN","RPAREN","LBRACE","RBRACE",
+                          "LBRACKET","RBRACKET","COMMA"):
+                # All other keywords, operators, and punctuation
+                yield (kind, value, line, col)
+
+            elif kind == "IDENT":
+                # Variable and function names
+                yield ("IDENT", value, line, col)
+
+            elif (value == '"' and not final
+                  and buffer.find('"', mo.end(), cut) == -1
+                  and buffer.find("\\", mo.end(), cut) == -1):
+                # A string whose closing quote hasn't arrived yet:
+                # keep it, and everything after it, for the next chunk.
+                consumed = mo.start()
+                break
+
+            else:
+                # Any unmatched character is a syntax error
+                raise SyntaxError(f"Unexpected character: {value}")
+
+        # Count the rest of the lines handed over, then make line_start
+        # relative to what is left of the buffer
+        newlines = buffer.count("\n", counted, consumed)
+        if newlines:
+            line += newlines
+            line_start = buffer.rfind("\n", counted, consumed) + 1
+        line_start -= consumed
+        buffer = buffer[consumed:]
+
+
+def read_chunks(file_path, chunk_size=1 << 20, use_mmap=False):
+    """
+    Read a UTF-8 source file piece by piece, for tokenize().
+    With use_mmap=True the file is memory-mapped instead of read, which
+    lets the operating system page very large files in and out as needed.
+    """
+    if not use_mmap:
+        # Text mode decodes UTF-8 and normalises line endings for us
+        with open(file_path, "r", encoding="utf-8") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    with open(file_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return   # empty files cannot be mapped
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for start in range(0, size, chunk_size):
+                # The incremental decoder copes with characters that are
+                # split across two chunks.
+                yield decoder.decode(mapped[start:start + chunk_size])
+    yield decoder.decode(b"", final=True)
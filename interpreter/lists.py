@@ -0,0 +1,275 @@
+from array import array
+
+# Compact storage for lists of numbers.
+#
+# A Python list holds a pointer to a separate boxed object for every
+# element, so a list of a million floats costs around 32 MB.  A NumberList
+# keeps its elements in an array.array instead, unboxed:
+#   - only ints     -> array('q'), 8 bytes per element
+#   - only floats   -> array('d'), 8 bytes per element
+#   - anything else -> an ordinary list
+# The representation is picked automatically when a list is created, and
+# the first time a value that doesn't fit is stored (a string, a float in
+# an int array, an int too big for 64 bits, ...) the elements are moved to
+# an ordinary list.  The object itself stays the same, so other variables
+# referring to the list see the change.
+#
+# To the language a NumberList is just a list: it prints, indexes,
+# compares, adds and fails exactly like one, error messages included.
+#
+# slice() of an array-backed list is a view: a NumberList whose storage is
+# a memoryview of the same array, so no elements are copied.  Views stay
+# correct because nobody writes through shared storage: a view copies its
+# elements before its first change, and so does a list that has been
+# sliced (see NumberList._writable).
+
+# The array type code for each element type that can be stored unboxed
+_TYPECODES = {int: "q", float: "d"}
+_KINDS = {"q": int, "d": float}
+
+
+def _list_error(e):
+    # array's and memoryview's messages name them ("array index out of
+    # range", "pop from empty array", "index out of bounds on dimension 1");
+    # report them as a list would.
+    message = str(e)
+    if message.startswith("index out of bounds"):
+        message = "list index out of range"
+    return type(e)(message.replace("array", "list"))
+
+
+class NumberList:
+    """
+    A language list whose elements live in an array.array while they are
+    all ints or all floats, and in an ordinary list otherwise.
+      - _items:  the storage: an array, a list, or a memoryview of
+                 another NumberList's array for a slice
+      - _kind:   int or float while values of that type can be appended
+                 straight to _items, None otherwise
+      - _shared: True once a slice has been taken of the array
+    """
+    __slots__ = ("_items", "_kind", "_shared")
+    __hash__ = None   # mutable, like list
+
+    def __init__(self, items=None):
+        # `items` is the initial storage, which the NumberList takes over
+        if items is None:
+            items = []
+        self._items = items
+        self._kind = _KINDS[items.typecode] if type(items) is array else None
+        self._shared = False
+
+    def _writable(self):
+        """
+        Return the storage, ready to be changed.  Storage shared with
+        slices is copied first, so the other side never sees the change.
+        """
+        items = self._items
+        if type(items) is memoryview:
+            items = self._items = array(items.format, items.tobytes())
+        elif self._shared:
+            items = self._items = items[:]
+        else:
+            return items
+        self._kind = _KINDS[items.typecode]
+        self._shared = False
+        return items
+
+    # --- The operations the language performs on lists ---
+
+    def append(self, value):
+        if type(value) is self._kind:
+            try:
+                self._items.append(value)
+                return
+            except OverflowError:
+                pass   # an int that doesn't fit in 64 bits
+        self._append_other(value)
+
+    def _append_other(self, value):
+        # A value the current storage can't hold unboxed (or storage that
+        # is shared).  An empty list can take any representation;
+        # otherwise fall back to a list.
+        kind = type(value)
+        items = self._writable()
+        if kind is self._kind:
+            try:
+                items.append(value)
+                return
+            except OverflowError:
+                pass
+        elif not items and kind in _TYPECODES:
+            try:
+                self._items = array(_TYPECODES[kind], (value,))
+                self._kind = kind
+                return
+            except OverflowError:
+                pass
+        self._items = self.tolist()
+        self._kind = None
+        self._items.append(value)
+
+    def pop(self, index=-1):
+        try:
+            return self._writable().pop(index)
+        except IndexError as e:
+            raise _list_error(e) from None
+
+    def extend(self, values):
+        items = self._writable()
+        if type(values) is NumberList:
+            values = values._items
+        if type(items) is list:
+            items.extend(values)
+            return
+        if type(values) in (array, memoryview):
+            typecode = values.format if type(values) is memoryview else values.typecode
+            if typecode == items.typecode:
+                items.extend(values)   # copied in C, no boxing
+                return
+        # Copy first: values may be this very list
+        for value in list(values):
+            self.append(value)
+
+    def sort(self):
+        items = self._writable()
+        if type(items) is list:
+            items.sort()
+        else:
+            self._items = array(items.typecode, sorted(items))
+
+    def view(self, start, end):
+        """
+        The elements from start up to end, with Python's slice rules.
+        Array-backed lists give a view sharing their storage; others a copy.
+        """
+        items = self._items
+        if type(items) is list:
+            return new_list(items[start:end])
+        if type(items) is array:
+            items = memoryview(items)
+            self._shared = True
+            self._kind = None   # appends must check _writable() first
+        return NumberList(items[start:end])
+
+    def __contains__(self, value):
+        return value in self._items
+
+    def find(self, value):
+        """
+        Position of the first element equal to value, or -1.
+        """
+        items = self._items
+        if type(items) is memoryview:
+            items = items.tolist()
+        try:
+            return items.index(value)
+        except ValueError:
+            return -1
+
+    def __getitem__(self, index):
+        try:
+            return self._items[index]
+        except IndexError as e:
+            raise _list_error(e) from None
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def storage(self):
+        """
+        The array, list or memoryview holding the elements, for measuring
+        memory use (see budget.py).
+        """
+        return self._items
+
+    def tolist(self):
+        """
+        The elements as an ordinary Python list.
+        """
+        items = self._items
+        return items if type(items) is list else items.tolist()
+
+    def __repr__(self):
+        return repr(self.tolist())
+
+    # --- Everything else behaves like the equivalent Python list ---
+
+    def __eq__(self, other):
+        other = _as_list(other)
+        return NotImplemented if other is None else self.tolist() == other
+
+    def __ne__(self, other):
+        other = _as_list(other)
+        return NotImplemented if other is None else self.tolist() != other
+
+    def __lt__(self, other):
+        other = _as_list(other)
+        return NotImplemented if other is None else self.tolist() < other
+
+    def __le__(self, other):
+        other = _as_list(other)
+        return NotImplemented if other is None else self.tolist() <= other
+
+    def __gt__(self, other):
+        other = _as_list(other)
+        return NotImplemented if other is None else self.tolist() > other
+
+    def __ge__(self, other):
+        other = _as_list(other)
+        return NotImplemented if other is None else self.tolist() >= other
+
+    def __add__(self, other):
+        # Raises list's own error for anything that isn't a list
+        return self.tolist() + (other.tolist() if type(other) is NumberList else other)
+
+    def __radd__(self, other):
+        return other + self.tolist()
+
+    def __mul__(self, other):
+        return self.tolist() * other
+
+    def __rmul__(self, other):
+        return other * self.tolist()
+
+
+# Python builds the messages for unsupported operations ("unsupported
+# operand type(s) for -: 'list' and 'int'") from the type's name.
+NumberList.__name__ = NumberList.__qualname__ = "list"
+
+# The types a language list can have
+LIST_TYPES = (list, NumberList)
+
+
+def _as_list(value):
+    # The other operand of a comparison as a Python list, or None
+    if type(value) is NumberList:
+        return value.tolist()
+    if isinstance(value, list):
+        return value
+    return None
+
+
+def new_list(values):
+    """
+    Create a language list from a list or tuple of values: a NumberList
+    when they are all ints or all floats (or there are none), an ordinary
+    list otherwise.  A list passed in may be returned as is.
+    """
+    if not values:
+        return NumberList()
+    kind = type(values[0])
+    typecode = _TYPECODES.get(kind)
+    if typecode is not None:
+        for value in values:
+            if type(value) is not kind:
+                break
+        else:
+            try:
+                return NumberList(array(typecode, values))
+            except OverflowError:
+                pass
+    return values if type(values) is list else list(values)
@@ -0,0 +1,273 @@
+from array import array
+
+import inputs
+from lists import LIST_TYPES, NumberList, new_list
+
+# The builtin functions a program can call, e.g. append(nums, 4) or
+# total = sum(nums).
+#
+# Each one is a plain Python function registered in BUILTINS with the
+# @builtin decorator, so adding a builtin is all done here: every engine
+# looks calls up in the same table.  The bulk operations (sum, sort,
+# find, ...) do their whole loop in C instead of one interpreted
+# statement per element.
+#
+# Numbers returned as counts or positions (len, find) are ints.
+
+# name -> (function, least arguments, most arguments).  Arguments past the
+# most are ignored and never evaluated; with fewer than the least the call
+# fails with IndexError("list index out of range") once the ones given
+# have been evaluated, as append and remove always have.
+BUILTINS = {}
+
+# The builtins whose list results are newly made lists (remove, min and
+# max can return a list too, but one that was already an element)
+NEW_LISTS = set()
+
+# The builtins that only compute a result from their arguments: they
+# change no list, read no input and give the same result for the same
+# arguments, so the optimizer may reuse it (see dataflow.py)
+PURE = set()
+
+
+def builtin(name, min_args, max_args=None, makes_list=False, pure=False):
+    """
+    Register the decorated function as the builtin `name`.
+    makes_list says it returns new lists (see NEW_LISTS), pure that it
+    has no side effects (see PURE).
+    """
+    def register(fn):
+        BUILTINS[name] = (fn, min_args, min_args if max_args is None else max_args)
+        if makes_list:
+            NEW_LISTS.add(name)
+        if pure:
+            PURE.add(name)
+        return fn
+    return register
+
+
+def _check_list(value, message):
+    if not isinstance(value, LIST_TYPES):
+        raise TypeError(message)
+
+
+def _position(value, message):
+    # A list position, converted like an index: 2.0 becomes 2
+    if type(value) is int:
+        return value
+    if not isinstance(value, (int, float)):
+        raise TypeError(message)
+    return int(value)
+
+
+# ----------------------------------------------------------------------
+# Adding and removing elements
+# ----------------------------------------------------------------------
+
+@builtin("append", 2)
+def builtin_append(lst, val):
+    """
+    append(list, value) adds value to the end of the list.
+    """
+    _check_list(lst, "append first arg must be list")
+    lst.append(val)
+    return None
+
+
+@builtin("remove", 2)
+def builtin_remove(lst, idx):
+    """
+    remove(list, index) removes and returns the item at that index.
+    """
+    _check_list(lst, "remove first arg must be list")
+    return lst.pop(idx if type(idx) is int else int(idx))
+
+
+@builtin("extend", 2)
+def builtin_extend(lst, values):
+    """
+    extend(list, other) appends every element of other to list.
+    """
+    _check_list(lst, "extend first arg must be list")
+    _check_list(values, "extend second arg must be list")
+    lst.extend(values)
+    return None
+
+
+@builtin("sort", 1)
+def builtin_sort(lst):
+    """
+    sort(list) puts the elements in ascending order, in place.
+    """
+    _check_list(lst, "sort arg must be list")
+    lst.sort()
+    return None
+
+
+# ----------------------------------------------------------------------
+# Building lists
+# ----------------------------------------------------------------------
+
+@builtin("range", 1, 3, makes_list=True, pure=True)
+def builtin_range(*bounds):
+    """
+    range(end), range(start, end) or range(start, end, step): the list of
+    numbers from start (default 0) up to but not including end.  The
+    numbers are floats if any argument is a float, ints otherwise.
+    """
+    whole = []
+    for bound in bounds:
+        if type(bound) is int:
+            whole.append(bound)
+        elif type(bound) is float and bound.is_integer():
+            whole.append(int(bound))
+        else:
+            raise TypeError("range arguments must be whole numbers")
+    numbers = range(*whole)
+
+    if any(type(bound) is float for bound in bounds):
+        return NumberList(array("d", map(float, numbers)))
+    try:
+        return NumberList(array("q", numbers))
+    except OverflowError:
+        return list(numbers)
+
+
+@builtin("slice", 2, 3, makes_list=True, pure=True)
+def builtin_slice(seq, start, end=None):
+    """
+    slice(list, start[, end]): the elements from start up to but not
+    including end (default: the end), with Python's rules for negative
+    and out-of-range positions.  Also works on strings.  Slices of number
+    lists share the original's storage instead of copying it.
+    """
+    start = _position(start, "slice positions must be numbers")
+    if end is not None:
+        end = _position(end, "slice positions must be numbers")
+    if type(seq) is NumberList:
+        return seq.view(start, end)
+    if isinstance(seq, str):
+        return seq[start:end]
+    _check_list(seq, "slice first arg must be list or string")
+    return new_list(seq[start:end])
+
+
+# ----------------------------------------------------------------------
+# Questions about a list
+# ----------------------------------------------------------------------
+
+@builtin("len", 1, pure=True)
+def builtin_len(seq):
+    """
+    len(list) or len(string): the number of elements or characters.
+    """
+    if not isinstance(seq, (str,) + LIST_TYPES):
+        raise TypeError("len arg must be list or string")
+    return len(seq)
+
+
+@builtin("sum", 1, pure=True)
+def builtin_sum(lst):
+    """
+    sum(list): the total of a list of numbers (0 for an empty list).
+    """
+    _check_list(lst, "sum arg must be list")
+    return sum(lst)
+
+
+@builtin("min", 1, pure=True)
+def builtin_min(lst):
+    """
+    min(list): the smallest element.
+    """
+    _check_list(lst, "min arg must be list")
+    return min(lst)
+
+
+@builtin("max", 1, pure=True)
+def builtin_max(lst):
+    """
+    max(list): the largest element.
+    """
+    _check_list(lst, "max arg must be list")
+    return max(lst)
+
+
+@builtin("find", 2, pure=True)
+def builtin_find(seq, value):
+    """
+    find(list, value): the position of the first element equal to value,
+    or -1.  On strings, the position of a substring.
+    """
+    if isinstance(seq, str):
+        if not isinstance(value, str):
+            raise TypeError("find in a string needs a string")
+        return seq.find(value)
+    _check_list(seq, "find first arg must be list or string")
+    if type(seq) is NumberList:
+        return seq.find(value)
+    try:
+        return seq.index(value)
+    except ValueError:
+        return -1
+
+
+@builtin("contains", 2, pure=True)
+def builtin_contains(seq, value):
+    """
+    contains(list, value): whether an element equals value.  On strings,
+    whether value is a substring.
+    """
+    if isinstance(seq, str):
+        if not isinstance(value, str):
+            raise TypeError("contains in a string needs a string")
+        return value in seq
+    _check_list(seq, "contains first arg must be list or string")
+    return value in seq
+
+
+# ----------------------------------------------------------------------
+# Reading input in bulk
+# ----------------------------------------------------------------------
+
+def _count(value, message):
+    count = _position(value, message)
+    return count if count > 0 else 0
+
+
+@builtin("read_lines", 1, makes_list=True)
+def builtin_read_lines(count):
+    """
+    read_lines(count): the next count lines of input, as a list of
+    strings.  Fewer at the end of the input, then an empty list.
+    """
+    return new_list(inputs.source().read_lines(read_lines_count(count)))
+
+
+def read_lines_count(count):
+    """
+    The number of lines read_lines(count) reads, checking the argument.
+    """
+    return _count(count, "read_lines count must be a number")
+
+
+@builtin("open_file", 1)
+def builtin_open_file(path):
+    """
+    open_file(path): open a file for reading with next_lines.
+    """
+    if not isinstance(path, str):
+        raise TypeError("open_file path must be a string")
+    return inputs.LineFile(path)
+
+
+@builtin("next_lines", 2, makes_list=True)
+def builtin_next_lines(file, count):
+    """
+    next_lines(file, count): the next count lines of a file from
+    open_file.  Fewer at the end of the file, then an empty list.
+    """
+    if type(file) is not inputs.LineFile:
+        raise TypeError("next_lines first arg must be a file")
+    count = _count(count, "next_lines count must be a number")
+    return new_list(file.read_lines(count))
@@ -0,0 +1,201 @@
+import dataflow
+from runtime import COMPARE_OPS, compare_link, plus, negate
+
+# An optional pass over the tuple AST, run between Parser.parse and
+# execution.  It does work once, ahead of time, that the engines would
+# otherwise repeat every time an expression runs:
+#   - constant folding: 1 + 1, -5 * 2, "a" + "b", 3 < 4, ...
+#   - dead-branch elimination: if (true) { ... } runs its block directly,
+#     if (false) { ... } and while (false) { ... } disappear
+#   - literal-only lists such as [1, 2, 3] become ("LIST_CONST", (1, 2, 3)),
+#     a template that the engines copy into a fresh list every time.
+# optimize() then runs the dataflow pass (dataflow.py), which stops loops
+# recomputing invariant expressions and statements recomputing repeated
+# ones.
+#
+# Folding never changes behaviour: if computing a constant expression
+# raises (e.g. "a" + 1 or 1 / 0), the node is left alone so the error is
+# still reported when, and only if, the program gets there.
+
+_LITERALS = ("NUMBER", "STRING", "BOOL")
+
+_ARITHMETIC = {
+    "PLUS":  plus,
+    "MINUS": lambda a, b: a - b,
+    "MUL":   lambda a, b: a * b,
+    "DIV":   lambda a, b: a / b,
+    "MOD":   lambda a, b: a % b,
+}
+
+
+def literal(value):
+    """
+    Build the literal node that evaluates to `value`.
+    """
+    if isinstance(value, bool):
+        return ("BOOL", value)
+    if isinstance(value, str):
+        return ("STRING", value)
+    return ("NUMBER", value)
+
+
+class Optimizer:
+    """
+    Rewrites a statement list into an equivalent, cheaper one.
+    """
+    def optimize(self, statements):
+        """
+        Return the optimized version of a statement list.
+        """
+        return self.block(statements)
+
+    # ------------------------------------------------------------------
+    # Statements
+    # ------------------------------------------------------------------
+
+    def block(self, stmts):
+        """
+        Optimize a list of statements.  A statement may turn into several
+        (an if with a constant condition is replaced by its block) or
+        none at all.
+        """
+        result = []
+        for stmt in stmts:
+            result.extend(self.stmt(stmt))
+        return result
+
+    def stmt(self, stmt):
+        """
+        Optimize one statement; returns a list of statements.
+        Statements keep their position (the last element).
+        """
+        kind = stmt[0]
+        position = stmt[-1]
+
+        if kind == "PRINT":
+            return [("PRINT", self.expr(stmt[1]), position)]
+
+        if kind == "ASSIGN":
+            return [("ASSIGN", stmt[1], self.expr(stmt[2]), position)]
+
+        if kind == "STORE":
+            return [("STORE", stmt[1], stmt[2], self.expr(stmt[3]), position)]
+
+        if kind == "CALL":
+            return [self.expr(stmt[:3]) + (position,)]
+
+        if kind == "IF":
+            cond, then_blk, else_blk = stmt[1:4]
+            cond = self.expr(cond)
+            then_blk = self.block(then_blk or [])
+            else_blk = self.block(else_blk) if else_blk else None
+            # Only real booleans can be pruned; `if (1)` must still fail.
+            if cond == ("BOOL", True):
+                return then_blk
+            if cond == ("BOOL", False):
+                return else_blk or []
+            return [("IF", cond, then_blk, else_blk, position)]
+
+        if kind == "WHILE":
+            cond, body = stmt[1:3]
+            cond = self.expr(cond)
+            if cond == ("BOOL", False):
+                return []
+            return [("WHILE", cond, self.block(body), position)]
+
+        return [stmt]
+
+    # ------------------------------------------------------------------
+    # Expressions
+    # ------------------------------------------------------------------
+
+    def expr(self, node):
+        """
+        Optimize one expression node.
+        """
+        t = node[0]
+
+        if t in ("INPUT", "NOT", "NEG"):
+            operand = self.expr(node[1])
+            if operand[0] in _LITERALS:
+                if t == "NOT":
+                    return ("BOOL", not operand[1])
+                if t == "NEG":
+                    return self.fold(("NEG", operand), negate, operand[1])
+            return (t, operand)
+
+        if t == "LIST":
+            elems = [self.expr(e) for e in node[1]]
+            if all(e[0] in _LITERALS for e in elems):
+                return ("LIST_CONST", tuple(e[1] for e in elems))
+            return ("LIST", elems)
+
+        if t == "CALL":
+            return ("CALL", node[1], [self.expr(a) for a in node[2]])
+
+        if t == "CHAIN":
+            return self.chain(self.expr(node[1]),
+                              [(op, self.expr(e)) for op, e in node[2]])
+
+        if t in ("AND", "OR"):
+            left, right = self.expr(node[1]), self.expr(node[2])
+            if left[0] in _LITERALS:
+                # Python's and/or: the result is either the left value
+                # itself or whatever the right-hand side evaluates to.
+                if bool(left[1]) == (t == "OR"):
+                    return left
+                return right
+            return (t, left, right)
+
+        if t in _ARITHMETIC or t in COMPARE_OPS:
+            left, right = self.expr(node[1]), self.expr(node[2])
+            node = (t, left, right)
+            if left[0] in _LITERALS and right[0] in _LITERALS:
+                fn = _ARITHMETIC[t] if t in _ARITHMETIC else COMPARE_OPS[t]
+                return self.fold(node, fn, left[1], right[1])
+            return node
+
+        if t == "INDEX":
+            return ("INDEX", self.expr(node[1]), self.expr(node[2]))
+
+        # Literals, variables and anything unknown stay as they are
+        return node
+
+    def chain(self, base, comps):
+        """
+        Fold a chained comparison whose operands are all literals.
+        """
+        node = ("CHAIN", base, comps)
+        if base[0] not in _LITERALS or any(e[0] not in _LITERALS for _, e in comps):
+            return node
+
+        def evaluate():
+            current = base[1]
+            for op, e in comps:
+                if not compare_link(op, COMPARE_OPS[op], current, e[1]):
+                    return False
+                current = e[1]
+            return True
+        return self.fold(node, evaluate)
+
+    def fold(self, node, fn, *args):
+        """
+        Replace `node` by the literal fn(*args), unless computing it fails
+        (or gives something that isn't a literal), in which case `node` is
+        kept so the engines raise the error at run time.
+        """
+        try:
+            value = fn(*args)
+        except Exception:
+            return node
+        if not isinstance(value, (bool, int, float, str)):
+            return node
+        return literal(value)
+
+
+def optimize(statements):
+    """
+    Convenience wrapper: optimize a parsed statement list, folding
+    constants first and then running the dataflow pass.
+    """
+    return dataflow.optimize(Optimizer().optimize(statements))
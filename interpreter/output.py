@@ -0,0 +1,122 @@
+import atexit
+import sys
+
+# Where a running program's output goes.
+#
+# Every engine sends the lines a program prints, and the "Error: ..."
+# lines of statements that fail, to an output sink instead of calling
+# print() for each one.  The sink decides when the text is actually
+# written:
+#   - BufferedOutput collects lines and writes them to a stream in large
+#     chunks: when the buffer reaches its size limit, before input()
+#     shows a prompt (see inputs.read_line), and when the program ends.
+#     On a terminal it writes every line straight away, so interactive
+#     programs behave as before.
+#   - MemoryOutput keeps everything in memory, for embedding the
+#     interpreter and capturing what a program prints.
+# Any object with the methods of Output can be passed to an engine as its
+# `output`.
+
+# Default buffer size for BufferedOutput, in characters
+BUFFER_SIZE = 1 << 16
+
+
+class Output:
+    """
+    The interface engines use to produce output.  Subclasses implement
+    write() and, if they buffer, flush().
+    """
+    def write(self, text):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def print(self, value):
+        """
+        Output a value on a line of its own, as the print statement does.
+        """
+        self.write(f"{value}\n")
+
+    def error(self, e):
+        """
+        Report the error that stopped a statement.
+        """
+        self.write(f"Error: {e}\n")
+
+
+class BufferedOutput(Output):
+    """
+    Writes to `stream` (sys.stdout if None, looked up at every flush) once
+    `buffer_size` characters have been collected.  With `line_buffered`
+    (by default: when the stream is a terminal) every write is passed on
+    at once.
+    """
+    def __init__(self, stream=None, buffer_size=BUFFER_SIZE, line_buffered=None):
+        self.stream = stream
+        if line_buffered is None:
+            line_buffered = _is_terminal(stream if stream is not None else sys.stdout)
+        # Every write ends a line (or is a prompt, which flushes anyway),
+        # so line buffering is a limit of a single character.
+        self.limit = 1 if line_buffered else buffer_size
+        self._parts = []
+        self._size = 0
+
+    def write(self, text):
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self.limit:
+            self.flush()
+
+    def print(self, value):
+        # write() inlined: this runs once per printed line
+        text = f"{value}\n"
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self.limit:
+            self.flush()
+
+    def flush(self):
+        stream = self.stream if self.stream is not None else sys.stdout
+        if self._parts:
+            text = "".join(self._parts)
+            self._parts.clear()
+            self._size = 0
+            stream.write(text)
+        stream.flush()
+
+
+class MemoryOutput(Output):
+    """
+    Keeps all output in memory; getvalue() returns it as one string.
+    """
+    def __init__(self):
+        self._parts = []
+
+    def write(self, text):
+        self._parts.append(text)
+
+    def getvalue(self):
+        return "".join(self._parts)
+
+
+def _is_terminal(stream):
+    try:
+        return stream.isatty()
+    except (AttributeError, ValueError):
+        return False
+
+
+_stdout = None
+
+
+def stdout():
+    """
+    The shared BufferedOutput for standard output, which engines use
+    unless given another sink.  It is flushed when Python exits.
+    """
+    global _stdout
+    if _stdout is None:
+        _stdout = BufferedOutput()
+        atexit.register(_stdout.flush)
+    return _stdout
@@ -1,9 +1,50 @@
+from itertools import islice
+
+# How many tokens to pull from the lexer at a time
+_FETCH = 256
+
+# ----------------------------------------------------------------------
+# Operator table
+# ----------------------------------------------------------------------
+# Expressions are parsed by precedence climbing (see Parser.expression)
+# rather than with one method per precedence level.  Adding an operator
+# only takes an entry here plus its token in the lexer and scanner.
+
+# Binding powers, loosest first
+_LOGIC, _COMPARE, _SUM, _PRODUCT = range(1, 5)
+
+# Binary operators: token type -> binding power.  The AST node is named
+# after the token, e.g. ("PLUS", left, right).
+BINARY = {
+    "AND": _LOGIC,   "OR": _LOGIC,
+    "EQ": _COMPARE,  "NEQ": _COMPARE,
+    "LT": _COMPARE,  "GT": _COMPARE,
+    "LE": _COMPARE,  "GE": _COMPARE,
+    "PLUS": _SUM,    "MINUS": _SUM,
+    "MUL": _PRODUCT, "DIV": _PRODUCT, "MOD": _PRODUCT,
+}
+
+# Comparisons chain: a < b <= c becomes one CHAIN node
+COMPARISONS = frozenset(("EQ", "NEQ", "LT", "GT", "LE", "GE"))
+
+# Prefix operators: token type -> (node type, indexable).  The operand is
+# a single unary expression, so -a * b is (-a) * b.  `indexable` says
+# whether a following [index] applies to the result, as in the original
+# grammar: !true[0] indexes the negation, while -1[0] stops after the -1.
+PREFIX = {
+    "MINUS": ("NEG", False),
+    "NOT":   ("NOT", True),
+}
+
+
 class Parser:
     def __init__(self, tokens):
-        # Start with the list of tokens from the lexer,
-        # and a pointer (pos) at the first token.
-        self.tokens = tokens
+        # Tokens can be a list or any iterator, such as the generator
+        # returned by lexer.tokenize.  They are pulled on demand into a
+        # small buffer, and pos points at the current token in it.
+        self.tokens = []
         self.pos = 0
+        self._source = iter(tokens)
 
     def parse(self):
         """
@@ -11,42 +52,34 @@ class Parser:
         until we run out of tokens, and return the list of
         parsed statements.
         """
-        statements = []
-        while self.pos < len(self.tokens):
-            tok_type, _ = self.tokens[self.pos]
-
-            if tok_type == "PRINT":
-                # Found a 'print' keyword—consume it and parse
-                # the expression that follows, then record a PRINT node.
-                self.pos += 1
-                expr = self.bool_expr()
-                statements.append(("PRINT", expr))
-
-            elif tok_type == "IDENT" and self.peek("ASSIGN"):
-                # Found something like 'x = ...' — an assignment.
-                name = self.tokens[self.pos][1]
-                # Skip over IDENT and '='
-                self.pos += 2
-                expr = self.bool_expr()
-                statements.append(("ASSIGN", name, expr))
-
-            elif tok_type == "IDENT" and self.peek("LPAREN"):
-                # Found a standalone function call, e.g. append(list, value)
-                statements.append(self.parse_call())
-
-            elif tok_type == "IF":
-                # Found an if statement
-                statements.append(self.parse_if())
-
-            elif tok_type == "WHILE":
-                # Found a while loop
-                statements.append(self.parse_while())
+        return list(self.statements())
 
-            else:
-                # Anything else is invalid here
-                raise SyntaxError(f"Unexpected token: {self.tokens[self.pos]}")
+    def statements(self):
+        """
+        Yield the top-level statements one at a time, as soon as each is
+        parsed, so a program can start running before the rest of the file
+        has been read.  Tokens of finished statements are dropped, keeping
+        memory use bounded however long the input is.
+        """
+        while self.kind() is not None:
+            yield self.parse_stmt(where="")
+            del self.tokens[:self.pos]
+            self.pos = 0
 
-        return statements
+    def kind(self, offset=0):
+        """
+        The type of the token `offset` places after the current one,
+        or None past the end of the input.
+        """
+        i = self.pos + offset
+        tokens = self.tokens
+        if i < len(tokens):
+            return tokens[i][0]
+        # Refill the buffer from the token stream
+        tokens.extend(islice(self._source, i - len(tokens) + _FETCH))
+        if i >= len(tokens):
+            return None
+        return tokens[i][0]
 
     def peek(self, kind):
         """
@@ -54,10 +87,7 @@ class Parser:
         and check if its type matches `kind`.
         Useful for disambiguating IDENT vs IDENT '(' vs IDENT '='.
         """
-        return (
-            self.pos + 1 < len(self.tokens)
-            and self.tokens[self.pos + 1][0] == kind
-        )
+        return self.kind(1) == kind
 
     def match(self, kind):
         """
@@ -66,10 +96,7 @@ class Parser:
         and return False.
         Used to optionally consume punctuation like commas or braces.
         """
-        if (
-            self.pos < len(self.tokens)
-            and self.tokens[self.pos][0] == kind
-        ):
+        if self.kind() == kind:
             self.pos += 1
             return True
         return False
@@ -90,37 +117,47 @@ class Parser:
             stmts.append(self.parse_stmt())
         return stmts
 
-    def parse_stmt(self):
+    def parse_stmt(self, where=" in block"):
         """
-        Parse exactly one statement inside a block.
-        This shares logic with top‐level parse(), but never
-        loops—just handles a single PRINT, ASSIGN, CALL, IF, or WHILE.
+        Parse exactly one statement: a PRINT, ASSIGN, CALL, IF, or WHILE.
+        Used for top‐level statements and for those inside a block.
+        Every statement node ends with the (line, column) where the
+        statement starts, for error messages.
         """
-        tok_type, _ = self.tokens[self.pos]
+        tok_type = self.kind()
+        if tok_type is None:
+            raise SyntaxError("Unexpected end of input")
+        # Empty if the tokens came without positions
+        position = self.tokens[self.pos][2:4]
 
         if tok_type == "PRINT":
+            # Found a 'print' keyword—consume it and parse
+            # the expression that follows, then record a PRINT node.
             self.pos += 1
             expr = self.bool_expr()
-            return ("PRINT", expr)
+            return ("PRINT", expr, position)
 
         elif tok_type == "IDENT" and self.peek("ASSIGN"):
+            # Found something like 'x = ...' — an assignment.
             name = self.tokens[self.pos][1]
+            # Skip over IDENT and '='
             self.pos += 2
             expr = self.bool_expr()
-            return ("ASSIGN", name, expr)
+            return ("ASSIGN", name, expr, position)
 
         elif tok_type == "IDENT" and self.peek("LPAREN"):
-            # e.g. append(nums, 4)
-            return self.parse_call()
+            # Found a standalone function call, e.g. append(list, value)
+            return self.parse_call() + (position,)
 
         elif tok_type == "IF":
-            return self.parse_if()
+            return self.parse_if() + (position,)
 
         elif tok_type == "WHILE":
-            return self.parse_while()
+            return self.parse_while() + (position,)
 
         else:
-            raise SyntaxError(f"Unexpected token in block: {self.tokens[self.pos]}")
+            # Anything else is invalid here
+            raise SyntaxError(f"Unexpected token{where}: {self.tokens[self.pos][:2]}")
 
     def parse_call(self):
         """
@@ -150,7 +187,8 @@ class Parser:
         """
         Parse an if‐statement with optional else:
             'if' '(' condition ')' thenBlock ['else' elseBlock]
-        Returns: ("IF", conditionAST, thenList, elseListOrNone)
+        Returns: ("IF", conditionAST, thenList, elseListOrNone), to which
+        parse_stmt adds the position
         """
         self.match("IF")
         if not self.match("LPAREN"):
@@ -171,7 +209,8 @@ class Parser:
         """
         Parse a while‐loop:
             'while' '(' condition ')' bodyBlock
-        Returns: ("WHILE", conditionAST, bodyList)
+        Returns: ("WHILE", conditionAST, bodyList), to which parse_stmt
+        adds the position
         """
         self.match("WHILE")
         if not self.match("LPAREN"):
@@ -185,118 +224,107 @@ class Parser:
 
     def bool_expr(self):
         """
-        Parse logical combinations of comparisons using AND/OR.
-        Calls compare_expr() to handle the next level (==, <, >, etc.).
+        Parse a full expression (the lowest precedence level).
         """
-        node = self.compare_expr()
+        return self.expression(_LOGIC)
 
-        while (
-            self.pos < len(self.tokens)
-            and self.tokens[self.pos][0] in ("AND", "OR")
-        ):
-            op = self.tokens[self.pos][0]
-            self.pos += 1
-            right = self.compare_expr()
-            node = (op, node, right)
-
-        return node
-
-    def compare_expr(self):
+    def expression(self, min_power):
         """
-        Parse chained comparisons like 'a < b < c' or single ones like 'x == y'.
-        Returns either a single expression AST or a CHAIN node listing all comparisons.
+        Precedence climbing: parse an operand, then keep folding in binary
+        operators from BINARY as long as they bind at least as tightly as
+        `min_power`.  The right operand of an operator is parsed one level
+        higher, which makes every operator left-associative.
+        Comparisons are collected into a single CHAIN node.
         """
-        node = self.expr()
-        comps = []
-
-        while (
-            self.pos < len(self.tokens)
-            and self.tokens[self.pos][0] in ("EQ","NEQ","LT","GT","LE","GE")
-        ):
-            op = self.tokens[self.pos][0]
+        node = self.unary()
+        tokens = self.tokens
+
+        while True:
+            # Same as self.kind(), without the call while the buffer lasts
+            pos = self.pos
+            op = tokens[pos][0] if pos < len(tokens) else self.kind()
+            power = BINARY.get(op)
+            if power is None or power < min_power:
+                return node
             self.pos += 1
-            rhs = self.expr()
-            comps.append((op, rhs))
 
-        if comps:
-            # e.g. ("CHAIN", baseExpr, [(op1,expr1),(op2,expr2),...])
-            return ("CHAIN", node, comps)
-        else:
-            return node
+            if op in COMPARISONS:
+                # e.g. ("CHAIN", baseExpr, [(op1,expr1),(op2,expr2),...])
+                comps = [(op, self.expression(power + 1))]
+                while self.kind() in COMPARISONS:
+                    op = self.tokens[self.pos][0]
+                    self.pos += 1
+                    comps.append((op, self.expression(power + 1)))
+                node = ("CHAIN", node, comps)
+            else:
+                node = (op, node, self.expression(power + 1))
 
-    def expr(self):
+    def unary(self):
         """
-        Parse addition and subtraction at this precedence level.
-        Calls term() to handle the next level (multiplication, etc.).
+        Parse one operand: a prefix operator applied to an operand, or a
+        primary expression, followed by any indexing (list[2][1]).
         """
-        node = self.term()
+        tokens, pos = self.tokens, self.pos
+        tok_type = tokens[pos][0] if pos < len(tokens) else self.kind()
 
-        while (
-            self.pos < len(self.tokens)
-            and self.tokens[self.pos][0] in ("PLUS","MINUS")
-        ):
-            op = self.tokens[self.pos][0]
+        prefix = PREFIX.get(tok_type)
+        if prefix is not None:
+            node_type, indexable = prefix
             self.pos += 1
-            right = self.term()
-            node = (op, node, right)
-
-        return node
-
-    def term(self):
-        """
-        Parse multiplication, division, and modulo.
-        Calls factor() for the most basic pieces.
-        """
-        node = self.factor()
+            node = (node_type, self.unary())
+        else:
+            node, indexable = self.primary(tok_type)
 
-        while (
-            self.pos < len(self.tokens)
-            and self.tokens[self.pos][0] in ("MUL","DIV","MOD")
-        ):
-            op = self.tokens[self.pos][0]
-            self.pos += 1
-            right = self.factor()
-            node = (op, node, right)
+        if indexable:
+            while self.match("LBRACKET"):
+                idx = self.bool_expr()
+                if not self.match("RBRACKET"):
+                    raise SyntaxError("Expected ']' after index")
+                node = ("INDEX", node, idx)
 
         return node
 
-    def factor(self):
+    def primary(self, tok_type):
         """
         Parse the smallest building blocks:
-          - Unary minus ('-x')
           - input("prompt")
           - List literals [a, b, c]
           - Numbers, strings, booleans (true/false)
-          - Variable names
-          - Logical not (!x)
+          - Variable names and builtin calls
           - Parenthesized sub‐expressions ( ... )
-          - Indexing (list[index])
-        Each returns a simple tuple describing the node type and its children.
+        Returns the node and whether it may be followed by [index].
         """
-        if self.pos >= len(self.tokens):
+        if tok_type is None:
             raise SyntaxError("Unexpected end of input")
 
-        tok_type, tok_val = self.tokens[self.pos]
+        tok_val = self.tokens[self.pos][1]
+        self.pos += 1
 
-        # Unary minus: consume '-' and parse the next factor
-        if tok_type == "MINUS":
-            self.pos += 1
-            expr = self.factor()
-            return ("NEG", expr)
+        if tok_type == "IDENT":
+            # A call used as a value, e.g. total = sum(nums)
+            if self.kind() == "LPAREN":
+                self.pos -= 1
+                return self.parse_call(), True
+            # Variable reference: store the name for later lookup
+            return ("VAR", tok_val), True
+
+        # Numbers, strings and true/false
+        if tok_type == "NUMBER" or tok_type == "STRING":
+            return (tok_type, tok_val), False
+        if tok_type == "TRUE":
+            return ("BOOL", True), False
+        if tok_type == "FALSE":
+            return ("BOOL", False), False
 
-        # input("prompt")
-        if tok_type == "INPUT":
-            self.pos += 1
-            if not self.match("LPAREN"):
-                raise SyntaxError("Expected '(' after 'input'")
-            prompt = self.bool_expr()
+        # Parentheses: ( expr )
+        if tok_type == "LPAREN":
+            node = self.bool_expr()
             if not self.match("RPAREN"):
-                raise SyntaxError("Expected ')' after input call")
-            return ("INPUT", prompt)
+                raise SyntaxError("Missing closing parenthesis")
+            return node, True
 
         # List literal: [ item, item, ... ]
         if tok_type == "LBRACKET":
-            self.pos += 1
             elems = []
             if not self.match("RBRACKET"):
                 elems.append(self.bool_expr())
@@ -304,54 +332,17 @@ class Parser:
                     elems.append(self.bool_expr())
                 if not self.match("RBRACKET"):
                     raise SyntaxError("Expected ']' in list literal")
-            return ("LIST", elems)
-
-        # Numbers
-        if tok_type == "NUMBER":
-            self.pos += 1
-            return ("NUMBER", tok_val)
-
-        # String literals
-        if tok_type == "STRING":
-            self.pos += 1
-            return ("STRING", tok_val)
-
-        # Boolean true/false
-        if tok_type == "TRUE":
-            self.pos += 1
-            return ("BOOL", True)
-        if tok_type == "FALSE":
-            self.pos += 1
-            return ("BOOL", False)
-
-        # Variable reference: store the name for later lookup
-        if tok_type == "IDENT":
-            self.pos += 1
-            node = ("VAR", tok_val)
+            return ("LIST", elems), False
 
-        # Logical not: !expr
-        elif tok_type == "NOT":
-            self.pos += 1
-            expr = self.factor()
-            node = ("NOT", expr)
-
-        # Parentheses: ( expr )
-        elif tok_type == "LPAREN":
-            self.pos += 1
-            node = self.bool_expr()
+        # input("prompt")
+        if tok_type == "INPUT":
+            if not self.match("LPAREN"):
+                raise SyntaxError("Expected '(' after 'input'")
+            prompt = self.bool_expr()
             if not self.match("RPAREN"):
-                raise SyntaxError("Missing closing parenthesis")
-
-        else:
-            # If none of the above matched, it really is an error
-            raise SyntaxError(f"Unexpected token: {self.tokens[self.pos]}")
-
-        # Handle indexing syntax after any primary expression:
-        # allow myList[2][1] etc.
-        while self.match("LBRACKET"):
-            idx = self.bool_expr()
-            if not self.match("RBRACKET"):
-                raise SyntaxError("Expected ']' after index")
-            node = ("INDEX", node, idx)
+                raise SyntaxError("Expected ')' after input call")
+            return ("INPUT", prompt), False
 
-        return node
\ No newline at end of file
+        # If none of the above matched, it really is an error
+        self.pos -= 1
+        raise SyntaxError(f"Unexpected token: {self.tokens[self.pos][:2]}")
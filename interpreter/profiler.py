@@ -0,0 +1,141 @@
+from collections import defaultdict
+from time import perf_counter
+
+from interpreter import Interpreter
+
+# A line-level profiler for programs in the language (main.py --profile).
+#
+# ProfilingInterpreter is the tree walker with execute() wrapped in a
+# timer.  Interpreter.execute runs the statements inside an if or while
+# through self.execute too, so every statement, however deeply nested, is
+# measured.  For each source line it records:
+#   - count:      how many times statements on the line ran
+#   - cumulative: time from start to end of those statements, including
+#                 the statements nested inside them (counted once when a
+#                 line is nested inside itself, e.g. a one-line loop)
+#   - self:       cumulative minus the time spent in nested statements
+#   - iterations: for a line with a while loop, how many times its body
+#                 was entered
+# and, for flame graphs, the self time of every distinct stack of nested
+# statements (see write_collapsed).
+#
+# Statements without a position (tokens that came without one) are
+# counted under line 0.
+
+# How statement kinds are named in reports; resolved kinds by their source
+_LABELS = {"STORE": "assign", "CONCAT": "assign"}
+
+
+class LineStats:
+    """
+    What the profiler measured for one source line.
+    """
+    __slots__ = ("count", "cumulative", "self_time", "iterations")
+
+    def __init__(self):
+        self.count = 0
+        self.cumulative = 0.0
+        self.self_time = 0.0
+        self.iterations = None   # stays None unless the line has a while
+
+
+class _Frame:
+    # A statement that is running: its nested statements add their time
+    # to `children`, and `path` is its stack for the collapsed output.
+    __slots__ = ("stmt", "children", "path")
+
+    def __init__(self, stmt, path):
+        self.stmt = stmt
+        self.children = 0.0
+        self.path = path
+
+
+class ProfilingInterpreter(Interpreter):
+    """
+    A tree-walking Interpreter that times every statement it executes.
+    After the run, `lines` maps each line number to its LineStats; see
+    hot_spots() and write_collapsed().
+    """
+    def __init__(self, output=None, strict=False):
+        super().__init__(output, strict)
+        self.lines = defaultdict(LineStats)
+        self.stacks = defaultdict(float)   # stack of labels -> self time
+        self.total = 0.0                   # time in top-level statements
+        self._running = []                 # _Frames, outermost first
+        self._active = defaultdict(int)    # line -> statements running on it
+
+    def execute(self, stmt):
+        position = stmt[-1]
+        line = position[0] if position else 0
+        label = f"{_LABELS.get(stmt[0], stmt[0].lower())} (line {line})"
+        running = self._running
+
+        if running:
+            parent = running[-1]
+            path = parent.path + (label,)
+            # The first statement of a while body starts an iteration
+            outer = parent.stmt
+            if outer[0] == "WHILE" and outer[2] and outer[2][0] is stmt:
+                stats = self.lines[outer[-1][0] if outer[-1] else 0]
+                stats.iterations = (stats.iterations or 0) + 1
+        else:
+            path = (label,)
+        if stmt[0] == "WHILE" and self.lines[line].iterations is None:
+            self.lines[line].iterations = 0
+
+        frame = _Frame(stmt, path)
+        running.append(frame)
+        self._active[line] += 1
+        start = perf_counter()
+        try:
+            super().execute(stmt)
+        finally:
+            # Also taken when a strict-mode error stops the program
+            elapsed = perf_counter() - start
+            running.pop()
+            self._active[line] -= 1
+
+            stats = self.lines[line]
+            stats.count += 1
+            stats.self_time += elapsed - frame.children
+            if not self._active[line]:
+                stats.cumulative += elapsed
+            self.stacks[path] += elapsed - frame.children
+            if running:
+                running[-1].children += elapsed
+            else:
+                self.total += elapsed
+
+    def hot_spots(self, source_lines=None, limit=20):
+        """
+        The hot-spot report: the `limit` lines with the most self time,
+        most first.  `source_lines` (the program's lines) adds the source
+        text of each line.
+        """
+        rows = sorted(self.lines.items(), key=lambda item: item[1].self_time,
+                      reverse=True)[:limit]
+        out = [f"Profile: {self.total:.3f} s in total, "
+               f"top {len(rows)} of {len(self.lines)} lines by self time",
+               f"{'line':>6} {'count':>10} {'iterations':>11} "
+               f"{'cumul s':>9} {'self s':>9} {'self %':>7}  source"]
+        for line, stats in rows:
+            iterations = "-" if stats.iterations is None else stats.iterations
+            share = 100 * stats.self_time / self.total if self.total else 0.0
+            text = ""
+            if source_lines and 0 < line <= len(source_lines):
+                text = source_lines[line - 1].strip()
+            out.append(f"{line:>6} {stats.count:>10} {iterations:>11} "
+                       f"{stats.cumulative:>9.3f} {stats.self_time:>9.3f} "
+                       f"{share:>6.1f}%  {text}")
+        return "\n".join(out)
+
+    def write_collapsed(self, file):
+        """
+        Write the self time of every stack, in microseconds, in the
+        collapsed format read by flamegraph.pl and speedscope:
+            while (line 4);print (line 6) 1234
+        """
+        for path, seconds in sorted(self.stacks.items()):
+            micros = round(seconds * 1e6)
+            if micros > 0:
+                file.write(f"{';'.join(path)} {micros}\n")
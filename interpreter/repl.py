@@ -0,0 +1,516 @@
+import sys
+from bisect import bisect_right
+
+import errors
+import optimizer
+import scanner
+from budget import Budget
+from parser import Parser
+from resolver import UNSET
+from ropes import load_rope
+
+# The interactive mode: python main.py without a source file.
+#
+# A Repl keeps one engine, and so its globals, alive across everything the
+# user types.  Lines are collected into an entry until it parses as a
+# whole: an entry that stops inside a { ... } block, an unclosed bracket,
+# a string or an expression (x = 1 +) waits for more lines, and then runs
+# as soon as it is complete.  An entry that is still open, or that failed
+# to parse, can be edited with the :edit, :insert and :delete commands.
+#
+# An Entry lexes and parses again only what an edit may have changed.  Its
+# lines are lexed in chunks, one line each except where a string runs
+# across line breaks, and editing a line re-lexes its chunk and the
+# following ones only until the chunk boundaries line up with the old ones
+# again.  Every statement parsed, at any depth of nesting, is remembered
+# with its number of tokens and the positions of its first token and of
+# the token after it (which decides where an expression ends and whether
+# an `else` follows).  When the entry is parsed again, a statement whose
+# tokens and following token were not touched is reused as it is and its
+# tokens are skipped, so after typing or editing a line only the
+# statements containing it are parsed anew: the enclosing blocks' own
+# tokens and the changed statement.  Blocks also remember runs of _RUN
+# statements, so a long block is skipped over run by run.  The cost of a
+# line thus depends on the entry's size and nesting, never on how long
+# the session has been running.
+#
+# Limitation: an entry runs as soon as it is complete, so an `else` must
+# follow the closing } of its if on the same line.
+
+PROMPT = ">>> "
+MORE = "... "
+
+HELP = """\
+Statements run as soon as they are complete; an open { ... } block, bracket
+or string continues on the next line.  Lines of the current entry are
+numbered from 1.
+  :list               show the entry typed so far
+  :edit N TEXT        replace line N of the entry
+  :insert N TEXT      insert a line before line N
+  :delete N           delete line N
+  :clear              drop the entry
+  :vars               show the global variables
+  :help               show this help
+  :quit               leave (or Ctrl-D)
+"""
+
+# Statements of a block remembered together as one run, so that a long
+# block is parsed again in steps of whole runs
+_RUN = 32
+
+_END = float("inf")
+
+
+class _Chunk:
+    """
+    Lines lexed together.
+      - start: index of its first line in the entry
+      - size: number of lines
+      - count: number of tokens
+      - error: the SyntaxError lexing it raised, if any
+      - open: whether it ends inside an unterminated string (only the
+        last chunk of an entry can)
+    """
+    __slots__ = ("start", "size", "count", "error", "open")
+
+    def __init__(self, start, size, count, error=None, open=False):
+        self.start = start
+        self.size = size
+        self.count = count
+        self.error = error
+        self.open = open
+
+
+class _Parsed:
+    """
+    A statement, or a run of statements of one block (a list), parsed from
+    an entry: the (line, column) positions of its first token and of the
+    token after it (None at the end of the entry), and its number of
+    tokens.  `shift` is the number of lines it has moved since its nodes
+    were built; they are brought up to date when it is reused.
+    """
+    __slots__ = ("node", "start", "next", "length", "shift")
+
+    def __init__(self, node, start, next, length):
+        self.node = node
+        self.start = start
+        self.next = next
+        self.length = length
+        self.shift = 0
+
+    def reuse(self):
+        if self.shift:
+            node, lines = self.node, self.shift
+            if type(node) is list:
+                self.node = [_shift(stmt, lines) for stmt in node]
+            else:
+                self.node = _shift(node, lines)
+            self.shift = 0
+        return self.node
+
+
+def _shift(stmt, lines):
+    # The statement node moved down by `lines` lines (up if negative)
+    line, col = stmt[-1]
+    position = (line + lines, col)
+    kind = stmt[0]
+    if kind == "IF":
+        else_blk = stmt[3]
+        return ("IF", stmt[1], [_shift(s, lines) for s in stmt[2]],
+                None if else_blk is None else [_shift(s, lines) for s in else_blk],
+                position)
+    if kind == "WHILE":
+        return ("WHILE", stmt[1], [_shift(s, lines) for s in stmt[2]], position)
+    return stmt[:-1] + (position,)
+
+
+def _moved(position, lines):
+    return None if position is None else (position[0] + lines, position[1])
+
+
+class Entry:
+    """
+    The lines of one REPL entry, lexed and parsed incrementally.  Edit it
+    with append() and replace(); parse() returns its statements once it is
+    complete.  `tokens` holds the tokens of all its lines, positioned as
+    in the entry.
+    """
+    def __init__(self, float_numbers=False):
+        self.float_numbers = float_numbers
+        self.clear()
+
+    def clear(self):
+        self.lines = []
+        self.chunks = []
+        self._starts = []   # chunk -> its start, for bisect
+        self._errors = 0    # chunks that failed to lex
+        self.tokens = []
+        # (line, column) of the first token -> _Parsed, for statements
+        # and for runs
+        self.parsed = {}
+        self.runs = {}
+        # Where statements that end the entry start (they are the only
+        # ones a line added at the end can change)
+        self.ending = []
+
+    def append(self, line):
+        self.replace(len(self.lines), len(self.lines), [line])
+
+    def replace(self, start, end, new_lines):
+        """
+        Replace lines[start:end] (counted from 0) with new_lines, re-lexing
+        only the chunks that change and forgetting the statements whose
+        tokens might have.
+        """
+        lines, chunks = self.lines, self.chunks
+        count = len(lines)
+        lines[start:end] = new_lines
+        moved = len(new_lines) - (end - start)
+
+        # The first chunk to lex again: the one holding line `start`, or,
+        # for lines added at the end, the last one if its string is open
+        if start < count:
+            first = bisect_right(self._starts, start) - 1
+        elif chunks and chunks[-1].open:
+            first = len(chunks) - 1
+        else:
+            first = len(chunks)
+        line = first_line = chunks[first].start if first < len(chunks) else start
+
+        # Lex until a chunk would start where an old one, past the edit,
+        # started: from there on the old chunks are still right
+        relexed, tokens = [], []
+        edited_end = start + len(new_lines)
+        after = first + 1
+        resumed = False
+        while line < len(lines):
+            if line >= edited_end:
+                while after < len(chunks) and chunks[after].start + moved < line:
+                    after += 1
+                if after < len(chunks) and chunks[after].start + moved == line:
+                    resumed = True
+                    break
+            chunk = self._lex(line, tokens)
+            relexed.append(chunk)
+            line += chunk.size
+        if not resumed:
+            after = len(chunks)
+        kept = chunks[after:]
+
+        self._errors += (sum(chunk.error is not None for chunk in relexed)
+                         - sum(chunk.error is not None for chunk in chunks[first:after]))
+
+        # Splice the new tokens in, moving those of the lines below
+        if first == len(chunks):
+            skipped = len(self.tokens)
+        elif first < len(chunks) // 2:
+            skipped = sum(chunk.count for chunk in chunks[:first])
+        else:
+            skipped = len(self.tokens) - sum(chunk.count for chunk in chunks[first:])
+        replaced = skipped + sum(chunk.count for chunk in chunks[first:after])
+        if moved:
+            for chunk in kept:
+                chunk.start += moved
+            tokens += [(kind, value, row + moved, col)
+                       for kind, value, row, col in self.tokens[replaced:]]
+            replaced = len(self.tokens)
+        self.tokens[skipped:replaced] = tokens
+        if moved or len(relexed) != after - first:
+            self.chunks = chunks[:first] + relexed + kept
+            self._starts = [chunk.start for chunk in self.chunks]
+        else:
+            chunks[first:after] = relexed
+            self._starts[first:after] = [chunk.start for chunk in relexed]
+
+        if first == len(chunks):
+            # Lines added at the end: only what ended the entry changes
+            for key in self.ending:
+                self.parsed.pop(key, None)
+            self.ending = []
+        else:
+            # Lines first_line .. line - 1 (from 0) now hold new tokens;
+            # they were first_line .. line - 1 - moved before
+            self.parsed = self._forget(self.parsed, first_line + 1, line + 1 - moved, moved)
+            self.runs = self._forget(self.runs, first_line + 1, line + 1 - moved, moved)
+            self.ending = [key for key, record in self.parsed.items() if record.next is None]
+
+    def _lex(self, start, tokens):
+        # Lex the chunk starting at line `start` into `tokens`: the line
+        # itself, joined with the next ones while a string on it is
+        # unterminated
+        lines = self.lines
+        stop = start + 1
+        text = lines[start]
+        while True:
+            try:
+                stream = scanner.scan(text, self.float_numbers)
+            except SyntaxError as e:
+                # Strings can't hold backslashes: one there is an error
+                # whatever comes next
+                if str(e) != 'Unexpected character: "' or "\\" in text:
+                    return _Chunk(start, stop - start, 0, e)
+                if stop == len(lines):
+                    return _Chunk(start, stop - start, 0, open=True)
+                text += "\n" + lines[stop]
+                stop += 1
+                continue
+            tokens += [(kind, value, line + start, col) for kind, value, line, col in stream]
+            return _Chunk(start, stop - start, len(stream))
+
+    def _forget(self, parsed, first, stop, moved):
+        # Old lines first .. stop - 1 (from 1) changed and the lines after
+        # them moved by `moved`: drop the records those lines may have
+        # changed, and move the ones below
+        if not moved:
+            for key in [key for key, record in parsed.items()
+                        if record.start[0] < stop
+                        and (record.next is None or record.next[0] >= first)]:
+                del parsed[key]
+            return parsed
+        kept = {}
+        for record in parsed.values():
+            following = _END if record.next is None else record.next[0]
+            if following < first:
+                kept[record.start] = record
+            elif record.start[0] >= stop:
+                record.start = _moved(record.start, moved)
+                record.next = _moved(record.next, moved)
+                record.shift += moved
+                kept[record.start] = record
+        return kept
+
+    @property
+    def complete(self):
+        """
+        Whether the entry might be complete: its last string is closed.
+        """
+        return not (self.chunks and self.chunks[-1].open)
+
+    def parse(self):
+        """
+        The entry's statements, or None if it is incomplete (it ends
+        before its last statement does).  Raises SyntaxError if it can't
+        be parsed however it goes on.
+        """
+        if self._errors:
+            for chunk in self.chunks:
+                if chunk.error is not None:
+                    chunk.error.lineno = chunk.start + 1
+                    raise chunk.error
+        if not self.complete:
+            return None
+        parser = _EntryParser(self)
+        statements = []
+        try:
+            while parser.kind() is not None:
+                statements.append(parser.parse_stmt(where=""))
+        except SyntaxError as e:
+            if parser.kind() is None:
+                return None   # more lines may complete it
+            e.lineno, e.offset = parser.tokens[parser.pos][2:4]
+            raise
+        return statements
+
+
+class _EntryParser(Parser):
+    """
+    A Parser over an Entry's tokens that reuses the statements and runs
+    the entry remembers, skipping their tokens, and records the ones it
+    parses.
+    """
+    def __init__(self, entry):
+        super().__init__(())
+        self.tokens = entry.tokens
+        self.parsed = entry.parsed
+        self.runs = entry.runs
+        self.ending = entry.ending
+
+    def parse_block(self):
+        if not self.match("LBRACE"):
+            raise SyntaxError("Expected '{' at start of block")
+        tokens, runs = self.tokens, self.runs
+        stmts = []
+        # Statements since the last run, and where they start
+        loose, loose_pos = 0, self.pos
+        while not self.match("RBRACE"):
+            pos = self.pos
+            run = runs.get(tokens[pos][2:4]) if pos < len(tokens) else None
+            if run is not None:
+                stmts += run.reuse()
+                self.pos = pos + run.length
+                loose, loose_pos = 0, self.pos
+                continue
+            stmts.append(self.parse_stmt())
+            loose += 1
+            if loose == _RUN and self.pos < len(tokens):
+                start = tokens[loose_pos][2:4]
+                runs[start] = _Parsed(stmts[-_RUN:], start, tokens[self.pos][2:4],
+                                      self.pos - loose_pos)
+                loose, loose_pos = 0, self.pos
+        return stmts
+
+    def parse_stmt(self, where=" in block"):
+        tokens, pos = self.tokens, self.pos
+        if pos >= len(tokens):
+            return super().parse_stmt(where)
+        start = tokens[pos][2:4]
+        record = self.parsed.get(start)
+        if record is not None:
+            self.pos = pos + record.length
+            return record.reuse()
+
+        stmt = super().parse_stmt(where)
+        if self.pos < len(tokens):
+            following = tokens[self.pos][2:4]
+        else:
+            following = None
+            self.ending.append(start)
+        self.parsed[start] = _Parsed(stmt, start, following, self.pos - pos)
+        return stmt
+
+
+class Repl:
+    """
+    An interactive session on `runner`, an engine whose globals last for
+    the whole session.  feed() takes one line typed by the user; interact()
+    reads them from the console.  With `limits`, every entry runs on a
+    fresh Budget(**limits).
+    """
+    def __init__(self, runner, optimize=False, float_numbers=False, limits=None):
+        self.runner = runner
+        self.output = runner.output
+        self.optimize = optimize
+        self.limits = limits
+        self.entry = Entry(float_numbers)
+        self.done = False
+
+    @property
+    def prompt(self):
+        return MORE if self.entry.lines else PROMPT
+
+    def feed(self, line):
+        """
+        Handle one line: a :command, or a line of the current entry, which
+        runs if that completes it.
+        """
+        try:
+            if line.startswith(":"):
+                self.command(line[1:])
+            else:
+                self.entry.append(line)
+                self.submit()
+        finally:
+            self.output.flush()
+
+    def submit(self):
+        # Run the entry if it is complete; report it if it can't be parsed
+        entry = self.entry
+        try:
+            statements = entry.parse()
+        except SyntaxError as e:
+            where = "".join(f"{part}:" for part in (e.lineno, e.offset) if part)
+            self.output.write(f"{where}{' ' if where else ''}SyntaxError: {e.msg}\n")
+            if len(entry.lines) > 1:
+                # Worth fixing rather than typing again
+                self.output.write("(the entry is kept: fix it with :edit, :insert or "
+                                  ":delete, or drop it with :clear)\n")
+            else:
+                entry.clear()
+            return
+        if statements is not None:
+            entry.clear()
+            self.run(statements)
+
+    def run(self, statements):
+        """
+        Run parsed statements on the session's engine.
+        """
+        runner = self.runner
+        if self.optimize:
+            statements = optimizer.optimize(statements)
+        if self.limits:
+            runner.set_budget(Budget(**self.limits))
+        try:
+            for stmt in runner.resolve(statements):
+                runner.execute(stmt)
+        except errors.ProgramError as e:
+            self.output.write(f"{e}\n")
+        except KeyboardInterrupt:
+            self.output.write("KeyboardInterrupt\n")
+
+    def command(self, text):
+        # :name [N] [TEXT]
+        name, _, rest = text.strip().partition(" ")
+        write = self.output.write
+        entry = self.entry
+        if name in ("quit", "q"):
+            self.done = True
+        elif name == "help":
+            write(HELP)
+        elif name == "clear":
+            entry.clear()
+        elif name == "list":
+            for number, line in enumerate(entry.lines, 1):
+                write(f"{number:>4}  {line}\n")
+        elif name == "vars":
+            self.show_vars()
+        elif name in ("edit", "insert", "delete"):
+            number, _, line = rest.lstrip().partition(" ")
+            last = len(entry.lines) + (name == "insert")
+            if not number.isdigit() or not 1 <= int(number) <= last:
+                write(f"Expected a line number from 1 to {last}\n" if last
+                      else "The entry is empty\n")
+                return
+            i = int(number) - 1
+            if name == "edit":
+                entry.replace(i, i + 1, [line])
+            elif name == "insert":
+                entry.replace(i, i, [line])
+            else:
+                entry.replace(i, i + 1, [])
+            if entry.lines:
+                self.submit()
+        else:
+            write(f"Unknown command :{name} (:help lists them)\n")
+
+    def show_vars(self):
+        # The globals that have values, in the order they were created
+        runner = self.runner
+        for slot, name in enumerate(runner.symbols.names):
+            if name.startswith("%") or runner.slots[slot] is UNSET:
+                continue   # -O's temporaries, or not assigned yet
+            value = load_rope(runner.slots, slot, name)
+            shown = f'"{value}"' if isinstance(value, str) else f"{value}"
+            self.output.write(f"{name} = {shown}\n")
+        for name, value in runner.env.items():
+            self.output.write(f"{name} = {value}\n")
+
+    def interact(self, banner=True):
+        """
+        Read lines from standard input until :quit or the end of input.
+        Prompts are shown when standard input is a terminal.
+        """
+        interactive = sys.stdin.isatty()
+        if interactive:
+            try:
+                import readline   # line editing and history, where available
+            except ImportError:
+                pass
+            if banner:
+                print("Type :help for help, :quit or Ctrl-D to leave.")
+        while not self.done:
+            try:
+                line = input(self.prompt if interactive else "")
+            except EOFError:
+                if interactive:
+                    print()
+                break
+            except KeyboardInterrupt:
+                # Drop the entry being typed, as Python's REPL does
+                print("\nKeyboardInterrupt")
+                self.entry.clear()
+                continue
+            self.feed(line)
+        if self.entry.lines:
+            self.output.write("(the unfinished entry was not run)\n")
+            self.output.flush()
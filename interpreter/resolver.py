@@ -0,0 +1,180 @@
+# The resolver runs between Parser.parse and execution.  It gives every
+# global variable a number (its "slot") so the engines can keep values in
+# a list and reach them by index instead of hashing the name on every
+# read and write.
+#
+# Resolved programs use these extra node kinds:
+#   ("LOAD", slot, name)                    instead of ("VAR", name)
+#   ("STORE", slot, name, expr, position)   instead of ("ASSIGN", name, expr, position)
+# The name is kept so undefined variables are still reported by name.
+#
+# Assignments of the form  s = s + a + b + ...  become
+#   ("CONCAT", slot, name, [a, b, ...], position)
+# which may keep a string value as a rope (see ropes.py), and every read
+# of such a variable becomes ("LOAD_ROPE", slot, name) instead of LOAD.
+#
+# The remembered expressions of the dataflow pass (see dataflow.py) keep
+# their values in slots too:
+#   ("MEMO_SLOT", slot, name, expr)            instead of ("MEMO", name, expr)
+#   ("CLEAR_SLOTS", [slot, ...], position)     instead of ("FORGET", [name, ...], position)
+# A MEMO_SLOT whose slot is UNSET evaluates expr and keeps the value in the
+# slot unless it is a list; CLEAR_SLOTS sets its slots back to UNSET.
+
+
+class _Unset:
+    """
+    The value of a slot whose variable has never been assigned.
+    """
+    __slots__ = ()
+
+    def __repr__(self):
+        return "<unset>"
+
+    def __reduce__(self):
+        # Keep the singleton when snapshots are pickled or copied
+        return "UNSET"
+
+
+UNSET = _Unset()
+
+
+class SymbolTable:
+    """
+    Numbers global variable names in the order they are first seen.
+    One table is shared by everything an Interpreter runs, so a name keeps
+    the same slot across statements, files and REPL inputs.
+    """
+    def __init__(self):
+        self.names = []   # slot -> name
+        self.slots = {}   # name -> slot
+        self.ropes = set()   # names assigned with CONCAT somewhere
+
+    def __len__(self):
+        return len(self.names)
+
+    def slot(self, name):
+        """
+        The slot number for `name`, allocating a new one if needed.
+        """
+        slot = self.slots.get(name)
+        if slot is None:
+            slot = self.slots[name] = len(self.names)
+            self.names.append(name)
+        return slot
+
+
+class Resolver:
+    """
+    Rewrites an AST so that every VAR and ASSIGN refers to a slot.
+    """
+    def __init__(self, symbols=None):
+        self.symbols = symbols if symbols is not None else SymbolTable()
+
+    def resolve(self, statements):
+        """
+        Return the resolved version of a statement list.
+        """
+        # First find the CONCAT targets, so that reads of them earlier in
+        # the list (e.g. at the top of a loop body) use LOAD_ROPE too.
+        self.find_concats(statements)
+        return [self.stmt(s) for s in statements]
+
+    def find_concats(self, stmts):
+        for stmt in stmts or ():
+            kind = stmt[0]
+            if kind == "ASSIGN" and concat_pieces(stmt[1], stmt[2]) is not None:
+                self.symbols.ropes.add(stmt[1])
+            elif kind == "IF":
+                self.find_concats(stmt[2])
+                self.find_concats(stmt[3])
+            elif kind == "WHILE":
+                self.find_concats(stmt[2])
+
+    def block(self, stmts):
+        if stmts is None:
+            return None
+        return [self.stmt(s) for s in stmts]
+
+    def stmt(self, stmt):
+        kind = stmt[0]
+        position = stmt[-1]
+
+        if kind == "PRINT":
+            return ("PRINT", self.expr(stmt[1]), position)
+
+        if kind == "ASSIGN":
+            name = stmt[1]
+            pieces = concat_pieces(name, stmt[2])
+            if pieces is not None:
+                return ("CONCAT", self.symbols.slot(name), name,
+                        [self.expr(p) for p in pieces], position)
+            return ("STORE", self.symbols.slot(name), name, self.expr(stmt[2]), position)
+
+        if kind == "CALL":
+            return self.expr(stmt[:3]) + (position,)
+
+        if kind == "IF":
+            cond, then_blk, else_blk = stmt[1:4]
+            return ("IF", self.expr(cond), self.block(then_blk), self.block(else_blk),
+                    position)
+
+        if kind == "WHILE":
+            cond, body = stmt[1:3]
+            return ("WHILE", self.expr(cond), self.block(body), position)
+
+        if kind == "FORGET":
+            return ("CLEAR_SLOTS", [self.symbols.slot(name) for name in stmt[1]], position)
+
+        # Already resolved, or unknown (and ignored at run time)
+        return stmt
+
+    def expr(self, node):
+        t = node[0]
+
+        if t == "VAR":
+            name = node[1]
+            kind = "LOAD_ROPE" if name in self.symbols.ropes else "LOAD"
+            return (kind, self.symbols.slot(name), name)
+
+        if t in ("NUMBER", "STRING", "BOOL", "LOAD", "LOAD_ROPE", "MEMO_SLOT"):
+            return node
+
+        if t == "MEMO":
+            return ("MEMO_SLOT", self.symbols.slot(node[1]), node[1], self.expr(node[2]))
+
+        if t in ("INPUT", "NOT", "NEG"):
+            return (t, self.expr(node[1]))
+
+        if t == "LIST":
+            return ("LIST", [self.expr(e) for e in node[1]])
+
+        if t == "CALL":
+            return ("CALL", node[1], [self.expr(a) for a in node[2]])
+
+        if t == "CHAIN":
+            return ("CHAIN", self.expr(node[1]),
+                    [(op, self.expr(e)) for op, e in node[2]])
+
+        if len(node) == 3:
+            # INDEX and every binary operator: (kind, left, right)
+            return (t, self.expr(node[1]), self.expr(node[2]))
+
+        return node
+
+
+def concat_pieces(name, expr):
+    """
+    If `expr` is  name + a + b + ...  return [a, b, ...], else None.
+    Counters like  i = i + 1  are left alone: adding a number literal
+    never builds a string.
+    """
+    pieces = []
+    while expr[0] == "PLUS":
+        pieces.append(expr[2])
+        expr = expr[1]
+    if not pieces or expr != ("VAR", name):
+        return None
+    if all(piece[0] == "NUMBER" for piece in pieces):
+        return None
+    pieces.reverse()
+    return pieces
@@ -0,0 +1,81 @@
+from resolver import UNSET
+from runtime import plus
+
+# Linear-time string building.
+#
+# Python strings are immutable, so `s = s + piece` copies all of s every
+# time: building an N-character string in a loop costs O(N²).  CPython can
+# sometimes append in place, but not when the string is also referenced
+# from our variable slots, which it always is.
+#
+# Instead, the resolver turns `s = s + a + b` into a CONCAT statement and
+# the engines keep the value of s as a Rope: a list of pieces that each
+# CONCAT adds to, without copying.  The pieces are joined back into one
+# str the first time s is read in any other way (printed, compared,
+# indexed, passed to a builtin, assigned elsewhere, ...).  Reads of such
+# variables use LOAD_ROPE, which also writes the joined str back to the
+# slot, so a Rope never leaves its slot and the rest of the interpreter
+# only ever sees ordinary strings.
+
+
+class Rope:
+    """
+    A string kept as the first `count` strings in `parts`.
+    Ropes never change: add() returns a new Rope, which shares `parts`
+    with the old one when it can simply append to it.
+    """
+    __slots__ = ("parts", "count")
+
+    def __init__(self, parts):
+        self.parts = parts
+        self.count = len(parts)
+
+    def add(self, text):
+        """
+        The Rope for this string followed by `text`.
+        """
+        parts = self.parts
+        if self.count != len(parts):
+            # Another Rope already appended to the shared list (e.g. a
+            # CONCAT that failed half way), so start a list of our own.
+            parts = parts[:self.count]
+        parts.append(text)
+        return Rope(parts)
+
+    def flatten(self):
+        """
+        The string as a single str.
+        """
+        parts = self.parts
+        if self.count != len(parts):
+            parts = parts[:self.count]
+        return "".join(parts)
+
+
+def concat(acc, value):
+    """
+    acc + value for one piece of a CONCAT statement.  Adding a string to a
+    string (or Rope) gives a Rope; everything else is ordinary addition,
+    with the usual error for mixing strings and numbers.
+    """
+    if type(value) is str:
+        if type(acc) is Rope:
+            return acc.add(value)
+        if type(acc) is str:
+            return Rope([acc, value])
+    elif type(acc) is Rope:
+        raise TypeError(f"Cannot add str and {type(value).__name__}")
+    return plus(acc, value)
+
+
+def load_rope(slots, slot, name):
+    """
+    Read a slot that may hold a Rope (a LOAD_ROPE node): the Rope is
+    flattened and the str stored back in its place.
+    """
+    value = slots[slot]
+    if type(value) is Rope:
+        value = slots[slot] = value.flatten()
+    elif value is UNSET:
+        raise NameError(f"Undefined variable: {name}")
+    return value
@@ -0,0 +1,104 @@
+import operator
+
+import inputs
+from lists import LIST_TYPES
+
+# Shared runtime helpers for the compiled execution engines.
+#
+# The tree-walking Interpreter is the reference implementation of the
+# language.  The faster engines (closures, bytecode, ...) do not walk the
+# AST on every visit, but they must still behave *exactly* like it,
+# including the odd corners such as which error message a bad comparison
+# produces.  The helpers in this module capture those rules in one place.
+
+# Python functions for each comparison operator, looked up once when a
+# comparison is compiled instead of rebuilding a lambda table every time.
+COMPARE_OPS = {
+    "EQ":  operator.eq,
+    "NEQ": operator.ne,
+    "LT":  operator.lt,
+    "GT":  operator.gt,
+    "LE":  operator.le,
+    "GE":  operator.ge,
+}
+
+# Position of each operator in the tuple built by compare_eager() below.
+# The order matches the dictionary used by Interpreter.evaluate for CHAIN.
+_EAGER_ORDER = {"EQ": 0, "NEQ": 1, "LT": 2, "GT": 3, "LE": 4, "GE": 5}
+
+# Value types for which all six comparisons against a value of the
+# *same* type always succeed, so only the requested one needs computing.
+ORDERED_TYPES = frozenset((float, int, bool, str))
+
+
+def compare_eager(op, a, b):
+    """
+    Compare two values the way a CHAIN link does in the tree walker.
+    The walker builds all six results before picking one, so comparing
+    values that cannot be ordered (e.g. "a" == 1) raises the '<' error
+    even for EQ/NEQ.  We reproduce that by computing them in the same order.
+    """
+    results = (a == b, a != b, a < b, a > b, a <= b, a >= b)
+    return results[_EAGER_ORDER[op]]
+
+
+def compare_link(op, fn, a, b):
+    """
+    Evaluate one link of a chained comparison.
+    `fn` is COMPARE_OPS[op].  Same-typed numbers, booleans and strings take
+    the fast path; everything else goes through compare_eager() so the
+    error behaviour stays identical to the reference interpreter.
+    """
+    if type(a) is type(b) and type(a) in ORDERED_TYPES:
+        return fn(a, b)
+    return compare_eager(op, a, b)
+
+
+def check_condition(test):
+    """
+    Validate the value of an if/while condition.
+    Only real booleans are accepted; returns the value unchanged.
+    """
+    if test is True or test is False:
+        return test
+    raise TypeError("Condition must be boolean")
+
+
+def plus(a, b):
+    """
+    Addition / concatenation with the language's strict rule:
+    a string may only be added to another string.
+    """
+    if isinstance(a, str) ^ isinstance(b, str):
+        raise TypeError(f"Cannot add {type(a).__name__} and {type(b).__name__}")
+    return a + b
+
+
+def negate(val):
+    """
+    Unary minus, which only applies to numbers.
+    """
+    if not isinstance(val, (int, float)):
+        raise TypeError("Unary minus applied to non-number")
+    return -val
+
+
+def index(lst, idx):
+    """
+    Retrieve one item from a list, as list[index] does.
+    """
+    if not isinstance(lst, LIST_TYPES):
+        raise TypeError("Indexing non-list")
+    if not isinstance(idx, (int, float)):
+        raise TypeError("Index must be a number")
+    return lst[idx if type(idx) is int else int(idx)]
+
+
+def read_input(prompt, output):
+    """
+    The input(prompt) builtin: prompts must be strings.  `output` is the
+    engine's output sink, which shows the prompt.
+    """
+    if not isinstance(prompt, str):
+        raise TypeError("Input prompt must be a string")
+    return inputs.read_line(prompt, output)
@@ -0,0 +1,191 @@
+import re
+from array import array
+from bisect import bisect_left
+from itertools import repeat
+
+# A faster alternative to lexer.tokenize.
+#
+# lexer.tokenize tries one big alternation of ~40 named patterns at every
+# position, with a separate \b...\b pattern for each keyword, and then
+# classifies every match with a chain of membership tests.  The scanner
+# below instead matches just five coarse token shapes (identifier, number,
+# string, operator, anything else), skipping whitespace and comments as
+# part of the same match.  Identifiers are lexed once and told apart from
+# keywords with a single dictionary lookup, and so are operators.
+#
+# The result is a TokenStream: parallel arrays of integer kind codes,
+# values, source offsets and line/column positions, rather than a list
+# of (str, value) tuples.
+
+# ----------------------------------------------------------------------
+# Token kinds
+# ----------------------------------------------------------------------
+# The codes index KIND_NAMES, which holds the names the parser uses.
+KIND_NAMES = (
+    "PRINT", "IF", "ELSE", "WHILE", "INPUT",
+    "STRING", "TRUE", "FALSE", "NUMBER",
+    "AND", "OR", "EQ", "NEQ", "LE", "GE", "LT", "GT",
+    "ASSIGN", "NOT", "PLUS", "MINUS", "MUL", "DIV", "MOD",
+    "LPAREN", "RPAREN", "LBRACE", "RBRACE", "LBRACKET", "RBRACKET", "COMMA",
+    "IDENT",
+)
+KIND_CODES = {name: code for code, name in enumerate(KIND_NAMES)}
+
+STRING = KIND_CODES["STRING"]
+NUMBER = KIND_CODES["NUMBER"]
+IDENT = KIND_CODES["IDENT"]
+
+# Reserved words, looked up after an identifier has been matched
+KEYWORDS = {
+    word: KIND_CODES[word.upper()]
+    for word in ("print", "if", "else", "while", "input",
+                 "true", "false", "and", "or")
+}
+
+# Operators and punctuation, looked up by their text
+SYMBOLS = {
+    "==": KIND_CODES["EQ"],     "!=": KIND_CODES["NEQ"],
+    "<=": KIND_CODES["LE"],     ">=": KIND_CODES["GE"],
+    "<":  KIND_CODES["LT"],     ">":  KIND_CODES["GT"],
+    "=":  KIND_CODES["ASSIGN"], "!":  KIND_CODES["NOT"],
+    "+":  KIND_CODES["PLUS"],   "-":  KIND_CODES["MINUS"],
+    "*":  KIND_CODES["MUL"],    "/":  KIND_CODES["DIV"],
+    "%":  KIND_CODES["MOD"],
+    "(":  KIND_CODES["LPAREN"],   ")": KIND_CODES["RPAREN"],
+    "{":  KIND_CODES["LBRACE"],   "}": KIND_CODES["RBRACE"],
+    "[":  KIND_CODES["LBRACKET"], "]": KIND_CODES["RBRACKET"],
+    ",":  KIND_CODES["COMMA"],
+}
+
+# One match = optional whitespace/comments, then exactly one token (or
+# the end of the input).  Every position matches something (group 5
+# catches stray characters), so finditer never silently skips text.
+_TOKEN_RE = re.compile(r"""
+    [ \t\r\n]*(?:\#[^\n]*[ \t\r\n]*)*       # whitespace and comments
+    (?:
+        ([a-zA-Z_][a-zA-Z0-9_]*)             # 1: identifier or keyword
+      | (\d+(?:\.\d+)?)                      # 2: number
+      | ("[^"\\]*")                          # 3: string literal
+      | (==|!=|<=|>=|[-+*/%<>=!(){}\[\],])   # 4: operator or delimiter
+      | (.)                                  # 5: anything else is an error
+      | \Z                                   # or just trailing space/comments
+    )
+""", re.VERBOSE)
+
+_NEWLINE_RE = re.compile(r"\n")
+
+
+class TokenStream:
+    """
+    The scanner's output, stored column-wise:
+      - kinds:   array of kind codes (see KIND_NAMES)
+      - values:  list of token values; numbers are ints or floats (see
+                 lexer.number_value), strings have their quotes removed,
+                 everything else is its source text
+      - offsets: array of source offsets where each token starts
+      - lines:   array of 1-based line numbers
+      - cols:    array of 1-based column numbers (built on first use)
+    Iterating over a TokenStream yields the same (TOKEN_TYPE, value, line,
+    column) tuples as lexer.tokenize, so it can be handed straight to the
+    Parser.
+    """
+    def __init__(self, kinds, values, offsets, lines, line_starts):
+        self.kinds = kinds
+        self.values = values
+        self.offsets = offsets
+        self.lines = lines
+        self.line_starts = line_starts
+        self._cols = None
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __iter__(self):
+        return zip(map(KIND_NAMES.__getitem__, self.kinds), self.values,
+                   self.lines, self.cols)
+
+    def __getitem__(self, i):
+        return (KIND_NAMES[self.kinds[i]], self.values[i]) + self.position(i)
+
+    @property
+    def cols(self):
+        if self._cols is None:
+            starts = self.line_starts
+            self._cols = array("l", [offset - starts[line - 1] + 1 for offset, line
+                                     in zip(self.offsets, self.lines)])
+        return self._cols
+
+    def position(self, i):
+        """
+        (line, column) of token i, both counted from 1.
+        """
+        line = self.lines[i]
+        return (line, self.offsets[i] - self.line_starts[line - 1] + 1)
+
+
+def scan(code, float_numbers=False):
+    """
+    Scan source code into a TokenStream.
+    Raises SyntaxError on the first character that can't start a token,
+    with the same message as lexer.tokenize.  float_numbers makes every
+    number a float, as lexer.tokenize does.
+    """
+    kinds = array("B")
+    values = []
+    offsets = array("q")
+    add_kind, add_value, add_offset = kinds.append, values.append, offsets.append
+    keywords, symbols = KEYWORDS, SYMBOLS
+
+    for mo in _TOKEN_RE.finditer(code):
+        group = mo.lastindex
+        if group is None:
+            break   # only whitespace and comments were left
+        text = mo.group(group)
+
+        if group == 1:
+            kind = keywords.get(text, IDENT)
+        elif group == 4:
+            kind = symbols[text]
+        elif group == 2:
+            kind = NUMBER
+            text = float(text) if float_numbers or "." in text else int(text)
+        elif group == 3:
+            kind = STRING
+            text = text[1:-1]
+        else:
+            raise SyntaxError(f"Unexpected character: {text}")
+
+        add_kind(kind)
+        add_value(text)
+        add_offset(mo.start(group))
+
+    line_starts, lines = _line_numbers(code, offsets)
+    return TokenStream(kinds, values, offsets, lines, line_starts)
+
+
+def _line_numbers(code, offsets):
+    """
+    Work out which line each token is on.  Rather than searching once per
+    token, walk the lines and count how many (sorted) offsets fall in each.
+    Returns the table of line start offsets and the per-token line array.
+    """
+    line_starts = array("q", [0])
+    line_starts.extend(mo.end() for mo in _NEWLINE_RE.finditer(code))
+
+    lines = array("l")
+    first = 0
+    for line in range(1, len(line_starts)):
+        # Tokens before the start of the next line are on this one
+        end = bisect_left(offsets, line_starts[line], first)
+        if end > first:
+            lines.extend(repeat(line, end - first))
+            first = end
+    lines.extend(repeat(len(line_starts), len(offsets) - first))
+    return line_starts, lines
+
+
+def tokenize(code, float_numbers=False):
+    """
+    Drop-in replacement for lexer.tokenize on a complete source string.
+    """
+    return iter(scan(code, float_numbers))
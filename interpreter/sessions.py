@@ -0,0 +1,349 @@
+import asyncio
+import sys
+
+import errors
+import output as outputs
+from budget import Budget
+from interpreter import Interpreter
+from lists import new_list
+from natives import BUILTINS, read_lines_count
+from resolver import Resolver, SymbolTable, UNSET
+from ropes import concat
+
+# Running programs as asyncio tasks, so that one process can serve many
+# interactive sessions at once (main.py --serve, --async).
+#
+# An AsyncInterpreter is the tree walker with an async layer on top.
+# Statements that print or read input suspend the session there: printed
+# text is sent to the session's channel, and input() and read_lines wait
+# for lines from it, while other sessions run.  Every other statement,
+# including whole loops that neither print nor read, runs on the ordinary
+# synchronous tree walker at full speed.  Note that such a loop keeps the
+# event loop to itself until it ends.
+#
+# A channel is any object with the methods of Channel: StreamChannel
+# serves asyncio streams (a TCP connection), StdioChannel the process's
+# own standard input and output.
+
+# A literal node holding a value that has already been computed: the
+# tree walker returns node[1] of a literal as it is, whatever its type
+_VALUE = "NUMBER"
+
+# Nodes holding values, which may be tuples of strings such as "PRINT"
+_LITERALS = ("NUMBER", "STRING", "BOOL", "LIST_CONST")
+
+
+def _value(value):
+    return (_VALUE, value)
+
+
+class Channel:
+    """
+    The interface sessions use to talk to their user.  read_line()
+    raises EOFError at the end of the input.  With `prompts` false,
+    input() prompts are not sent.
+    """
+    prompts = True
+
+    async def read_line(self):
+        raise NotImplementedError
+
+    async def write(self, text):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class StreamChannel(Channel):
+    """
+    A session over an asyncio StreamReader/StreamWriter pair, such as a
+    TCP connection, in UTF-8.
+    """
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def read_line(self):
+        line = await self.reader.readline()
+        if not line:
+            raise EOFError("EOF when reading a line")
+        return line.decode("utf-8", "replace").rstrip("\r\n")
+
+    async def write(self, text):
+        self.writer.write(text.encode("utf-8"))
+        await self.writer.drain()
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+class StdioChannel(Channel):
+    """
+    A session on this process's standard input and output.  Lines are
+    read on a worker thread, so the event loop keeps running meanwhile.
+    """
+    async def read_line(self):
+        line = await asyncio.get_running_loop().run_in_executor(None, sys.stdin.readline)
+        if not line:
+            raise EOFError("EOF when reading a line")
+        return line.rstrip("\r\n")
+
+    async def write(self, text):
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+
+class _PendingOutput(outputs.Output):
+    # Collects what a session prints until the session next suspends
+    def __init__(self):
+        self.parts = []
+
+    def write(self, text):
+        self.parts.append(text)
+
+    def take(self):
+        text = "".join(self.parts)
+        self.parts.clear()
+        return text
+
+
+class Program:
+    """
+    A parsed program, resolved once, that any number of sessions can run.
+    """
+    def __init__(self, statements):
+        self.symbols = SymbolTable()
+        self.statements = Resolver(self.symbols).resolve(statements)
+        self._suspends = {}   # id(node) -> (node, whether it suspends)
+
+    def suspends(self, node):
+        """
+        Whether running a statement or expression node may suspend the
+        session: it prints, calls input() or read_lines.
+        """
+        found = self._suspends.get(id(node))
+        if found is None:
+            found = self._suspends[id(node)] = (node, _suspends(node))
+        return found[1]
+
+    def session(self, channel, strict=False):
+        """
+        A new AsyncInterpreter running this program on `channel`.
+        """
+        return AsyncInterpreter(self, channel, strict)
+
+
+def _suspends(node):
+    # Look through a node's tuples and lists for anything that suspends
+    if type(node) is tuple and node:
+        if node[0] in ("PRINT", "INPUT"):
+            return True
+        if node[0] == "CALL" and node[1] == "read_lines":
+            return True
+        if node[0] in _LITERALS:
+            return False
+    return any(_suspends(part) for part in node if type(part) in (tuple, list))
+
+
+class AsyncInterpreter(Interpreter):
+    """
+    A tree-walking Interpreter whose program runs as a coroutine, talking
+    to its user through a Channel: await run() to run the whole program.
+    Each session has its own globals.
+    """
+    def __init__(self, program, channel, strict=False):
+        super().__init__(_PendingOutput(), strict)
+        self.program = program
+        self.channel = channel
+        # The program is already resolved: share its symbols
+        self.symbols = program.symbols
+        self.slots.extend([UNSET] * len(program.symbols))
+
+    async def run(self):
+        """
+        Run the program.  In strict mode an error raises ProgramError.
+        """
+        try:
+            for stmt in self.program.statements:
+                await self.execute_async(stmt)
+        finally:
+            await self.flush()
+
+    async def flush(self):
+        """
+        Send everything printed so far to the channel.
+        """
+        text = self.output.take()
+        if text:
+            await self.channel.write(text)
+
+    async def read_line(self, prompt):
+        if self.channel.prompts:
+            self.output.write(prompt)
+        await self.flush()
+        return await self.channel.read_line()
+
+    async def read_lines(self, count):
+        lines = []
+        try:
+            while len(lines) < count:
+                lines.append(await self.channel.read_line())
+        except EOFError:
+            pass
+        return new_list(lines)
+
+    async def execute_async(self, stmt):
+        """
+        Execute a statement like execute(), suspending at print, input()
+        and read_lines.
+        """
+        if not self.program.suspends(stmt):
+            self.execute(stmt)
+            return
+
+        kind = stmt[0]
+        try:
+            if kind == "PRINT":
+                self.output.print(await self.evaluate_async(stmt[1]))
+                await self.flush()
+                # Let the other sessions run, even when the channel
+                # doesn't need to wait
+                await asyncio.sleep(0)
+
+            elif kind == "STORE":
+                self.slots[stmt[1]] = await self.evaluate_async(stmt[3])
+
+            elif kind == "CONCAT":
+                slot, name, pieces = stmt[1:4]
+                value = self.slots[slot]
+                if value is UNSET:
+                    raise NameError(f"Undefined variable: {name}")
+                for piece in pieces:
+                    value = concat(value, await self.evaluate_async(piece))
+                self.slots[slot] = value
+
+            elif kind == "CALL":
+                await self.evaluate_async(stmt)
+
+            elif kind == "IF":
+                cond, then_blk, else_blk = stmt[1:4]
+                test = await self.evaluate_async(cond)
+                if not isinstance(test, bool):
+                    raise TypeError("Condition must be boolean")
+                for s in (then_blk if test else else_blk) or ():
+                    await self.execute_async(s)
+
+            elif kind == "WHILE":
+                cond, body = stmt[1:3]
+                budget = self.budget
+                while True:
+                    test = await self.evaluate_async(cond)
+                    if not isinstance(test, bool):
+                        raise TypeError("Condition must be boolean")
+                    if not test:
+                        break
+                    if budget is not None:
+                        budget.tick(stmt[-1])
+                    for s in body:
+                        await self.execute_async(s)
+
+        except ConnectionError:
+            # The user has gone: end the session
+            raise
+        except Exception as e:
+            self.report(e, stmt[-1])
+
+    async def evaluate_async(self, node):
+        """
+        Evaluate an expression like evaluate(), waiting for input where it
+        reads some.  Operands are evaluated here, in the same order as
+        evaluate() would, and the operation itself is left to evaluate().
+        """
+        if not self.program.suspends(node):
+            return self.evaluate(node)
+
+        t = node[0]
+        if t == "INPUT":
+            prompt = await self.evaluate_async(node[1])
+            if not isinstance(prompt, str):
+                raise TypeError("Input prompt must be a string")
+            return await self.read_line(prompt)
+
+        if t == "CALL":
+            name, args = node[1], node[2]
+            if name not in BUILTINS:
+                raise NameError(f"Unknown function: {name}")
+            fn, min_args, max_args = BUILTINS[name]
+            values = [await self.evaluate_async(arg) for arg in args[:max_args]]
+            if len(values) < min_args:
+                raise IndexError("list index out of range")
+            if name == "read_lines":
+                return await self.read_lines(read_lines_count(*values))
+            return fn(*values)
+
+        if t == "AND":
+            left = await self.evaluate_async(node[1])
+            return left and await self.evaluate_async(node[2])
+
+        if t == "OR":
+            left = await self.evaluate_async(node[1])
+            return left or await self.evaluate_async(node[2])
+
+        if t == "CHAIN":
+            # One link at a time, stopping at the first false one
+            current = await self.evaluate_async(node[1])
+            for op, expr in node[2]:
+                nxt = await self.evaluate_async(expr)
+                if not self.evaluate(("CHAIN", _value(current), [(op, _value(nxt))])):
+                    return False
+                current = nxt
+            return True
+
+        if t == "LIST":
+            return new_list([await self.evaluate_async(elem) for elem in node[1]])
+
+        # Unary and binary operators and INDEX: (kind, operand, ...)
+        operands = [await self.evaluate_async(operand) for operand in node[1:]]
+        return self.evaluate((t,) + tuple(_value(v) for v in operands))
+
+
+async def run_session(program, channel, strict=False, budget=None):
+    """
+    Run one session of `program` on `channel` and close the channel.  The
+    error that stopped the program, in strict mode or when it went over
+    its budget, is sent to the user.
+    """
+    session = program.session(channel, strict)
+    if budget is not None:
+        session.set_budget(budget)
+    try:
+        await session.run()
+    except errors.ProgramError as e:
+        await channel.write(f"{e}\n")
+    except ConnectionError:
+        pass
+    finally:
+        await channel.close()
+
+
+async def serve_tcp(program, host="127.0.0.1", port=8023, strict=False, ready=None,
+                    limits=None):
+    """
+    Serve a fresh session of `program` to every TCP connection until
+    cancelled.  ready(server), if given, is called once it is listening.
+    With `limits`, each session runs on its own Budget(**limits).
+    """
+    async def connected(reader, writer):
+        budget = Budget(**limits) if limits else None
+        await run_session(program, StreamChannel(reader, writer), strict, budget)
+
+    server = await asyncio.start_server(connected, host, port, limit=1 << 16)
+    async with server:
+        if ready is not None:
+            ready(server)
+        await server.serve_forever()
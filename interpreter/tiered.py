@@ -0,0 +1,178 @@
+from time import perf_counter
+
+from closures import ClosureCompiler
+from interpreter import Interpreter
+
+# Tiered execution (main.py --engine tiered).
+#
+# Most statements run once, and compiling them first (as the closure
+# engine does) costs more than walking them.  TieredInterpreter walks the
+# tree like the reference interpreter, but counts the iterations of every
+# while loop.  Once a loop has run `threshold` iterations in total, over
+# however many times the loop statement was reached, its condition and
+# body are compiled with the ClosureCompiler and the loop carries on from
+# its current iteration on the compiled code.  Later runs of the same loop
+# use the compiled code from the start.
+#
+# Both tiers share the globals, output and error reporting, and evaluate
+# the condition once per iteration, so switching never changes what the
+# program does.  Loops nested inside a promoted loop are compiled along
+# with it and have no statistics of their own.
+
+# Iterations a loop runs in the tree walker before it is compiled
+DEFAULT_THRESHOLD = 1000
+
+
+class LoopStats:
+    """
+    What happened to one while loop.  `saved` estimates the time the
+    compiled iterations saved, assuming they would have cost as much as
+    the tree-walked ones did on average.
+    """
+    __slots__ = ("stmt", "iterations", "tree_time", "compiled_iterations",
+                 "compiled_time", "code")
+
+    def __init__(self, stmt):
+        self.stmt = stmt              # also keeps id(stmt) from being reused
+        self.iterations = 0           # tree-walked iterations
+        self.tree_time = 0.0
+        self.compiled_iterations = 0
+        self.compiled_time = 0.0
+        self.code = None              # (test, body) once promoted
+
+    @property
+    def line(self):
+        return self.stmt[-1][0] if self.stmt[-1] else 0
+
+    @property
+    def promoted(self):
+        return self.code is not None
+
+    @property
+    def saved(self):
+        if not self.promoted or not self.iterations:
+            return 0.0
+        per_iteration = self.tree_time / self.iterations
+        return self.compiled_iterations * per_iteration - self.compiled_time
+
+
+class TieredInterpreter(Interpreter):
+    """
+    A tree-walking Interpreter that compiles while loops once they have
+    run `threshold` iterations.  After the run, `loops` maps id(stmt) of
+    every while loop reached to its LoopStats; see promotions().
+    """
+    def __init__(self, output=None, strict=False, threshold=DEFAULT_THRESHOLD):
+        super().__init__(output, strict)
+        self.threshold = threshold
+        self.loops = {}
+        self.compiler = ClosureCompiler(self.env, self.slots, self.output, self.report)
+
+    def execute(self, stmt):
+        if stmt[0] != "WHILE":
+            return super().execute(stmt)
+
+        stats = self.loops.get(id(stmt))
+        if stats is None:
+            stats = self.loops[id(stmt)] = LoopStats(stmt)
+        cond, body = stmt[1:3]
+        budget = self.budget
+        start = perf_counter()
+        count = 0
+        try:
+            if stats.code is None:
+                # Tier 1: the tree walker's loop, counting iterations.
+                # Loops stay here while hooks are watching every statement.
+                remaining = self.threshold - stats.iterations
+                if self.hooks is not None and self.hooks.active:
+                    remaining = float("inf")
+                while True:
+                    if count >= remaining:
+                        # Hot: compile and go on below
+                        stats.code = self.compile_loop(cond, body, stmt[-1])
+                        break
+                    test = self.evaluate(cond)
+                    if not isinstance(test, bool):
+                        raise TypeError("Condition must be boolean")
+                    if not test:
+                        return
+                    if budget is not None:
+                        budget.tick(stmt[-1])
+                    for s in body:
+                        self.execute(s)
+                    count += 1
+                stats.iterations += count
+                stats.tree_time += perf_counter() - start
+                start = perf_counter()
+                count = 0
+
+            # Tier 2: the compiled condition and body
+            test, body_run = stats.code
+            while True:
+                t = test()
+                if t is False:
+                    break
+                if t is not True:
+                    raise TypeError("Condition must be boolean")
+                if body_run is not None:
+                    body_run()
+                count += 1
+        except Exception as e:
+            self.report(e, stmt[-1])
+        finally:
+            # count and start belong to whichever tier was running
+            elapsed = perf_counter() - start
+            if stats.code is None:
+                stats.iterations += count
+                stats.tree_time += elapsed
+            else:
+                stats.compiled_iterations += count
+                stats.compiled_time += elapsed
+
+    def set_budget(self, budget):
+        super().set_budget(budget)
+        self.compiler.budget = budget
+
+    def compile_loop(self, cond, body, position):
+        """
+        Compile a loop's condition and body: (test, body), where body is
+        None for an empty body.  With a budget, the body counts the
+        iteration first.
+        """
+        compiler = self.compiler
+        test = compiler.compile_expr(cond)
+        body_run = compiler.compile_block(body) if body else None
+        budget = self.budget
+        if budget is None:
+            return test, body_run
+        tick = budget.tick
+
+        def counted_body():
+            tick(position)
+            if body_run is not None:
+                body_run()
+        return test, counted_body
+
+    def promotions(self):
+        """
+        The LoopStats of the loops that were compiled, most time saved
+        first.
+        """
+        promoted = [stats for stats in self.loops.values() if stats.promoted]
+        return sorted(promoted, key=lambda stats: stats.saved, reverse=True)
+
+    def tier_summary(self):
+        """
+        A report of every promoted loop, for main.py --tier-stats.
+        """
+        rows = self.promotions()
+        out = [f"Tiered: {len(rows)} of {len(self.loops)} while loops compiled "
+               f"(threshold {self.threshold} iterations)"]
+        if rows:
+            out.append(f"{'line':>6} {'walked':>10} {'compiled':>10} "
+                       f"{'walked s':>9} {'compiled s':>10} {'saved s':>9}")
+        for stats in rows:
+            out.append(f"{stats.line:>6} {stats.iterations:>10} "
+                       f"{stats.compiled_iterations:>10} {stats.tree_time:>9.3f} "
+                       f"{stats.compiled_time:>10.3f} {stats.saved:>9.3f}")
+        return "\n".join(out)
@@ -0,0 +1,380 @@
+from math import inf, isfinite
+
+from interpreter import Interpreter
+from closures import ClosureCompiler
+from resolver import UNSET
+from lists import LIST_TYPES, new_list
+from ropes import Rope, concat, load_rope
+from natives import BUILTINS
+from runtime import (COMPARE_OPS, ORDERED_TYPES, compare_link,
+                     plus, negate, index, read_input)
+
+# Python spelling of each comparison operator
+_PY_COMPARE = {"EQ": "==", "NEQ": "!=", "LT": "<", "GT": ">", "LE": "<=", "GE": ">="}
+_PY_ARITHMETIC = {"MINUS": "-", "MUL": "*", "DIV": "/", "MOD": "%"}
+
+
+def _link(op, a, b):
+    """
+    One link of a chained comparison whose operands are not of the same
+    ordered type, with the reference interpreter's error behaviour.
+    Always returns a real boolean.
+    """
+    return True if compare_link(op, COMPARE_OPS[op], a, b) else False
+
+
+def _reporter(report):
+    """
+    The function generated code reports a statement's error with, which
+    passes it on to the engine's `report`.  Globals are read with
+    env["name"], so a KeyError means an undefined variable.
+    """
+    def report_error(e, position):
+        if type(e) is KeyError:
+            e = NameError(f"Undefined variable: {e.args[0]}")
+        report(e, position)
+    return report_error
+
+
+def _undefined(name):
+    raise NameError(f"Undefined variable: {name}")
+
+
+def _memo(slots, slot, value):
+    """
+    Remember a MEMO_SLOT's value in its slot, unless it is a list.
+    """
+    if not isinstance(value, LIST_TYPES):
+        slots[slot] = value
+    return value
+
+
+def _literal(value):
+    """
+    Python source for a constant.  repr() spells a float that is not
+    finite as a bare inf or nan, which generated code would take for a
+    variable, so those use the _INF and _NAN helpers instead.
+    """
+    if type(value) is float and not isfinite(value):
+        if value != value:
+            return "_NAN"
+        return "_INF" if value > 0 else "(-_INF)"
+    if type(value) is tuple:
+        return "(" + "".join(_literal(v) + ", " for v in value) + ")"
+    return repr(value)
+
+
+def _fail(exc_type, message, *evaluated):
+    """
+    Raise an error after its operands were evaluated (for side effects).
+    """
+    raise exc_type(message)
+
+
+# The globals every generated function runs with, besides the output
+# helpers (_print, _report, _output) added by compile_statements().
+_HELPERS = {
+    "_link":   _link,
+    "_plus":   plus,
+    "_neg":    negate,
+    "_index":  index,
+    "_input":  read_input,
+    "_fail":   _fail,
+    "_memo":   _memo,
+    "_undefined": _undefined,
+    "_UNSET":  UNSET,
+    "_INF":    inf,
+    "_NAN":    float("nan"),
+    "_new_list": new_list,
+    "_ORDERED": ORDERED_TYPES,
+    "_Rope":   Rope,
+    "_concat": concat,
+    "_load_rope": load_rope,
+}
+for _name, (_fn, _, _) in BUILTINS.items():
+    _HELPERS["_builtin_" + _name] = _fn
+
+
+class Transpiler:
+    """
+    Translates the tuple AST into the source code of a Python function
+
+        def __run__(env, slots):
+            ...
+
+    that behaves exactly like running the statements with the tree-walking
+    Interpreter: globals live in the `env` dictionary (or in `slots` for
+    resolved programs), numbers keep their int or float type,
+    `+` refuses to mix strings and numbers, conditions must be booleans and
+    every statement reports its own errors and lets execution continue.
+    With `count_iterations`, while loops count every iteration down on
+    `_budget` (see budget.Budget.countdown), for runs with a budget.
+    """
+    def __init__(self, count_iterations=False):
+        self.count_iterations = count_iterations
+        self.lines = []
+        self._temps = 0
+
+    def transpile(self, statements):
+        """
+        Return the Python source for a list of statements.
+        """
+        self.lines = ["def __run__(env, slots):"]
+        self._temps = 0
+        self.block(statements, 1)
+        return "\n".join(self.lines) + "\n"
+
+    def emit(self, depth, text):
+        self.lines.append("    " * depth + text)
+
+    def temp(self):
+        """
+        A fresh local variable name, used to evaluate an operand once.
+        """
+        self._temps += 1
+        return f"_t{self._temps}"
+
+    # ------------------------------------------------------------------
+    # Statements
+    # ------------------------------------------------------------------
+
+    def block(self, stmts, depth):
+        start = len(self.lines)
+        for stmt in stmts or []:
+            self.stmt(stmt, depth)
+        if len(self.lines) == start:
+            self.emit(depth, "pass")
+
+    def stmt(self, stmt, depth):
+        """
+        Emit one statement wrapped in its own try/except, mirroring the
+        per-statement recovery of Interpreter.execute.
+        """
+        kind = stmt[0]
+        if kind not in ("PRINT", "ASSIGN", "STORE", "CONCAT", "CALL", "IF", "WHILE",
+                        "CLEAR_SLOTS"):
+            # Ignored by the tree walker as well
+            return
+
+        self.emit(depth, "try:")
+        inner = depth + 1
+
+        if kind == "PRINT":
+            self.emit(inner, f"_print({self.expr(stmt[1])})")
+
+        elif kind == "ASSIGN":
+            self.emit(inner, f"env[{stmt[1]!r}] = {self.expr(stmt[2])}")
+
+        elif kind == "STORE":
+            self.emit(inner, f"slots[{stmt[1]}] = {self.expr(stmt[3])}")
+
+        elif kind == "CONCAT":
+            slot, name, pieces = stmt[1:4]
+            value = self.expr(("LOAD", slot, name))
+            for piece in pieces:
+                # As PLUS, except that strings are added as a rope
+                a, b = self.temp(), self.temp()
+                value = (f"({a} + {b} if type({a} := {value}) "
+                         f"is type({b} := {self.expr(piece)}) is not str "
+                         f"else _concat({a}, {b}))")
+            self.emit(inner, f"slots[{slot}] = {value}")
+
+        elif kind == "CALL":
+            self.emit(inner, self.expr(stmt))
+
+        elif kind == "CLEAR_SLOTS":
+            for slot in stmt[1]:
+                self.emit(inner, f"slots[{slot}] = _UNSET")
+
+        elif kind == "IF":
+            cond, then_blk, else_blk = stmt[1:4]
+            test = self.temp()
+            self.emit(inner, f"{test} = {self.expr(cond)}")
+            self.emit(inner, f"if {test} is True:")
+            self.block(then_blk, inner + 1)
+            self.emit(inner, f"elif {test} is False:")
+            self.block(else_blk, inner + 1)
+            self.emit(inner, "else:")
+            self.emit(inner + 1, 'raise TypeError("Condition must be boolean")')
+
+        elif kind == "WHILE":
+            cond, body = stmt[1:3]
+            test = self.temp()
+            self.emit(inner, "while True:")
+            self.emit(inner + 1, f"{test} = {self.expr(cond)}")
+            self.emit(inner + 1, f"if {test} is False:")
+            self.emit(inner + 2, "break")
+            self.emit(inner + 1, f"if {test} is not True:")
+            self.emit(inner + 2, 'raise TypeError("Condition must be boolean")')
+            if self.count_iterations:
+                self.emit(inner + 1, "_budget.countdown -= 1")
+                self.emit(inner + 1, "if _budget.countdown <= 0:")
+                self.emit(inner + 2, f"_budget.check({stmt[-1]!r})")
+            for s in body:
+                self.stmt(s, inner + 1)
+
+        self.emit(depth, "except Exception as _e:")
+        self.emit(inner, f"_report(_e, {stmt[-1]!r})")
+
+    # ------------------------------------------------------------------
+    # Expressions
+    # ------------------------------------------------------------------
+
+    def expr(self, node):
+        """
+        Return a Python expression (as a string) for an AST expression.
+        Operands are always evaluated left to right, once.
+        """
+        t = node[0]
+
+        if t in ("NUMBER", "STRING", "BOOL"):
+            return _literal(node[1])
+
+        if t == "LOAD":
+            value = self.temp()
+            return (f"({value} if ({value} := slots[{node[1]}]) is not _UNSET "
+                    f"else _undefined({node[2]!r}))")
+
+        if t == "LOAD_ROPE":
+            value = self.temp()
+            return (f"({value} if ({value} := slots[{node[1]}]) is not _UNSET "
+                    f"and type({value}) is not _Rope "
+                    f"else _load_rope(slots, {node[1]}, {node[2]!r}))")
+
+        if t == "MEMO_SLOT":
+            value = self.temp()
+            return (f"({value} if ({value} := slots[{node[1]}]) is not _UNSET "
+                    f"else _memo(slots, {node[1]}, {self.expr(node[3])}))")
+
+        if t == "VAR":
+            return f"env[{node[1]!r}]"
+
+        if t == "INPUT":
+            return f"_input({self.expr(node[1])}, _output)"
+
+        if t == "LIST":
+            return "_new_list([" + ", ".join(self.expr(e) for e in node[1]) + "])"
+
+        if t == "LIST_CONST":
+            # CPython stores the tuple as a constant; _new_list copies it
+            return f"_new_list({_literal(node[1])})"
+
+        if t == "INDEX":
+            return f"_index({self.expr(node[1])}, {self.expr(node[2])})"
+
+        if t == "CALL":
+            return self.call(node[1], node[2])
+
+        if t == "NOT":
+            return f"(not {self.expr(node[1])})"
+
+        if t == "NEG":
+            return f"_neg({self.expr(node[1])})"
+
+        if t == "PLUS":
+            # Operands of the same type (two numbers of one kind, two
+            # strings) are added natively: the strict runtime helper only
+            # matters when the types differ.
+            a, b = self.temp(), self.temp()
+            return (f"({a} + {b} if type({a} := {self.expr(node[1])}) "
+                    f"is type({b} := {self.expr(node[2])}) "
+                    f"else _plus({a}, {b}))")
+
+        if t in _PY_ARITHMETIC:
+            return f"({self.expr(node[1])} {_PY_ARITHMETIC[t]} {self.expr(node[2])})"
+
+        if t in _PY_COMPARE:
+            return f"({self.expr(node[1])} {_PY_COMPARE[t]} {self.expr(node[2])})"
+
+        if t == "CHAIN":
+            return self.chain(node[1], node[2])
+
+        if t == "AND":
+            return f"({self.expr(node[1])} and {self.expr(node[2])})"
+
+        if t == "OR":
+            return f"({self.expr(node[1])} or {self.expr(node[2])})"
+
+        return f"_fail(ValueError, {('Unknown node type: ' + t)!r})"
+
+    def call(self, name, args):
+        if name not in BUILTINS:
+            return f"_fail(NameError, {('Unknown function: ' + name)!r})"
+
+        _, min_args, max_args = BUILTINS[name]
+        compiled = [self.expr(a) for a in args[:max_args]]
+        if len(compiled) < min_args:
+            # Evaluate what is there, then fail like the tree walker does
+            operands = "".join(", " + c for c in compiled)
+            return f"_fail(IndexError, 'list index out of range'{operands})"
+        return f"_builtin_{name}({', '.join(compiled)})"
+
+    def chain(self, base, comps):
+        """
+        A chained comparison.  Each link compares two values of the same
+        ordered type (see runtime.ORDERED_TYPES) natively and falls back
+        to _link() for anything else; the links are joined with `and`,
+        so evaluation stops at the first false one.
+        """
+        parts = []
+        left = self.expr(base)
+        for op, rhs in comps:
+            a, b = self.temp(), self.temp()
+            parts.append(
+                f"({a} {_PY_COMPARE[op]} {b} if type({a} := {left}) "
+                f"is type({b} := {self.expr(rhs)}) in _ORDERED "
+                f"else _link({op!r}, {a}, {b}))")
+            # The next link starts from this link's right-hand value
+            left = b
+        if len(parts) == 1:
+            return parts[0]
+        return "(" + " and ".join(parts) + ")"
+
+
+def compile_statements(statements, env, slots, output, report, budget=None):
+    """
+    Transpile and compile a statement list.  Returns a function that runs
+    it against `env` and `slots`, printing to the `output` sink and
+    passing errors to `report` (see errors.reporter); loops count their
+    iterations against `budget`, if given.  Very deeply nested loops can
+    exceed CPython's limit on nested blocks; those programs fall back to
+    closure compilation.
+    """
+    source = Transpiler(budget is not None).transpile(statements)
+    try:
+        code = compile(source, "<transpiled>", "exec")
+    except (SyntaxError, RecursionError):
+        return ClosureCompiler(env, slots, output, report, budget).compile_block(statements)
+    namespace = dict(_HELPERS)
+    namespace.update(_print=output.print, _report=_reporter(report), _output=output)
+    if budget is not None:
+        namespace["_budget"] = budget
+    exec(code, namespace)
+    run = namespace["__run__"]
+    return lambda: run(env, slots)
+
+
+class PythonInterpreter(Interpreter):
+    """
+    An Interpreter that transpiles each statement to Python and runs the
+    resulting CPython code object.
+    """
+    walks_tree = False
+
+    def compile(self, statements):
+        """
+        Compile a whole statement list once; returns a function that runs it.
+        """
+        return compile_statements(statements, self.env, self.slots,
+                                  self.output, self.report, self.budget)
+
+    def execute(self, stmt):
+        compile_statements([stmt], self.env, self.slots, self.output, self.report,
+                           self.budget)()
+
+
+def transpile(statements):
+    """
+    The generated Python source for a program, for inspection.
+    """
+    return Transpiler().transpile(statements)
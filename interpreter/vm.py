@@ -0,0 +1,239 @@
+from interpreter import Interpreter
+from resolver import UNSET
+from lists import LIST_TYPES, NumberList, new_list
+from ropes import Rope, concat, load_rope
+from runtime import (COMPARE_OPS, ORDERED_TYPES, compare_eager,
+                     plus, negate, index, read_input)
+from bytecode import (
+    HALT, LOAD_CONST, LOAD_NAME, STORE_NAME, POP_TOP, PRINT,
+    ADD, SUB, MUL, DIV, MOD, NEG, NOT, COMPARE, CHAIN_LINK, CHAIN_LAST,
+    BUILD_LIST, INDEX, INPUT, CALL_BUILTIN, RAISE, JUMP, POP_JUMP_IF_FALSE,
+    JUMP_IF_FALSE_OR_POP, JUMP_IF_TRUE_OR_POP, LOAD_SLOT, STORE_SLOT,
+    LOAD_LIST_CONST, LOAD_ROPE, CONCAT, LOAD_MEMO, JUMP_IF_SET, STORE_MEMO,
+    COUNT_ITERATION, COMPARE_NAMES, CHAIN_SHIFT, compile_program,
+)
+
+# Comparison functions indexed by the operator number in the bytecode
+_COMPARE_FUNCS = tuple(COMPARE_OPS[name] for name in COMPARE_NAMES)
+_CHAIN_MASK = (1 << CHAIN_SHIFT) - 1
+
+
+class VirtualMachine(Interpreter):
+    """
+    A stack-based virtual machine for the bytecode produced by
+    bytecode.Compiler.  It shares `env` and the output format with the
+    tree-walking Interpreter, so it can be used in its place.
+    """
+    walks_tree = False
+
+    def execute(self, stmt):
+        """
+        Compile a single statement and run it.
+        """
+        self.run(compile_program([stmt], self.budget is not None))
+
+    def run(self, co):
+        """
+        Run a Code object until it reaches HALT.
+        """
+        code, consts, names, recover = co.code, co.consts, co.names, co.recover
+        env, slots, output = self.env, self.slots, self.output
+        stack = []
+        push, pop = stack.append, stack.pop
+        pc = 0
+
+        while True:
+            try:
+                # The dispatch loop.  Opcodes are tested roughly in order
+                # of how often they run inside a typical loop body.
+                while True:
+                    op = code[pc]
+                    arg = code[pc + 1]
+                    pc += 2
+
+                    if op == LOAD_SLOT:
+                        value = slots[arg]
+                        if value is UNSET:
+                            raise NameError(f"Undefined variable: {co.slot_names[arg]}")
+                        push(value)
+
+                    elif op == LOAD_ROPE:
+                        value = slots[arg]
+                        if value is UNSET or type(value) is Rope:
+                            value = load_rope(slots, arg, co.slot_names[arg])
+                        push(value)
+
+                    elif op == LOAD_CONST:
+                        push(consts[arg])
+
+                    elif op == STORE_SLOT:
+                        slots[arg] = pop()
+
+                    elif op == LOAD_NAME:
+                        value = env.get(names[arg], UNSET)
+                        if value is UNSET:
+                            raise NameError(f"Undefined variable: {names[arg]}")
+                        push(value)
+
+                    elif op == STORE_NAME:
+                        env[names[arg]] = pop()
+
+                    elif op == CHAIN_LAST:
+                        b = pop()
+                        a = stack[-1]
+                        if type(a) is type(b) and type(a) in ORDERED_TYPES:
+                            valid = _COMPARE_FUNCS[arg](a, b)
+                        else:
+                            valid = compare_eager(COMPARE_NAMES[arg], a, b)
+                        stack[-1] = True if valid else False
+
+                    elif op == POP_JUMP_IF_FALSE:
+                        test = pop()
+                        if test is False:
+                            pc = arg
+                        elif test is not True:
+                            raise TypeError("Condition must be boolean")
+
+                    elif op == JUMP:
+                        pc = arg
+
+                    elif op == COUNT_ITERATION:
+                        budget = self.budget
+                        budget.countdown -= 1
+                        if budget.countdown <= 0:
+                            budget.check(co.positions[(pc - 2) // 2])
+
+                    elif op == ADD:
+                        b = pop()
+                        a = stack[-1]
+                        # Same-typed operands (two ints, two floats, two
+                        # strings) can never break plus()'s string rule
+                        if type(a) is type(b):
+                            stack[-1] = a + b
+                        else:
+                            stack[-1] = plus(a, b)
+
+                    elif op == CONCAT:
+                        b = pop()
+                        a = stack[-1]
+                        if type(a) is type(b) and type(b) is not str:
+                            stack[-1] = a + b
+                        else:
+                            stack[-1] = concat(a, b)
+
+                    elif op == SUB:
+                        b = pop()
+                        stack[-1] = stack[-1] - b
+
+                    elif op == MUL:
+                        b = pop()
+                        stack[-1] = stack[-1] * b
+
+                    elif op == DIV:
+                        b = pop()
+                        stack[-1] = stack[-1] / b
+
+                    elif op == MOD:
+                        b = pop()
+                        stack[-1] = stack[-1] % b
+
+                    elif op == INDEX:
+                        idx = pop()
+                        stack[-1] = index(stack[-1], idx)
+
+                    elif op == PRINT:
+                        output.print(pop())
+
+                    elif op == CALL_BUILTIN:
+                        _, fn, count = consts[arg]
+                        if count:
+                            args = stack[-count:]
+                            del stack[-count:]
+                            push(fn(*args))
+                        else:
+                            push(fn())
+
+                    elif op == POP_TOP:
+                        pop()
+
+                    elif op == CHAIN_LINK:
+                        b = pop()
+                        a = stack[-1]
+                        op_num = arg & _CHAIN_MASK
+                        if type(a) is type(b) and type(a) in ORDERED_TYPES:
+                            valid = _COMPARE_FUNCS[op_num](a, b)
+                        else:
+                            valid = compare_eager(COMPARE_NAMES[op_num], a, b)
+                        if valid:
+                            stack[-1] = b
+                        else:
+                            stack[-1] = False
+                            pc = arg >> CHAIN_SHIFT
+
+                    elif op == JUMP_IF_FALSE_OR_POP:
+                        if stack[-1]:
+                            pop()
+                        else:
+                            pc = arg
+
+                    elif op == JUMP_IF_TRUE_OR_POP:
+                        if stack[-1]:
+                            pc = arg
+                        else:
+                            pop()
+
+                    elif op == NOT:
+                        stack[-1] = not stack[-1]
+
+                    elif op == NEG:
+                        stack[-1] = negate(stack[-1])
+
+                    elif op == COMPARE:
+                        b = pop()
+                        stack[-1] = _COMPARE_FUNCS[arg](stack[-1], b)
+
+                    elif op == LOAD_MEMO:
+                        push(slots[arg])
+
+                    elif op == JUMP_IF_SET:
+                        if stack[-1] is UNSET:
+                            pop()
+                        else:
+                            pc = arg
+
+                    elif op == STORE_MEMO:
+                        if not isinstance(stack[-1], LIST_TYPES):
+                            slots[arg] = stack[-1]
+
+                    elif op == BUILD_LIST:
+                        if arg:
+                            items = stack[-arg:]
+                            del stack[-arg:]
+                            push(new_list(items))
+                        else:
+                            push(NumberList())
+
+                    elif op == LOAD_LIST_CONST:
+                        push(new_list(consts[arg]))
+
+                    elif op == INPUT:
+                        stack[-1] = read_input(stack[-1], output)
+
+                    elif op == RAISE:
+                        exc_type, message = consts[arg]
+                        raise exc_type(message)
+
+                    elif op == HALT:
+                        return
+
+                    else:
+                        raise ValueError(f"Unknown opcode: {op}")
+
+            except Exception as e:
+                # Same recovery as Interpreter.execute: report the error and
+                # continue after the innermost statement that failed.
+                # Statements always start with an empty stack.
+                at = (pc - 2) // 2
+                self.report(e, co.positions[at])
+                del stack[:]
+                pc = recover[at]
@@ -1,3 +1,6 @@
+import argparse
+import asyncio
+import json
 import os
 import sys
 
@@ -7,29 +10,270 @@ sys.path.insert(0, interp_dir)
 
 # Import modules from the interpreter/ folder directly
 import lexer
+import scanner
 import parser
 import interpreter
+import closures
+import bytecode
+import vm
+import transpiler
+import tiered
+import sessions
+import repl
+import budget
+import resolver
+import optimizer
+import cache
+import errors
+import profiler
+import hooks
+import output as outputs
+import inputs
 
-# Use the classes/functions
-def run_file(file_path):
-    # Read source file as UTF-8 to avoid platform default encoding issues
-    with open(file_path, "r", encoding="utf-8") as f:
-        code = f.read()
+# The execution engines that can run a parsed program.
+# "tree" is the reference tree-walking interpreter; the others must
+# produce exactly the same output.
+ENGINES = {
+    "tree":    interpreter.Interpreter,
+    "closure": closures.ClosureInterpreter,
+    "vm":      vm.VirtualMachine,
+    "python":  transpiler.PythonInterpreter,
+    "tiered":  tiered.TieredInterpreter,
+}
 
-    tokens     = lexer.tokenize(code)
+def parse_source(code, optimize=False, float_numbers=False):
+    # Lex and parse source text, then optionally run the optimizer
+    tokens     = scanner.scan(code, float_numbers)
     statements = parser.Parser(tokens).parse()
+    if optimize:
+        statements = optimizer.optimize(statements)
+    return statements
+
+def parse_file(file_path, optimize=False, use_cache=False, cache_dir=None,
+               float_numbers=False):
+    # Parse a source file, reusing a cached tree when the source is unchanged
+    program_cache = cache.ProgramCache(cache_dir) if use_cache else None
+    return cache.load_program(file_path, parse_source, optimize, program_cache,
+                              float_numbers)
+
+def run_statements(runner, statements, optimize=False):
+    # Optimize (optionally), resolve and execute a list of statements
+    if optimize:
+        statements = optimizer.optimize(statements)
+    # Number the globals so every engine can keep them in slots
+    for stmt in runner.resolve(statements):
+        runner.execute(stmt)
+
+# Use the classes/functions
+def run_file(file_path, engine="tree", optimize=False, stream=False, use_mmap=False,
+             use_cache=True, cache_dir=None, float_numbers=False, output=None,
+             strict=False, runner=None, budget=None):
+    # `output` is the sink for printed lines (default: buffered stdout).
+    # With strict=True the first run-time error raises errors.ProgramError.
+    # `runner` is an engine instance to use instead of a new `engine`.
+    # A budget.Budget limits the run; going over it raises
+    # errors.BudgetExceeded, in either mode.
+    if runner is None:
+        runner = ENGINES[engine](output, strict)
+    if budget is not None:
+        runner.set_budget(budget)
+
+    try:
+        if stream:
+            # Lex the file chunk by chunk and run each top-level statement
+            # as soon as it has been parsed, so memory stays bounded and
+            # the program starts straight away.  A syntax error then only
+            # stops the program when the parser reaches it.
+            chunks = lexer.read_chunks(file_path, use_mmap=use_mmap)
+            tokens = lexer.tokenize(chunks, float_numbers)
+            for stmt in parser.Parser(tokens).statements():
+                run_statements(runner, [stmt], optimize)
+        else:
+            # The whole tree is parsed (or loaded from the cache) up front
+            statements = parse_file(file_path, optimize, use_cache, cache_dir, float_numbers)
+            run_statements(runner, statements)
+    except errors.ProgramError as e:
+        e.path = file_path
+        raise
+    finally:
+        # Whatever happens, write out what the program printed
+        runner.output.flush()
+
+def run_file_async(file_path, optimize=False, use_cache=True, cache_dir=None,
+                   float_numbers=False, strict=False, limits=None):
+    # Run a program as an asyncio session on standard input and output.
+    # `limits` are the budget.Budget arguments for the session, if any.
+    program = sessions.Program(parse_file(file_path, optimize, use_cache, cache_dir,
+                                          float_numbers))
+    session = program.session(sessions.StdioChannel(), strict)
+    if limits:
+        session.set_budget(budget.Budget(**limits))
+    try:
+        asyncio.run(session.run())
+    except errors.ProgramError as e:
+        e.path = file_path
+        raise
 
-    engine = interpreter.Interpreter()
-    for stmt in statements:
-        engine.execute(stmt)
+def serve_file(file_path, address, optimize=False, use_cache=True, cache_dir=None,
+               float_numbers=False, strict=False, limits=None):
+    # Serve a program over TCP: every connection runs its own session,
+    # with its own budget.Budget(**limits) if limits are given
+    host, _, port = address.rpartition(":")
+    program = sessions.Program(parse_file(file_path, optimize, use_cache, cache_dir,
+                                          float_numbers))
+
+    def ready(server):
+        where = ", ".join(str(s.getsockname()[:2]) for s in server.sockets)
+        print(f"serving {file_path} on {where}", file=sys.stderr, flush=True)
+    try:
+        asyncio.run(sessions.serve_tcp(program, host or "127.0.0.1", int(port),
+                                       strict, ready, limits))
+    except KeyboardInterrupt:
+        pass
+
+def interact(engine="tree", optimize=False, float_numbers=False, strict=False,
+             limits=None, runner=None):
+    # The interactive mode: read statements from the console and run them
+    # on one engine, whose globals last until the session ends
+    if runner is None:
+        runner = ENGINES[engine](None, strict)
+    repl.Repl(runner, optimize, float_numbers, limits).interact()
+
+def budget_limits(args):
+    # The budget.Budget arguments given on the command line, or None
+    limits = {
+        "iterations": args.max_iterations,
+        "seconds": args.max_seconds,
+        "memory": None if args.max_memory is None else int(args.max_memory * 1024 * 1024),
+    }
+    return limits if any(limit is not None for limit in limits.values()) else None
+
+def print_profile(runner, file_path, stacks_path=None):
+    # Print the hot-spot report of a ProfilingInterpreter on stderr and
+    # optionally write its collapsed stacks for a flame graph
+    with open(file_path, encoding="utf-8") as f:
+        source_lines = f.read().splitlines()
+    print(runner.hot_spots(source_lines), file=sys.stderr)
+    if stacks_path:
+        with open(stacks_path, "w", encoding="utf-8") as f:
+            runner.write_collapsed(f)
+
+def disassemble_file(file_path, optimize=False, float_numbers=False):
+    # Compile the whole program to bytecode and print the listing
+    statements = parse_file(file_path, optimize, float_numbers=float_numbers)
+    statements = resolver.Resolver().resolve(statements)
+    print(bytecode.disassemble(bytecode.compile_program(statements)))
+
+def dump_python(file_path, optimize=False, float_numbers=False):
+    # Print the Python source the "python" engine generates for a program
+    statements = parse_file(file_path, optimize, float_numbers=float_numbers)
+    statements = resolver.Resolver().resolve(statements)
+    print(transpiler.transpile(statements), end="")
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python main.py <source_file>")
+    arg_parser = argparse.ArgumentParser(
+        usage="python main.py [options] [<source_file>]")
+    arg_parser.add_argument("source_file", nargs="?",
+                            help="the program to run (without one, start the interactive mode)")
+    arg_parser.add_argument("--engine", choices=sorted(ENGINES), default="tree",
+                            help="execution engine to run the program with")
+    arg_parser.add_argument("--disassemble", action="store_true",
+                            help="print the program's bytecode instead of running it")
+    arg_parser.add_argument("--dump-python", action="store_true",
+                            help="print the Python code the python engine generates")
+    arg_parser.add_argument("-O", "--optimize", action="store_true",
+                            help="fold constants and prune dead branches before running")
+    arg_parser.add_argument("--float-numbers", action="store_true",
+                            help="treat every number as a float, so print 1 shows 1.0 "
+                                 "(the behaviour of older versions)")
+    arg_parser.add_argument("--strict", action="store_true",
+                            help="stop at the first run-time error and report where it happened")
+    arg_parser.add_argument("--profile", action="store_true",
+                            help="time every line (on the tree walker) and print the hot spots on stderr")
+    arg_parser.add_argument("--profile-stacks", metavar="FILE",
+                            help="with --profile, write collapsed stacks for a flame graph to FILE")
+    arg_parser.add_argument("--counters", action="store_true",
+                            help="count statements, calls, lists and printed bytes; print them as JSON on stderr")
+    arg_parser.add_argument("--tier-threshold", type=int, metavar="N",
+                            default=tiered.DEFAULT_THRESHOLD,
+                            help="with --engine tiered, compile while loops after N iterations "
+                                 f"(default {tiered.DEFAULT_THRESHOLD})")
+    arg_parser.add_argument("--tier-stats", action="store_true",
+                            help="with --engine tiered, print the compiled loops and the time saved on stderr")
+    arg_parser.add_argument("--max-iterations", type=int, metavar="N",
+                            help="stop the program after N while-loop iterations in all")
+    arg_parser.add_argument("--max-seconds", type=float, metavar="S",
+                            help="stop the program once it has run for S seconds")
+    arg_parser.add_argument("--max-memory", type=float, metavar="MB",
+                            help="stop the program once its variables hold about MB megabytes")
+    arg_parser.add_argument("--async", dest="run_async", action="store_true",
+                            help="run the program as an asyncio session on stdin/stdout")
+    arg_parser.add_argument("--serve", metavar="[HOST:]PORT",
+                            help="serve the program over TCP, one session per connection")
+    arg_parser.add_argument("--stream", action="store_true",
+                            help="run each statement as soon as it is parsed (for huge files)")
+    arg_parser.add_argument("--mmap", action="store_true",
+                            help="with --stream, memory-map the source file instead of reading it")
+    arg_parser.add_argument("--batch", action="store_true",
+                            help="read input through a large buffer and don't show input() prompts")
+    arg_parser.add_argument("--unbuffered", action="store_true",
+                            help="write every printed line straight away instead of in large blocks")
+    arg_parser.add_argument("--no-cache", action="store_true",
+                            help="don't read or write the parsed-program cache")
+    arg_parser.add_argument("--cache-dir",
+                            help="directory for cached programs (default: __langcache__ next to the source)")
+    args = arg_parser.parse_args()
+    limits = budget_limits(args)
+    if args.batch:
+        inputs.set_source(inputs.BatchInput())
+    if args.source_file is None:
+        if args.disassemble or args.dump_python or args.serve or args.run_async \
+                or args.profile or args.stream:
+            arg_parser.error("a source file is needed")
+        runner = None
+        if args.engine == "tiered":
+            runner = tiered.TieredInterpreter(None, args.strict, args.tier_threshold)
+        interact(args.engine, args.optimize, args.float_numbers, args.strict, limits, runner)
+    elif args.disassemble:
+        disassemble_file(args.source_file, args.optimize, args.float_numbers)
+    elif args.dump_python:
+        dump_python(args.source_file, args.optimize, args.float_numbers)
+    elif args.serve:
+        serve_file(args.source_file, args.serve, args.optimize, not args.no_cache,
+                   args.cache_dir, args.float_numbers, args.strict, limits)
+    elif args.run_async:
+        try:
+            run_file_async(args.source_file, args.optimize, not args.no_cache,
+                           args.cache_dir, args.float_numbers, args.strict, limits)
+        except errors.ProgramError as e:
+            sys.exit(str(e))
     else:
-        run_file(sys.argv[1])
-
-# The empty __init__.py file in the interpreter/ directory
-# tells Python to treat that directory as a package. This enables
-# the modules inside (lexer.py, parser.py, interpreter.py) to
-# be imported using standard import statements when running main.py.
+        output = outputs.BufferedOutput(line_buffered=True) if args.unbuffered else None
+        runner = None
+        if args.profile:
+            runner = profiler.ProfilingInterpreter(output, args.strict)
+        elif args.engine == "tiered":
+            runner = tiered.TieredInterpreter(output, args.strict, args.tier_threshold)
+        counters = None
+        if args.counters:
+            if runner is None:
+                runner = ENGINES[args.engine](output, args.strict)
+            counters = hooks.Counters()
+            counters.attach(runner)
+        try:
+            run_file(args.source_file, engine=args.engine, optimize=args.optimize,
+                     stream=args.stream, use_mmap=args.mmap,
+                     use_cache=not args.no_cache, cache_dir=args.cache_dir,
+                     float_numbers=args.float_numbers, output=output,
+                     strict=args.strict, runner=runner,
+                     budget=budget.Budget(**limits) if limits else None)
+        except errors.ProgramError as e:
+            # Printed on stderr, with exit status 1
+            sys.exit(str(e))
+        finally:
+            if args.profile:
+                print_profile(runner, args.source_file, args.profile_stacks)
+            elif args.tier_stats and args.engine == "tiered":
+                print(runner.tier_summary(), file=sys.stderr)
+            if counters is not None:
+                print(json.dumps(counters.as_dict()), file=sys.stderr)
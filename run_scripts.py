@@ -0,0 +1,248 @@
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from multiprocessing.connection import wait
+
+import main
+import budget
+import errors
+import inputs
+import output as outputs
+
+# Run many programs at once:
+#
+#   python run_scripts.py [options] script.txt ...
+#   python run_scripts.py [options] --manifest scripts.list
+#
+# The scripts are shared out to a pool of worker processes that stay alive
+# for the whole run, so Python starts and the interpreter modules are
+# imported once per worker instead of once per script.  Every script runs
+# on a fresh engine with its output captured; the results are written in
+# the order the scripts were given, as soon as each one and all those
+# before it have finished, either as text or as JSON lines (--json).
+#
+# A script running longer than --timeout seconds is stopped by ending its
+# worker process, which is replaced by a new one.  The --max-* budgets stop
+# a runaway script from inside its worker instead, keeping the worker and
+# what the script printed.
+
+
+def read_manifest(path):
+    # Script paths from a manifest file: one per line, blank lines and
+    # lines starting with # ignored, relative paths taken from the
+    # manifest's folder
+    folder = os.path.dirname(os.path.abspath(path))
+    with open(path, encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    return [os.path.join(folder, line) for line in lines
+            if line and not line.startswith("#")]
+
+def run_script(path, options):
+    # Run one script on a fresh engine and describe what happened
+    captured = outputs.MemoryOutput()
+    runner = main.ENGINES[options["engine"]](captured, options["strict"])
+    if options["input"] is None:
+        source = inputs.BatchInput(io.StringIO(""))
+    else:
+        source = inputs.BatchInput(open(options["input"], encoding="utf-8"))
+    inputs.set_source(source)
+    limits = options["limits"]
+    status, error = "ok", None
+    start = time.perf_counter()
+    try:
+        main.run_file(path, engine=options["engine"], optimize=options["optimize"],
+                      use_cache=options["use_cache"], cache_dir=options["cache_dir"],
+                      float_numbers=options["float_numbers"], output=captured,
+                      strict=options["strict"], runner=runner,
+                      budget=budget.Budget(**limits) if limits else None)
+    except errors.BudgetExceeded as e:
+        status, error = "budget", str(e)
+    except errors.ProgramError as e:
+        status, error = "error", str(e)
+    except Exception as e:
+        # Syntax errors, missing files, ...
+        status, error = "error", f"{path}: {type(e).__name__}: {e}"
+    finally:
+        source.stream.close()
+    return {"path": path, "status": status, "error": error,
+            "output": captured.getvalue(), "seconds": time.perf_counter() - start}
+
+def serve(conn, options):
+    # A worker process: run the scripts sent through `conn` until None
+    while True:
+        path = conn.recv()
+        if path is None:
+            break
+        conn.send(run_script(path, options))
+
+
+class Worker:
+    # A worker process and the script it is running, if any
+    def __init__(self, options):
+        self.conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=serve, args=(child, options),
+                                               daemon=True)
+        self.process.start()
+        child.close()
+        self.index = None      # position of the script it is running
+        self.deadline = None
+
+    def start(self, index, path, timeout):
+        self.index = index
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+        self.conn.send(path)
+
+    def stop(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def close(self):
+        self.conn.send(None)
+        self.process.join()
+        self.conn.close()
+
+
+def run_scripts(paths, options, jobs, timeout=None, emit=None):
+    # Run every script on a pool of `jobs` workers.  emit(result) is called
+    # for each result in the order of `paths`; returns all the results.
+    results = [None] * len(paths)
+    waiting = deque(enumerate(paths))
+    workers = [Worker(options) for _ in range(min(jobs, len(paths)))]
+    emitted = 0
+
+    def finish(worker, result):
+        nonlocal emitted
+        results[worker.index] = result
+        worker.index = None
+        # Pass on every result that no earlier script is still holding up
+        while emitted < len(results) and results[emitted] is not None:
+            if emit is not None:
+                emit(results[emitted])
+            emitted += 1
+
+    def failed(worker, status, message):
+        # The worker was stopped or died: record it and start another
+        path = paths[worker.index]
+        finish(worker, {"path": path, "status": status, "error": f"{path}: {message}",
+                        "output": "", "seconds": timeout if status == "timeout" else None})
+        worker.stop()
+        workers[workers.index(worker)] = Worker(options)
+
+    try:
+        while True:
+            for worker in workers:
+                if worker.index is None and waiting:
+                    worker.start(*waiting.popleft(), timeout)
+            busy = [worker for worker in workers if worker.index is not None]
+            if not busy:
+                break
+
+            wait_for = None
+            deadlines = [w.deadline for w in busy if w.deadline is not None]
+            if deadlines:
+                wait_for = max(0.0, min(deadlines) - time.monotonic())
+            ready = wait([worker.conn for worker in busy], wait_for)
+
+            for worker in busy:
+                if worker.conn in ready:
+                    try:
+                        finish(worker, worker.conn.recv())
+                    except EOFError:
+                        failed(worker, "crashed", "the worker process died")
+                elif worker.deadline is not None and time.monotonic() >= worker.deadline:
+                    failed(worker, "timeout", f"stopped after {timeout} s")
+    finally:
+        for worker in workers:
+            if worker.index is None and worker.process.is_alive():
+                worker.close()
+            else:
+                worker.stop()
+    return results
+
+def print_text(result):
+    # One script's result as text: a header line, then what it printed
+    seconds = result["seconds"]
+    took = "" if seconds is None else f", {seconds:.3f} s"
+    print(f"==> {result['path']} ({result['status']}{took}) <==")
+    sys.stdout.write(result["output"])
+    if result["error"]:
+        print(result["error"])
+    sys.stdout.flush()
+
+def print_json(result):
+    print(json.dumps(result))
+    sys.stdout.flush()
+
+def print_summary(results, wall):
+    # Totals on stderr
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    statuses = ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+    busy = sum(result["seconds"] or 0.0 for result in results)
+    rate = len(results) / wall if wall else 0.0
+    print(f"{len(results)} scripts ({statuses}) in {wall:.2f} s wall, "
+          f"{busy:.2f} s running scripts, {rate:.1f} scripts/s", file=sys.stderr)
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        usage="python run_scripts.py [options] <script> ... | --manifest FILE")
+    arg_parser.add_argument("scripts", nargs="*")
+    arg_parser.add_argument("--manifest", metavar="FILE",
+                            help="read script paths from FILE, one per line")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                            help="number of worker processes (default: one per CPU)")
+    arg_parser.add_argument("--timeout", type=float, metavar="SECONDS",
+                            help="stop any script that runs longer than this")
+    arg_parser.add_argument("--json", action="store_true",
+                            help="write one JSON object per script instead of text")
+    arg_parser.add_argument("--max-iterations", type=int, metavar="N",
+                            help="stop a script after N while-loop iterations in all")
+    arg_parser.add_argument("--max-seconds", type=float, metavar="S",
+                            help="stop a script once it has run for S seconds, keeping its worker")
+    arg_parser.add_argument("--max-memory", type=float, metavar="MB",
+                            help="stop a script once its variables hold about MB megabytes")
+    arg_parser.add_argument("--input", metavar="FILE",
+                            help="the input every script reads (default: none)")
+    arg_parser.add_argument("--engine", choices=sorted(main.ENGINES), default="tree",
+                            help="execution engine to run the scripts with")
+    arg_parser.add_argument("-O", "--optimize", action="store_true",
+                            help="optimize the scripts before running them")
+    arg_parser.add_argument("--float-numbers", action="store_true",
+                            help="treat every number as a float")
+    arg_parser.add_argument("--strict", action="store_true",
+                            help="stop each script at its first run-time error")
+    arg_parser.add_argument("--no-cache", action="store_true",
+                            help="don't read or write the parsed-program cache")
+    arg_parser.add_argument("--cache-dir",
+                            help="directory for cached programs (default: __langcache__ next to each script)")
+    args = arg_parser.parse_args()
+
+    paths = list(args.scripts)
+    if args.manifest:
+        paths.extend(read_manifest(args.manifest))
+    if not paths:
+        arg_parser.error("no scripts given")
+    options = {
+        "engine": args.engine,
+        "optimize": args.optimize,
+        "float_numbers": args.float_numbers,
+        "strict": args.strict,
+        "use_cache": not args.no_cache,
+        "cache_dir": args.cache_dir,
+        "input": args.input,
+        "limits": main.budget_limits(args),
+    }
+
+    start = time.perf_counter()
+    results = run_scripts(paths, options, max(1, args.jobs), args.timeout,
+                          print_json if args.json else print_text)
+    print_summary(results, time.perf_counter() - start)
+    if any(result["status"] != "ok" for result in results):
+        sys.exit(1)